@@ -4,11 +4,16 @@ Nano Banana 图片生成工具 - 打包脚本
 
 使用方法:
     python build.py
+    python build.py --measure-startup    # 测量源码运行和打包结果的启动时间
 """
 import os
 import sys
+import json
 import shutil
+import statistics
 import subprocess
+import tempfile
+import time
 from pathlib import Path
 
 
@@ -90,6 +95,7 @@ def build_exe():
         '--hidden-import=pydantic',
         '--hidden-import=pydantic_core',
         '--hidden-import=jiter',
+        '--hidden-import=google.genai',               # Gemini（首次使用时才导入）
         '--hidden-import=jaraco.text',                # pkg_resources 依赖
         '--hidden-import=jaraco.functools',
         '--hidden-import=jaraco.context',
@@ -355,7 +361,70 @@ def print_tree(path: Path, prefix: str = ""):
                 print_tree(item, prefix + next_prefix)
 
 
+def get_built_exe() -> Path:
+    """打包结果中的可执行文件路径"""
+    output_dir = Path('output')
+    if sys.platform == 'darwin':
+        return output_dir / f'{APP_NAME}.app' / 'Contents' / 'MacOS' / APP_NAME
+    if sys.platform == 'win32':
+        return output_dir / f'{APP_NAME}.exe'
+    return output_dir / APP_NAME
+
+
+def measure_startup(command: list, runs: int = 5) -> dict:
+    """
+    多次启动程序并测量启动时间（窗口首次绘制后自动退出）
+
+    :return: {wall: 进程启动到退出的耗时中位数, total: 程序内记录的首次绘制耗时中位数, marks: 最后一次的各阶段耗时}
+    """
+    wall_times = []
+    reports = []
+    with tempfile.TemporaryDirectory() as tmp:
+        report_path = Path(tmp) / 'startup.jsonl'
+        env = dict(
+            os.environ,
+            NANO_BANANA_STARTUP_REPORT=str(report_path),
+            NANO_BANANA_EXIT_AFTER_STARTUP='1',
+        )
+        for _ in range(runs):
+            start = time.perf_counter()
+            subprocess.run(command, env=env, check=True, timeout=120)
+            wall_times.append(time.perf_counter() - start)
+        if report_path.exists():
+            with open(report_path, 'r', encoding='utf-8') as f:
+                reports = [json.loads(line) for line in f if line.strip()]
+
+    return {
+        'wall': statistics.median(wall_times),
+        'total': statistics.median(r['total'] for r in reports) if reports else None,
+        'marks': reports[-1]['marks'] if reports else {},
+    }
+
+
+def print_startup_times():
+    """测量并打印源码运行（python main.py）和打包结果的启动时间"""
+    targets = [('python src/main.py', [sys.executable, 'src/main.py'])]
+    exe = get_built_exe()
+    if exe.exists():
+        targets.append((str(exe), [str(exe)]))
+    else:
+        print(f"未找到打包结果 {exe}，只测量源码运行")
+
+    for label, command in targets:
+        result = measure_startup(command)
+        print(f"\n{label}")
+        print(f"  进程启动到退出: {result['wall']:.3f}s")
+        if result['total'] is not None:
+            print(f"  启动到首次绘制: {result['total']:.3f}s")
+        for name, elapsed in result['marks'].items():
+            print(f"    {name:<16}{elapsed:.3f}s")
+
+
 def main():
+    if '--measure-startup' in sys.argv:
+        print_startup_times()
+        return
+
     print("=" * 50)
     print("Nano Banana 生图工具 - 打包工具")
     print("=" * 50)
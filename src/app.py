@@ -1,6 +1,7 @@
 """主应用程序窗口"""
 import json
 import os
+from contextlib import contextmanager
 from PyQt6.QtWidgets import (
     QMainWindow,
     QWidget,
@@ -22,8 +23,11 @@ from PyQt6.QtWidgets import (
     QFileDialog,
     QSizePolicy,
     QDialog,
+    QGridLayout,
+    QLineEdit,
+    QCompleter,
 )
-from PyQt6.QtCore import Qt, pyqtSignal
+from PyQt6.QtCore import Qt, QTimer, QStringListModel, pyqtSignal
 from PyQt6.QtGui import QFont, QAction, QPixmap, QIcon, QImage, QCursor
 
 try:
@@ -40,12 +44,95 @@ from utils.yaml_handler import YamlHandler
 from utils.preset_manager import PresetManager
 from utils.resource_path import get_images_dir
 from components.ai_dialog import AIGenerateDialog
-from components.ai_image_dialog import GeminiImageThread
+from components.ai_image_dialog import GeminiImageThread, GeminiVariantsThread
 from components.gemini_client import ASPECT_RATIO_LIST, IMAGE_SIZE_LIST
 from utils.ai_config import AIConfigManager
+from utils.image_preprocess import prefetch_reference_images
+from utils.startup import profile_phase
 from styles import LIGHT_THEME
 
 
+# JSON预览合并刷新的间隔（毫秒）
+JSON_PREVIEW_REFRESH_MS = 120
+
+# 预设搜索：输入停顿多久后搜索（毫秒），以及最多显示的结果数
+PRESET_SEARCH_DELAY_MS = 80
+PRESET_SEARCH_LIMIT = 20
+
+# 一次生成的候选图数量
+VARIANT_COUNT_LIST = ["1", "2", "3", "4"]
+# 候选图缩略图尺寸
+VARIANT_THUMB_SIZE = 120
+# 候选图缩略图样式：生成中/失败、已完成，选中时在已完成样式上叠加高亮边框
+VARIANT_PENDING_STYLE = "color: #bfbfbf; font-size: 11px; border: 1px dashed #d9d9d9; border-radius: 4px;"
+VARIANT_READY_STYLE = "border: 2px solid #d9d9d9; border-radius: 4px;"
+VARIANT_SELECTED_BORDER = "border: 2px solid #1890ff;"
+
+# 保存图片支持的格式：扩展名 -> (Qt 格式名, MIME类型)
+SAVE_IMAGE_FORMATS = {
+    ".png": ("PNG", "image/png"),
+    ".jpg": ("JPEG", "image/jpeg"),
+    ".jpeg": ("JPEG", "image/jpeg"),
+    ".webp": ("WEBP", "image/webp"),
+}
+# MIME 类型 -> 默认扩展名
+MIME_SAVE_EXTENSIONS = {
+    "image/png": ".png",
+    "image/jpeg": ".jpg",
+    "image/webp": ".webp",
+}
+# 保存对话框的文件类型过滤器
+SAVE_IMAGE_FILTERS = [
+    ("PNG", "PNG 图片 (*.png)"),
+    ("JPEG", "JPEG 图片 (*.jpg *.jpeg)"),
+    ("WEBP", "WebP 图片 (*.webp)"),
+]
+
+# 表单字段在提示词 JSON 中的路径
+FIELD_PATHS = {
+    "风格模式": ("风格模式",),
+    "画面气质": ("画面气质",),
+    "机位角度": ("相机", "机位角度"),
+    "构图": ("相机", "构图"),
+    "镜头特性": ("相机", "镜头特性"),
+    "传感器画质": ("相机", "传感器画质"),
+    "地点设定": ("场景", "环境", "地点设定"),
+    "光线": ("场景", "环境", "光线"),
+    "天气氛围": ("场景", "环境", "天气氛围"),
+    "整体描述": ("场景", "主体", "整体描述"),
+    "身材": ("场景", "主体", "外形特征", "身材"),
+    "面部": ("场景", "主体", "外形特征", "面部"),
+    "头发": ("场景", "主体", "外形特征", "头发"),
+    "眼睛": ("场景", "主体", "外形特征", "眼睛"),
+    "情绪": ("场景", "主体", "表情与动作", "情绪"),
+    "动作": ("场景", "主体", "表情与动作", "动作"),
+    "穿着": ("场景", "主体", "服装", "穿着"),
+    "服装细节": ("场景", "主体", "服装", "细节"),
+    "配饰": ("场景", "主体", "配饰"),
+    "背景描述": ("场景", "背景", "描述"),
+    "景深": ("场景", "背景", "景深"),
+    "呈现意图": ("审美控制", "呈现意图"),
+    "材质真实度": ("审美控制", "材质真实度"),
+    "整体色调": ("审美控制", "色彩风格", "整体色调"),
+    "对比度": ("审美控制", "色彩风格", "对比度"),
+    "特殊效果": ("审美控制", "色彩风格", "特殊效果"),
+}
+
+# 在 JSON 中为列表、在表单中以逗号拼接显示的字段
+LIST_TEXT_FIELDS = {"材质真实度"}
+
+# 多选字段在提示词 JSON 中的路径
+MULTI_SELECT_FIELD_PATHS = {
+    "禁止元素": ("反向提示词", "禁止元素"),
+    "禁止风格": ("反向提示词", "禁止风格"),
+}
+
+# 路径到字段名的反查表（用于流式填充）
+PATH_TO_FIELD = {
+    path: name for name, path in {**FIELD_PATHS, **MULTI_SELECT_FIELD_PATHS}.items()
+}
+
+
 class ClickableLabel(QLabel):
     """可点击的标签，用于图片预览"""
     
@@ -163,22 +250,45 @@ class PromptGeneratorApp(QMainWindow):
         self.field_widgets = {}  # 存储所有字段的widget引用
         self.current_preset_name = None
         
+        # JSON预览：表单变化只标记为过期，合并后在预览可见时统一刷新
+        self.json_preview_visible = False
+        self._bulk_update_depth = 0  # 批量更新表单的嵌套层数
+        self._json_dirty = True
+        self._json_refresh_timer = QTimer(self)
+        self._json_refresh_timer.setSingleShot(True)
+        self._json_refresh_timer.setInterval(JSON_PREVIEW_REFRESH_MS)
+        self._json_refresh_timer.timeout.connect(self._refresh_json_preview)
+        
+        # 预设搜索：合并连续输入，停顿后再搜索
+        self._preset_search_timer = QTimer(self)
+        self._preset_search_timer.setSingleShot(True)
+        self._preset_search_timer.setInterval(PRESET_SEARCH_DELAY_MS)
+        self._preset_search_timer.timeout.connect(self._run_preset_search)
+        
         # 生图相关
         self.selected_images = []
         self.image_buttons = []  # 存储图片按钮的列表
         self.generated_image_bytes = None
+        self.generated_image_mime = "image/png"
         self.generated_pixmap = None
         self.worker_thread = None
+        self.variant_images = {}  # 候选图 {序号: (图片字节, MIME类型, QPixmap)}
+        self.variant_labels = {}  # 候选图缩略图 {序号: ClickableLabel}
+        self.selected_variant = None  # 当前选中的候选图序号
 
-        self._setup_window()
-        self._setup_ui()
-        self._load_presets_to_selector()
+        with profile_phase("_setup_window"):
+            self._setup_window()
+        with profile_phase("_setup_ui"):
+            self._setup_ui()
+        with profile_phase("load_presets"):
+            self._load_presets_to_selector()
 
     def _setup_window(self):
         self.setWindowTitle("Nano Banana 生图工具")
         self.setMinimumSize(1200, 800)
         self.resize(1400, 900)
-        self.setStyleSheet(LIGHT_THEME)
+        with profile_phase("stylesheet"):
+            self.setStyleSheet(LIGHT_THEME)
         
         # 设置窗口图标
         icon_path = get_images_dir() / "logo.png"
@@ -193,11 +303,13 @@ class PromptGeneratorApp(QMainWindow):
         main_layout.setSpacing(16)
 
         # 标题区域（含预设选择器）
-        header = self._create_header()
+        with profile_phase("_create_header"):
+            header = self._create_header()
         main_layout.addWidget(header)
 
         # 预设工具栏
-        preset_bar = self._create_preset_bar()
+        with profile_phase("_create_preset_bar"):
+            preset_bar = self._create_preset_bar()
         main_layout.addWidget(preset_bar)
 
         # 主内容区域 - 使用分割器（三列布局）
@@ -205,26 +317,29 @@ class PromptGeneratorApp(QMainWindow):
         self.main_splitter.setHandleWidth(8)
 
         # 左侧：表单区域
-        form_area = self._create_form_area()
+        with profile_phase("_create_form_area"):
+            form_area = self._create_form_area()
         self.main_splitter.addWidget(form_area)
 
         # 中间：JSON预览区域（可折叠）
-        self.json_preview_area = self._create_json_preview_area()
+        with profile_phase("_create_json_preview_area"):
+            self.json_preview_area = self._create_json_preview_area()
         self.main_splitter.addWidget(self.json_preview_area)
 
         # 右侧：生图区域
-        image_generate_area = self._create_image_generate_area()
+        with profile_phase("_create_image_generate_area"):
+            image_generate_area = self._create_image_generate_area()
         self.main_splitter.addWidget(image_generate_area)
 
         # 设置分割比例，默认隐藏中间列
         self.main_splitter.setSizes([600, 0, 600])
         # 默认隐藏中间列
         self.json_preview_area.setVisible(False)
-        self.json_preview_visible = False
         main_layout.addWidget(self.main_splitter, 1)
 
         # 底部按钮区域
-        button_bar = self._create_button_bar()
+        with profile_phase("_create_button_bar"):
+            button_bar = self._create_button_bar()
         main_layout.addWidget(button_bar)
 
     def _create_header(self) -> QWidget:
@@ -283,6 +398,24 @@ class PromptGeneratorApp(QMainWindow):
         self.preset_selector.currentTextChanged.connect(self._on_preset_selected)
         layout.addWidget(self.preset_selector)
 
+        # 预设搜索框（按名称和内容全文搜索，结果按相关度排序）
+        self.preset_search_input = QLineEdit()
+        self.preset_search_input.setObjectName("presetSearchInput")
+        self.preset_search_input.setPlaceholderText("搜索预设...")
+        self.preset_search_input.setClearButtonEnabled(True)
+        self.preset_search_input.setMinimumWidth(180)
+        self.preset_search_model = QStringListModel(self)
+        self.preset_search_completer = QCompleter(self.preset_search_model, self)
+        # 结果已经过排序和筛选，弹窗按原样显示
+        self.preset_search_completer.setCompletionMode(
+            QCompleter.CompletionMode.UnfilteredPopupCompletion
+        )
+        self.preset_search_completer.setMaxVisibleItems(12)
+        self.preset_search_completer.activated.connect(self._on_preset_search_activated)
+        self.preset_search_input.setCompleter(self.preset_search_completer)
+        self.preset_search_input.textEdited.connect(lambda _: self._preset_search_timer.start())
+        layout.addWidget(self.preset_search_input)
+
         # 刷新按钮
         refresh_btn = QPushButton("刷新")
         refresh_btn.setObjectName("secondaryButton")
@@ -328,6 +461,7 @@ class PromptGeneratorApp(QMainWindow):
         scroll.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
 
         container = QWidget()
+        self.form_container = container
         layout = QVBoxLayout(container)
         layout.setSpacing(16)
         layout.setContentsMargins(0, 0, 16, 0)
@@ -535,6 +669,8 @@ class PromptGeneratorApp(QMainWindow):
         if self.json_preview_visible:
             # 显示时，平均分配三列
             self.main_splitter.setSizes([500, 300, 500])
+            # 隐藏期间跳过的刷新在显示时补上
+            self._refresh_json_preview()
         else:
             # 隐藏时，左右两列平分
             self.main_splitter.setSizes([600, 0, 600])
@@ -579,6 +715,18 @@ class PromptGeneratorApp(QMainWindow):
         self.size_combo = size_container.findChild(QComboBox)
         param_row_layout.addWidget(size_container, 1)
         
+        count_container = self._create_param_row("生成数量", VARIANT_COUNT_LIST)
+        self.variant_count_combo = count_container.findChild(QComboBox)
+        param_row_layout.addWidget(count_container, 1)
+        
+        self.reuse_result_checkbox = QCheckBox("复用相同结果")
+        self.reuse_result_checkbox.setToolTip("提示词、参数和参考图完全相同时，直接使用之前生成的图片（仅单张生成）")
+        self.reuse_result_checkbox.setStyleSheet("font-size: 12px; color: #595959;")
+        self.reuse_result_checkbox.setChecked(
+            self.config_manager.get_image_store_config()["reuse_identical"]
+        )
+        param_row_layout.addWidget(self.reuse_result_checkbox)
+        
         param_layout.addWidget(param_row)
 
         # 参考图片区域：合并到参数设置中
@@ -664,6 +812,14 @@ class PromptGeneratorApp(QMainWindow):
         canvas_layout.addWidget(self.preview_area)
 
         preview_layout.addWidget(preview_canvas, 1)
+
+        # 候选图网格：生成多张时显示，点击切换到大预览
+        self.variant_grid_widget = QWidget()
+        self.variant_grid_layout = QGridLayout(self.variant_grid_widget)
+        self.variant_grid_layout.setContentsMargins(0, 0, 0, 0)
+        self.variant_grid_layout.setSpacing(8)
+        self.variant_grid_widget.setVisible(False)
+        preview_layout.addWidget(self.variant_grid_widget)
         layout.addWidget(preview_frame, 1)
 
         # 状态标签
@@ -739,6 +895,12 @@ class PromptGeneratorApp(QMainWindow):
         self.save_image_btn.clicked.connect(self._save_image)
         layout.addWidget(self.save_image_btn)
 
+        self.cancel_variants_btn = QPushButton("停止其余")
+        self.cancel_variants_btn.setObjectName("secondaryButton")
+        self.cancel_variants_btn.setVisible(False)
+        self.cancel_variants_btn.clicked.connect(self._cancel_variants)
+        layout.addWidget(self.cancel_variants_btn)
+
         self.generate_image_btn = QPushButton("生成图片")
         self.generate_image_btn.setObjectName("primaryButton")
         self.generate_image_btn.clicked.connect(self._on_generate_image_clicked)
@@ -769,10 +931,27 @@ class PromptGeneratorApp(QMainWindow):
         # 特别要求不纳入JSON预览，所以不需要调用 _generate_json()
 
     def _generate_json(self):
-        """生成JSON提示词"""
+        """标记JSON预览已过期，预览可见时合并到下一次定时刷新"""
+        self._json_dirty = True
+        if self._bulk_update_depth:
+            # 批量更新中，结束时统一刷新
+            return
+        # 定时器运行中说明已有刷新排队，连续编辑只刷新一次
+        if self.json_preview_visible and not self._json_refresh_timer.isActive():
+            self._json_refresh_timer.start()
+
+    def _current_json_text(self) -> str:
+        """按当前表单即时生成JSON文本（复制、生图等场景使用）"""
         data = self._collect_form_data()
-        json_str = json.dumps(data, ensure_ascii=False, indent=2)
-        self.json_preview.setText(json_str)
+        return json.dumps(data, ensure_ascii=False, indent=2)
+
+    def _refresh_json_preview(self):
+        """重新生成JSON预览（预览隐藏或内容未变化时跳过）"""
+        self._json_refresh_timer.stop()
+        if not self.json_preview_visible or not self._json_dirty:
+            return
+        self._json_dirty = False
+        self.json_preview.setPlainText(self._current_json_text())
 
     def _collect_form_data(self) -> dict:
         """收集表单数据并组织成目标格式"""
@@ -874,10 +1053,35 @@ class PromptGeneratorApp(QMainWindow):
         presets = self.preset_manager.get_all_presets()
         for preset in presets:
             self.preset_selector.addItem(preset['name'], preset['name'])
+            if preset['summary']:
+                self.preset_selector.setItemData(
+                    self.preset_selector.count() - 1,
+                    preset['summary'],
+                    Qt.ItemDataRole.ToolTipRole,
+                )
 
         self.preset_selector.blockSignals(False)
         self._show_toast(f"已加载 {len(presets)} 个预设")
 
+    def _run_preset_search(self):
+        """按搜索框内容搜索预设并弹出结果"""
+        query = self.preset_search_input.text()
+        results = self.preset_manager.search_presets(query, PRESET_SEARCH_LIMIT) if query.strip() else []
+        self.preset_search_model.setStringList([r["name"] for r in results])
+        if results:
+            self.preset_search_completer.complete()
+        else:
+            self.preset_search_completer.popup().hide()
+
+    def _on_preset_search_activated(self, name: str):
+        """选中搜索结果时加载对应预设"""
+        for i in range(self.preset_selector.count()):
+            if self.preset_selector.itemData(i) == name and i != self.preset_selector.currentIndex():
+                # 通过选择器加载，保持选择器与当前预设一致
+                self.preset_selector.setCurrentIndex(i)
+                return
+        self._load_preset(name)
+
     def _on_preset_selected(self, text: str):
         """选择预设时加载"""
         if not text or text == "":
@@ -898,10 +1102,34 @@ class PromptGeneratorApp(QMainWindow):
             return
 
         # 解析嵌套数据并填充表单
-        self._fill_form_from_data(data)
+        with self._bulk_form_update():
+            self._fill_form_from_data(data)
         self.current_preset_name = name
         self._show_toast(f"已加载预设: {name}")
 
+    @contextmanager
+    def _bulk_form_update(self):
+        """
+        批量更新表单
+
+        期间屏蔽各字段的 value_changed 信号并暂停表单重绘，
+        结束后恢复并只刷新一次JSON预览。可嵌套使用。
+        """
+        self._bulk_update_depth += 1
+        if self._bulk_update_depth == 1:
+            self.form_container.setUpdatesEnabled(False)
+            widgets = list(self.field_widgets.values()) + [self.aspect_selector]
+            blocked = [(w, w.blockSignals(True)) for w in widgets]
+        try:
+            yield
+        finally:
+            self._bulk_update_depth -= 1
+            if self._bulk_update_depth == 0:
+                for widget, was_blocked in blocked:
+                    widget.blockSignals(was_blocked)
+                self.form_container.setUpdatesEnabled(True)
+                self._generate_json()
+
     def _fill_form_from_data(self, data: dict):
         """从数据填充表单"""
         _MISSING = object()
@@ -915,56 +1143,19 @@ class PromptGeneratorApp(QMainWindow):
                 cur = cur[k]
             return cur
 
-        def _get_list_as_str(d, *keys):
-            val = _get(d, *keys)
-            if val is _MISSING:
-                return _MISSING
-            return self._list_to_str(val)
-
         # 字段映射: 仅当预设里存在该键时才覆盖
-        field_mapping = {
-            "风格模式": lambda d: _get(d, "风格模式"),
-            "画面气质": lambda d: _get(d, "画面气质"),
-            "机位角度": lambda d: _get(d, "相机", "机位角度"),
-            "构图": lambda d: _get(d, "相机", "构图"),
-            "镜头特性": lambda d: _get(d, "相机", "镜头特性"),
-            "传感器画质": lambda d: _get(d, "相机", "传感器画质"),
-            "地点设定": lambda d: _get(d, "场景", "环境", "地点设定"),
-            "光线": lambda d: _get(d, "场景", "环境", "光线"),
-            "天气氛围": lambda d: _get(d, "场景", "环境", "天气氛围"),
-            "整体描述": lambda d: _get(d, "场景", "主体", "整体描述"),
-            "身材": lambda d: _get(d, "场景", "主体", "外形特征", "身材"),
-            "面部": lambda d: _get(d, "场景", "主体", "外形特征", "面部"),
-            "头发": lambda d: _get(d, "场景", "主体", "外形特征", "头发"),
-            "眼睛": lambda d: _get(d, "场景", "主体", "外形特征", "眼睛"),
-            "情绪": lambda d: _get(d, "场景", "主体", "表情与动作", "情绪"),
-            "动作": lambda d: _get(d, "场景", "主体", "表情与动作", "动作"),
-            "穿着": lambda d: _get(d, "场景", "主体", "服装", "穿着"),
-            "服装细节": lambda d: _get(d, "场景", "主体", "服装", "细节"),
-            "配饰": lambda d: _get(d, "场景", "主体", "配饰"),
-            "背景描述": lambda d: _get(d, "场景", "背景", "描述"),
-            "景深": lambda d: _get(d, "场景", "背景", "景深"),
-            "呈现意图": lambda d: _get(d, "审美控制", "呈现意图"),
-            "材质真实度": lambda d: _get_list_as_str(d, "审美控制", "材质真实度"),
-            "整体色调": lambda d: _get(d, "审美控制", "色彩风格", "整体色调"),
-            "对比度": lambda d: _get(d, "审美控制", "色彩风格", "对比度"),
-            "特殊效果": lambda d: _get(d, "审美控制", "色彩风格", "特殊效果"),
-        }
-
-        for field_name, getter in field_mapping.items():
+        for field_name, path in FIELD_PATHS.items():
             if field_name in self.field_widgets:
-                value = getter(data)
+                value = _get(data, *path)
                 if value is not _MISSING:
+                    if field_name in LIST_TEXT_FIELDS:
+                        value = self._list_to_str(value)
                     self.field_widgets[field_name].set_value("" if value is None else value)
 
         # 多选字段需要传入列表；缺失键不覆盖
-        multi_select_fields = {
-            "禁止元素": lambda d: _get(d, "反向提示词", "禁止元素"),
-            "禁止风格": lambda d: _get(d, "反向提示词", "禁止风格"),
-        }
-        for field_name, getter in multi_select_fields.items():
+        for field_name, path in MULTI_SELECT_FIELD_PATHS.items():
             if field_name in self.field_widgets:
-                value = getter(data)
+                value = _get(data, *path)
                 if value is not _MISSING:
                     self.field_widgets[field_name].set_value(value if value else [])
 
@@ -1103,6 +1294,7 @@ class PromptGeneratorApp(QMainWindow):
         from components.ai_dialog import AIGenerateDialog
         dialog = AIGenerateDialog(self)
         dialog.generated.connect(self._on_ai_generated)
+        dialog.field_streamed.connect(self._on_ai_field_streamed)
         dialog.exec()
 
     def _show_ai_modify_dialog(self):
@@ -1137,6 +1329,12 @@ class PromptGeneratorApp(QMainWindow):
                 self.selected_images.append(path)
                 self._append_image_item(path)
 
+        # 后台预处理参考图，发起请求时直接命中缓存
+        prefetch_reference_images(
+            files[:remaining],
+            self.config_manager.get_image_preprocess_config("gemini"),
+        )
+
     def _number_to_chinese(self, num: int) -> str:
         """将数字转换为中文数字"""
         chinese_nums = ["", "一", "二", "三", "四", "五", "六", "七", "八", "九", "十"]
@@ -1249,12 +1447,19 @@ class PromptGeneratorApp(QMainWindow):
         # 禁用点击预览功能
         self._enable_image_preview(False)
 
+        self._clear_variants()
+        variant_count = int(self.variant_count_combo.currentText())
+        if variant_count > 1:
+            self._start_variants(prompt_text, variant_count)
+            return
+
         self.worker_thread = GeminiImageThread(
             prompt=prompt_text,
             image_paths=self.selected_images,
             aspect_ratio=self.aspect_combo.currentText(),
             image_size=self.size_combo.currentText(),
             thinking_level="low",  # 移除思考级别参数，使用默认值
+            reuse_results=self.reuse_result_checkbox.isChecked(),
         )
         self.worker_thread.progress.connect(lambda msg: self._set_image_status(f"⏳ {msg}", "#1890ff"))
         self.worker_thread.image_ready.connect(self._on_image_ready)
@@ -1262,15 +1467,119 @@ class PromptGeneratorApp(QMainWindow):
         self.worker_thread.finished.connect(self._on_thread_finished)
         self.worker_thread.start()
 
+    def _start_variants(self, prompt_text: str, count: int):
+        """并发生成多张候选图"""
+        self.preview_area.setText(f"正在生成 {count} 张候选图，完成后会显示在下方")
+        self.variant_grid_widget.setVisible(True)
+        self.cancel_variants_btn.setVisible(True)
+        self.cancel_variants_btn.setEnabled(True)
+
+        columns = min(count, 4)
+        for index in range(count):
+            label = ClickableLabel("生成中...")
+            label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+            label.setFixedHeight(VARIANT_THUMB_SIZE)
+            label.setMinimumWidth(VARIANT_THUMB_SIZE)
+            label.setStyleSheet(VARIANT_PENDING_STYLE)
+            label.clicked.connect(lambda i=index: self._select_variant(i))
+            self.variant_grid_layout.addWidget(label, index // columns, index % columns)
+            self.variant_labels[index] = label
+
+        self.worker_thread = GeminiVariantsThread(
+            prompt=prompt_text,
+            image_paths=self.selected_images,
+            aspect_ratio=self.aspect_combo.currentText(),
+            image_size=self.size_combo.currentText(),
+            thinking_level="low",
+            count=count,
+            max_concurrency=self.config_manager.get_image_variant_concurrency(),
+        )
+        self.worker_thread.progress.connect(lambda msg: self._set_image_status(f"⏳ {msg}", "#1890ff"))
+        self.worker_thread.variant_ready.connect(self._on_variant_ready)
+        self.worker_thread.variant_failed.connect(self._on_variant_failed)
+        self.worker_thread.error.connect(self._on_generation_error)
+        self.worker_thread.finished.connect(self._on_thread_finished)
+        self.worker_thread.start()
+
+    def _on_variant_ready(self, index: int, image_bytes: bytes, mime_type: str):
+        """单张候选图完成"""
+        # 只解码一次，缩略图和大预览共用
+        pixmap = QPixmap.fromImage(QImage.fromData(image_bytes))
+        self.variant_images[index] = (image_bytes, mime_type, pixmap)
+        label = self.variant_labels.get(index)
+        if label is not None:
+            label.setPixmap(pixmap.scaled(
+                VARIANT_THUMB_SIZE,
+                VARIANT_THUMB_SIZE,
+                Qt.AspectRatioMode.KeepAspectRatio,
+                Qt.TransformationMode.SmoothTransformation,
+            ))
+            label.setStyleSheet(VARIANT_READY_STYLE)
+            label.setCursor(QCursor(Qt.CursorShape.PointingHandCursor))
+        # 第一张完成的候选图直接显示在大预览中
+        if self.generated_image_bytes is None:
+            self._select_variant(index)
+
+    def _on_variant_failed(self, index: int, message: str):
+        """单张候选图失败"""
+        label = self.variant_labels.get(index)
+        if label is not None:
+            label.setText("生成失败")
+            label.setToolTip(message)
+
+    def _select_variant(self, index: int):
+        """选中候选图作为当前图片（用于大图预览和保存）"""
+        variant = self.variant_images.get(index)
+        if variant is None:
+            return
+        # 只更新前后两次选中的缩略图，其他缩略图保留各自状态的样式
+        previous = self.variant_labels.get(self.selected_variant)
+        if previous is not None and self.selected_variant != index:
+            previous.setStyleSheet(VARIANT_READY_STYLE)
+        label = self.variant_labels.get(index)
+        if label is not None:
+            label.setStyleSheet(VARIANT_READY_STYLE + VARIANT_SELECTED_BORDER)
+        self.selected_variant = index
+        image_bytes, mime_type, pixmap = variant
+        self._show_generated_image(image_bytes, mime_type, pixmap)
+
+    def _cancel_variants(self):
+        """停止尚未完成的候选图"""
+        if isinstance(self.worker_thread, GeminiVariantsThread) and self.worker_thread.isRunning():
+            self.worker_thread.cancel()
+            self.cancel_variants_btn.setEnabled(False)
+
+    def _clear_variants(self):
+        """清空候选图网格"""
+        for label in self.variant_labels.values():
+            self.variant_grid_layout.removeWidget(label)
+            label.deleteLater()
+        self.variant_labels.clear()
+        self.variant_images.clear()
+        self.selected_variant = None
+        self.variant_grid_widget.setVisible(False)
+
     def _on_thread_finished(self):
         """线程完成"""
         self._set_image_generating_state(False)
+        self.cancel_variants_btn.setVisible(False)
+        for index, label in self.variant_labels.items():
+            if index not in self.variant_images and label.text() == "生成中...":
+                label.setText("已停止")
+        if isinstance(self.worker_thread, GeminiVariantsThread) and not self.variant_images:
+            self.preview_area.setText("未生成候选图，请调整参数后重试")
         self.worker_thread = None
 
-    def _on_image_ready(self, image_bytes: bytes):
+    def _on_image_ready(self, image_bytes: bytes, mime_type: str = "image/png"):
         """图片生成完成"""
+        self._show_generated_image(image_bytes, mime_type)
+
+    def _show_generated_image(self, image_bytes: bytes, mime_type: str, pixmap: QPixmap = None):
+        """显示生成的图片，保留原始字节用于保存"""
         self.generated_image_bytes = image_bytes
-        pixmap = QPixmap.fromImage(QImage.fromData(image_bytes))
+        self.generated_image_mime = mime_type
+        if pixmap is None:
+            pixmap = QPixmap.fromImage(QImage.fromData(image_bytes))
         self.generated_pixmap = pixmap
         self._refresh_preview_pixmap()
         self.save_image_btn.setEnabled(True)
@@ -1291,6 +1600,8 @@ class PromptGeneratorApp(QMainWindow):
         """设置生成状态"""
         self.aspect_combo.setEnabled(not generating)
         self.size_combo.setEnabled(not generating)
+        self.variant_count_combo.setEnabled(not generating)
+        self.reuse_result_checkbox.setEnabled(not generating)
         self.add_image_btn.setEnabled(not generating)
         # 禁用所有图片按钮
         for btn in self.image_buttons:
@@ -1302,20 +1613,39 @@ class PromptGeneratorApp(QMainWindow):
         if not self.generated_image_bytes:
             return
 
+        # 原始格式排在第一位
+        source_ext = MIME_SAVE_EXTENSIONS.get(self.generated_image_mime, ".png")
+        filters = sorted(
+            SAVE_IMAGE_FILTERS,
+            key=lambda item: item[0] != SAVE_IMAGE_FORMATS[source_ext][0],
+        )
         file_path, _ = QFileDialog.getSaveFileName(
             self,
             "另存为",
-            "generated.png",
-            "PNG 图片 (*.png);;JPEG 图片 (*.jpg *.jpeg)"
+            f"generated{source_ext}",
+            ";;".join(f for _, f in filters)
         )
         if not file_path:
             return
 
-        import os
         suffix = os.path.splitext(file_path)[1].lower()
-        format_name = "PNG" if suffix in ("", ".png") else "JPEG"
-        image = QImage.fromData(self.generated_image_bytes)
-        if not image.save(file_path, format_name):
+        if suffix not in SAVE_IMAGE_FORMATS:
+            suffix = source_ext
+            file_path += suffix
+        format_name, mime_type = SAVE_IMAGE_FORMATS[suffix]
+
+        if mime_type == self.generated_image_mime:
+            # 格式一致时直接写入原始字节，不重新编码
+            try:
+                with open(file_path, "wb") as f:
+                    f.write(self.generated_image_bytes)
+                saved = True
+            except OSError:
+                saved = False
+        else:
+            saved = self.generated_pixmap.toImage().save(file_path, format_name)
+
+        if not saved:
             QMessageBox.critical(self, "错误", "保存图片失败，请重试")
         else:
             self._set_image_status(f"图片已保存到 {file_path}", "#52c41a")
@@ -1386,13 +1716,41 @@ class PromptGeneratorApp(QMainWindow):
 
     def _on_ai_generated(self, data: dict):
         """AI生成完成后应用到表单"""
-        self._fill_form_from_data(data)
+        with self._bulk_form_update():
+            self._fill_form_from_data(data)
         self.current_preset_name = None
         self._show_toast("已应用AI生成的提示词")
 
+    def _on_ai_field_streamed(self, path: tuple, value):
+        """AI生成过程中，单个字段完成后立即填入表单"""
+        if not path:
+            return
+        index = None
+        if isinstance(path[-1], int):
+            # 列表元素：第一个元素覆盖旧值，后续元素追加
+            index = path[-1]
+            path = path[:-1]
+
+        field_name = PATH_TO_FIELD.get(tuple(path))
+        widget = self.field_widgets.get(field_name)
+        if widget is None:
+            return
+
+        self.current_preset_name = None
+        text = "" if value is None else str(value)
+        if field_name in MULTI_SELECT_FIELD_PATHS:
+            current = widget.get_value() if index else []
+            widget.set_value(current + [text])
+        elif index:
+            current = widget.get_value()
+            widget.set_value(f"{current}, {text}" if current else text)
+        else:
+            widget.set_value(text)
+
     def _on_ai_modified(self, data: dict):
         """AI修改完成后应用到表单"""
-        self._fill_form_from_data(data)
+        with self._bulk_form_update():
+            self._fill_form_from_data(data)
         self.current_preset_name = None
         self._show_toast("已应用AI修改的提示词")
 
@@ -1400,10 +1758,7 @@ class PromptGeneratorApp(QMainWindow):
 
     def _copy_to_clipboard(self):
         """复制JSON到剪贴板"""
-        json_text = self.json_preview.toPlainText()
-        if not json_text:
-            self._generate_json()
-            json_text = self.json_preview.toPlainText()
+        json_text = self._current_json_text()
 
         if CLIPBOARD_AVAILABLE:
             try:
@@ -1427,18 +1782,18 @@ class PromptGeneratorApp(QMainWindow):
             QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
         )
         if reply == QMessageBox.StandardButton.Yes:
-            for widget in self.field_widgets.values():
-                widget.clear()
-            self.aspect_selector.clear()
-            self.json_preview.clear()
+            with self._bulk_form_update():
+                for widget in self.field_widgets.values():
+                    widget.clear()
+                self.aspect_selector.clear()
+                # 重置画幅设置开关
+                self.aspect_enabled.setChecked(False)
+                self.aspect_group.setVisible(False)
+                # 重置反向提示词开关
+                self.negative_prompt_enabled.setChecked(False)
+                self.negative_group.setVisible(False)
             self.current_preset_name = None
             self.preset_selector.setCurrentIndex(0)
-            # 重置画幅设置开关
-            self.aspect_enabled.setChecked(False)
-            self.aspect_group.setVisible(False)
-            # 重置反向提示词开关
-            self.negative_prompt_enabled.setChecked(False)
-            self.negative_group.setVisible(False)
             # 重置特别要求开关
             self.special_requirement_enabled.setChecked(False)
             self.special_requirement_group.setVisible(False)
@@ -1447,6 +1802,7 @@ class PromptGeneratorApp(QMainWindow):
             if hasattr(self, 'selected_images'):
                 self._clear_images()
             self.generated_image_bytes = None
+            self.generated_image_mime = "image/png"
             self.generated_pixmap = None
             if hasattr(self, 'preview_area'):
                 self.preview_area.setText("图片生成后会显示在这里")
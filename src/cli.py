@@ -0,0 +1,341 @@
+"""
+命令行工具 - 不启动界面，批量生成/修改提示词和生成图片
+
+使用方法（在 src 目录下）:
+    python -m nano_banana generate "海边车站的少女" [-i 参考图.jpg] [--save-preset 名称]
+    python -m nano_banana modify "把季节改成冬天" --preset 星野 [--save-preset 星野_冬]
+    python -m nano_banana image --preset 星野 [--aspect-ratio 16:9 --size 2K --count 2 --out-dir out]
+    python -m nano_banana batch jobs.jsonl --jobs 4 > results.jsonl
+    python -m nano_banana serve [--port 8765 --workers 2]   # 本地任务服务，见 server.py
+
+任务输入（batch 的输入文件，或各子命令的 --input）可以是 JSON 对象、JSON 数组或 JSONL，
+每个任务一个对象，"-" 表示从标准输入读取：
+    {"id": "a1", "type": "generate", "prompt": "...", "images": ["ref.jpg"], "save_preset": "名称"}
+    {"type": "modify", "preset": "星野", "request": "..."}       # 或 "data": {...}
+    {"type": "image", "preset": "星野", "aspect_ratio": "16:9", "image_size": "2K", "count": 2}
+                                                                 # 或 "prompt": "..." / "data": {...}
+子命令中的参数作为任务未填写字段的默认值；JSONL 中只有字符串的行视为 prompt / request。
+
+结果以 JSONL 输出到标准输出（或 --output 指定的文件），每个任务完成时立即输出一行：
+    {"event": "result", "id": "a1", "type": "generate", "ok": true, "data": {...}, "cached": false, ...}
+加 --stream 时生成过程中额外输出 {"event": "chunk", "id": "a1", "text": "..."}。
+全部成功时退出码为 0，有任务失败时为 1。
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+from contextlib import redirect_stdout
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, List, Optional
+
+# 确保src目录在路径中
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from utils.client_pool import MAX_CONNECTIONS, close_all_clients
+from utils.image_cache import get_image_cache
+from utils.jobs import DEFAULT_ASPECT_RATIO, DEFAULT_IMAGE_SIZE, JOB_TYPES, JobRunner
+from utils.rate_limiter import rate_limit_stats
+
+
+class JsonlWriter:
+    """线程安全的 JSONL 输出，每行写入后立即刷新"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self._lock = threading.Lock()
+
+    def write(self, record: dict):
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            self.stream.write(line + "\n")
+            self.stream.flush()
+
+
+def read_jobs(path: str) -> List[dict]:
+    """
+    读取任务文件（JSON 对象 / JSON 数组 / JSONL），"-" 表示标准输入
+
+    :raises ValueError: 内容不是有效的 JSON / JSONL 时
+    """
+    if path == "-":
+        text = sys.stdin.read()
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+
+    stripped = text.strip()
+    if not stripped:
+        return []
+    try:
+        data = json.loads(stripped)
+    except json.JSONDecodeError:
+        data = None
+    else:
+        if isinstance(data, list):
+            return data
+        if isinstance(data, dict):
+            return [data]
+
+    jobs = []
+    for line_no, line in enumerate(text.splitlines(), 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            jobs.append(json.loads(line))
+        except json.JSONDecodeError as e:
+            raise ValueError(f"第 {line_no} 行不是有效的 JSON: {e}")
+    return jobs
+
+
+def _load_json_arg(value: str):
+    """--data 参数：JSON 文本或 JSON 文件路径"""
+    if os.path.isfile(value):
+        with open(value, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return json.loads(value)
+
+
+class CliRunner:
+    """并发执行命令行任务，每个任务的结果写为一行 JSONL"""
+
+    def __init__(
+        self,
+        writer: JsonlWriter,
+        use_cache: bool = True,
+        stream: bool = False,
+        out_dir: str = ".",
+        jobs: int = 1,
+    ):
+        self.writer = writer
+        self.stream = stream
+        self.jobs = max(1, jobs)
+        self.runner = JobRunner(out_dir=out_dir, use_cache=use_cache)
+
+    def run_job(self, index: int, job) -> dict:
+        """执行单个任务，返回结果记录（--stream 时输出增量内容，重试提示输出到标准错误）"""
+        job_id = str(job.get("id") or index + 1) if isinstance(job, dict) else str(index + 1)
+
+        def on_event(event):
+            if event["event"] == "chunk" and self.stream:
+                self.writer.write({"event": "chunk", "id": job_id, "text": event["text"]})
+            elif event["event"] == "retry":
+                print(f"[{job_id}] {event['message']}", file=sys.stderr)
+
+        out_dir = job.get("out_dir") if isinstance(job, dict) else None
+        record = self.runner.run_job(job, job_id, on_event=on_event, out_dir=out_dir)
+        return {"event": "result", **record, "index": index}
+
+    def run(self, jobs: list, on_result: Callable[[dict], None]) -> int:
+        """
+        并发执行任务，每个任务完成时回调 on_result
+
+        :return: 失败的任务数
+        """
+        failed = 0
+        executor = ThreadPoolExecutor(max_workers=self.jobs, thread_name_prefix="cli-job")
+        try:
+            futures = [executor.submit(self.run_job, i, job) for i, job in enumerate(jobs)]
+            for future in as_completed(futures):
+                record = future.result()
+                if not record["ok"]:
+                    failed += 1
+                on_result(record)
+        except KeyboardInterrupt:
+            self.runner.cancel()
+            raise
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+        return failed
+
+
+def _job_from_args(command: str, args: argparse.Namespace) -> dict:
+    """由子命令参数生成任务（也作为 --input 中任务的默认值）"""
+    job = {"type": command}
+    if args.image:
+        job["images"] = args.image
+    if command in ("generate", "modify") and args.save_preset:
+        job["save_preset"] = args.save_preset
+    if command == "generate":
+        if args.prompt:
+            job["prompt"] = args.prompt
+    elif command == "modify":
+        if args.request:
+            job["request"] = args.request
+        if args.preset:
+            job["preset"] = args.preset
+        if args.data:
+            job["data"] = _load_json_arg(args.data)
+    elif command == "image":
+        if args.prompt:
+            job["prompt"] = args.prompt
+        if args.preset:
+            job["preset"] = args.preset
+        if args.data:
+            job["data"] = _load_json_arg(args.data)
+        if args.requirement:
+            job["requirement"] = args.requirement
+        job["aspect_ratio"] = args.aspect_ratio
+        job["image_size"] = args.size
+        job["count"] = args.count
+        if args.reuse:
+            job["reuse"] = True
+    return job
+
+
+def _collect_jobs(args: argparse.Namespace) -> list:
+    """根据子命令参数和输入文件整理任务列表"""
+    command = args.command
+    if command == "batch":
+        defaults = {"type": args.type}
+        source = args.input
+    else:
+        defaults = _job_from_args(command, args)
+        source = args.input
+        if not source:
+            return [defaults]
+
+    text_field = "request" if defaults["type"] == "modify" else "prompt"
+    jobs = []
+    for job in read_jobs(source):
+        if isinstance(job, str):
+            job = {text_field: job}
+        elif not isinstance(job, dict):
+            raise ValueError(f"任务必须是对象或字符串: {job!r}")
+        jobs.append({**defaults, **job})
+    return jobs
+
+
+def build_parser() -> argparse.ArgumentParser:
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("-j", "--jobs", type=int, default=1, help="同时执行的任务数（默认 1）")
+    common.add_argument("-o", "--output", help="结果 JSONL 输出文件（默认标准输出）")
+    common.add_argument("--no-cache", action="store_true", help="跳过响应缓存，强制重新请求")
+    common.add_argument("--stream", action="store_true", help="输出生成过程中的增量内容")
+    common.add_argument("--out-dir", default=".", help="图片保存目录（默认当前目录）")
+
+    parser = argparse.ArgumentParser(
+        prog="python -m nano_banana",
+        description="Nano Banana 命令行工具：生成/修改结构化提示词、生成图片",
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("generate", parents=[common], help="根据描述生成提示词")
+    p.add_argument("prompt", nargs="?", help="画面描述")
+    p.add_argument("-i", "--image", action="append", help="参考图（可重复）")
+    p.add_argument("--save-preset", help="保存为预设的名称")
+    p.add_argument("--input", help="任务文件（JSON / JSONL，- 为标准输入）")
+
+    p = sub.add_parser("modify", parents=[common], help="按要求修改已有提示词")
+    p.add_argument("request", nargs="?", help="修改要求")
+    p.add_argument("--preset", help="要修改的预设名称")
+    p.add_argument("--data", help="要修改的提示词（JSON 文本或文件）")
+    p.add_argument("-i", "--image", action="append", help="参考图（可重复）")
+    p.add_argument("--save-preset", help="保存为预设的名称")
+    p.add_argument("--input", help="任务文件（JSON / JSONL，- 为标准输入）")
+
+    p = sub.add_parser("image", parents=[common], help="调用 Gemini 生成图片")
+    p.add_argument("prompt", nargs="?", help="生图提示词")
+    p.add_argument("--preset", help="使用预设作为提示词")
+    p.add_argument("--data", help="结构化提示词（JSON 文本或文件）")
+    p.add_argument("--requirement", help="特别要求，追加在提示词后")
+    p.add_argument("-i", "--image", action="append", help="参考图（可重复）")
+    p.add_argument("--aspect-ratio", default=DEFAULT_ASPECT_RATIO, help="宽高比（默认 1:1）")
+    p.add_argument("--size", default=DEFAULT_IMAGE_SIZE, help="输出尺寸 1K / 2K / 4K（默认 1K）")
+    p.add_argument("--count", type=int, default=1, help="生成数量（默认 1）")
+    p.add_argument("--reuse", action="store_true", help="相同请求直接复用归档中的图片")
+    p.add_argument("--input", help="任务文件（JSON / JSONL，- 为标准输入）")
+
+    p = sub.add_parser("serve", help="启动本地任务服务（HTTP 接口，见 server.py）")
+    p.add_argument("--host", help="监听地址（默认读取配置，127.0.0.1）")
+    p.add_argument("--port", type=int, help="端口（默认读取配置，8765）")
+    p.add_argument("--workers", type=int, help="同时执行的任务数（默认读取配置，2）")
+    p.add_argument("--no-cache", action="store_true", help="跳过响应缓存，强制重新请求")
+
+    p = sub.add_parser("batch", parents=[common], help="执行任务文件中的混合任务")
+    p.add_argument("input", help="任务文件（JSON / JSONL，- 为标准输入）")
+    p.add_argument("--type", choices=JOB_TYPES, default="generate", help="未指定 type 的任务类型（默认 generate）")
+
+    return parser
+
+
+def _serve(args: argparse.Namespace) -> int:
+    from server import serve
+    from utils.ai_config import AIConfigManager
+
+    config = AIConfigManager().get_job_server_config()
+    try:
+        return serve(
+            args.host or config["host"],
+            args.port or config["port"],
+            args.workers or config["workers"],
+            use_cache=not args.no_cache,
+        )
+    finally:
+        close_all_clients()
+
+
+def _print_rate_limit_stats():
+    """有请求因限流排队时，输出排队统计（用于评估额度）"""
+    for stats in rate_limit_stats():
+        if stats["waited"]:
+            print(
+                f"限流 {stats['name']}: {stats['waited']}/{stats['requests']} 个请求排队，"
+                f"平均等待 {stats['avg_wait']:.1f} 秒，最长 {stats['max_wait']:.1f} 秒，"
+                f"最多同时排队 {stats['max_queued']} 个",
+                file=sys.stderr,
+            )
+
+
+def _print_image_cache_stats():
+    """用到参考图时，输出参考图编码缓存的命中统计"""
+    stats = get_image_cache().stats()
+    total = stats["hits"] + stats["disk_hits"] + stats["misses"]
+    if total:
+        print(
+            f"参考图缓存: {total} 次读取，内存命中 {stats['hits']}，磁盘命中 {stats['disk_hits']}，"
+            f"重新编码 {stats['misses']}，淘汰 {stats['evictions']}",
+            file=sys.stderr,
+        )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.command == "serve":
+        return _serve(args)
+    try:
+        jobs = _collect_jobs(args)
+    except (OSError, ValueError) as e:
+        print(f"读取任务失败: {e}", file=sys.stderr)
+        return 2
+
+    output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    runner = CliRunner(
+        JsonlWriter(output),
+        use_cache=not args.no_cache,
+        stream=args.stream,
+        out_dir=args.out_dir,
+        jobs=min(args.jobs, MAX_CONNECTIONS),
+    )
+    try:
+        # 结果独占标准输出，其他模块打印的日志改为输出到标准错误
+        with redirect_stdout(sys.stderr):
+            failed = runner.run(jobs, runner.writer.write)
+    except KeyboardInterrupt:
+        print("已中断", file=sys.stderr)
+        return 130
+    finally:
+        close_all_clients()
+        if output is not sys.stdout:
+            output.close()
+    _print_rate_limit_stats()
+    _print_image_cache_stats()
+    if failed:
+        print(f"{failed}/{len(jobs)} 个任务失败", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
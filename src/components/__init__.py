@@ -1,8 +1,21 @@
 # Components package
-from .combo_input import ComboInput
-from .field_group import FieldGroup
-from .aspect_ratio_selector import AspectRatioSelector
-from .multi_select import MultiSelectInput
+# 控件按需导入，使命令行等无界面场景可以单独使用 components.gemini_client 而不加载 Qt 控件
+import importlib
+
+_EXPORTS = {
+    "ComboInput": ".combo_input",
+    "FieldGroup": ".field_group",
+    "AspectRatioSelector": ".aspect_ratio_selector",
+    "MultiSelectInput": ".multi_select",
+}
 
 __all__ = ["ComboInput", "FieldGroup", "AspectRatioSelector", "MultiSelectInput"]
 
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
@@ -27,6 +27,7 @@ from PyQt6.QtGui import QFont, QIcon, QPixmap
 
 from utils.ai_config import AIConfigManager
 from utils.ai_service import AIService
+from utils.image_preprocess import prefetch_reference_images
 
 
 class AIConfigDialog(QDialog):
@@ -455,6 +456,8 @@ class AIGenerateDialog(QDialog):
     
     # 生成完成信号，传递生成的数据
     generated = pyqtSignal(dict)
+    # 实时填充信号，传递流式解析出的字段 (路径, 值)
+    field_streamed = pyqtSignal(object, object)
     
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -698,6 +701,16 @@ class AIGenerateDialog(QDialog):
         self.status_label.setStyleSheet("color: #757575; font-size: 12px;")
         output_header.addWidget(self.status_label)
         output_header.addStretch()
+        
+        # 实时填充：每个字段生成完成后立即写入主界面表单
+        self.live_fill_checkbox = QCheckBox("实时填充表单")
+        self.live_fill_checkbox.setToolTip("字段生成完成后立即填入主界面表单，无需等待全部生成")
+        self.live_fill_checkbox.setStyleSheet("font-size: 12px; color: #595959;")
+        output_header.addWidget(self.live_fill_checkbox)
+        self.bypass_cache_checkbox = QCheckBox("跳过缓存")
+        self.bypass_cache_checkbox.setToolTip("相同请求默认直接使用上次的结果，勾选后重新请求AI")
+        self.bypass_cache_checkbox.setStyleSheet("font-size: 12px; color: #595959;")
+        output_header.addWidget(self.bypass_cache_checkbox)
         output_frame_layout.addLayout(output_header)
         
         self.output_display = QTextEdit()
@@ -798,6 +811,12 @@ class AIGenerateDialog(QDialog):
             if path not in self.selected_images:
                 self.selected_images.append(path)
                 self._append_image_item(path)
+
+        # 后台预处理参考图，发起请求时直接命中缓存
+        prefetch_reference_images(
+            files[:remaining],
+            self.config_manager.get_image_preprocess_config("openai"),
+        )
     
     def _append_image_item(self, path: str):
         """添加图片项到列表"""
@@ -890,6 +909,8 @@ class AIGenerateDialog(QDialog):
             on_progress=self._on_generate_progress,
             on_stream_chunk=self._on_stream_chunk,
             on_stream_done=self._on_stream_done,
+            on_field_ready=self._on_field_ready,
+            use_cache=not self.bypass_cache_checkbox.isChecked(),
         )
     
     def _set_generating_ui(self, generating: bool):
@@ -923,6 +944,11 @@ class AIGenerateDialog(QDialog):
         scrollbar = self.output_display.verticalScrollBar()
         scrollbar.setValue(scrollbar.maximum())
     
+    def _on_field_ready(self, path: tuple, value):
+        """字段流式解析完成"""
+        if self.live_fill_checkbox.isChecked():
+            self.field_streamed.emit(path, value)
+    
     def _on_stream_done(self, full_content: str):
         """流式完成"""
         self._is_generating = False
@@ -1261,6 +1287,10 @@ class AIModifyDialog(QDialog):
         self.status_label.setStyleSheet("color: #757575; font-size: 12px;")
         output_header.addWidget(self.status_label)
         output_header.addStretch()
+        self.bypass_cache_checkbox = QCheckBox("跳过缓存")
+        self.bypass_cache_checkbox.setToolTip("相同请求默认直接使用上次的结果，勾选后重新请求AI")
+        self.bypass_cache_checkbox.setStyleSheet("font-size: 12px; color: #595959;")
+        output_header.addWidget(self.bypass_cache_checkbox)
         output_frame_layout.addLayout(output_header)
         
         # 结果显示堆栈
@@ -1403,6 +1433,12 @@ class AIModifyDialog(QDialog):
             if path not in self.selected_images:
                 self.selected_images.append(path)
                 self._append_image_item(path)
+
+        # 后台预处理参考图，发起请求时直接命中缓存
+        prefetch_reference_images(
+            files[:remaining],
+            self.config_manager.get_image_preprocess_config("openai"),
+        )
     
     def _append_image_item(self, path: str):
         """添加图片项到列表"""
@@ -1517,6 +1553,7 @@ class AIModifyDialog(QDialog):
             on_progress=self._on_generate_progress,
             on_stream_chunk=self._on_stream_chunk,
             on_stream_done=self._on_stream_done,
+            use_cache=not self.bypass_cache_checkbox.isChecked(),
         )
 
     def _set_generating_ui(self, generating: bool):
@@ -1,7 +1,7 @@
 """AI 生图对话框"""
 
 import os
-from io import BytesIO
+from concurrent.futures import FIRST_COMPLETED, wait
 from typing import List, Optional
 
 from PyQt6.QtCore import Qt, QThread, pyqtSignal
@@ -25,18 +25,19 @@ from PyQt6.QtWidgets import (
 )
 
 from utils.ai_config import AIConfigManager
+from utils.retry import format_retry_message
 from components.gemini_client import (
     ASPECT_RATIO_LIST,
     IMAGE_SIZE_LIST,
     THINKING_LEVEL_LIST,
-    GeminiClient,
+    create_gemini_client,
 )
 
 
 class GeminiImageThread(QThread):
     """后台线程：调用 Gemini 接口生成图片"""
 
-    image_ready = pyqtSignal(bytes)
+    image_ready = pyqtSignal(bytes, str)   # (原始图片字节, MIME类型)
     error = pyqtSignal(str)
     progress = pyqtSignal(str)
 
@@ -47,6 +48,7 @@ class GeminiImageThread(QThread):
         aspect_ratio: str,
         image_size: str,
         thinking_level: str,
+        reuse_results: bool = False,
     ):
         super().__init__()
         self.prompt = prompt
@@ -54,42 +56,124 @@ class GeminiImageThread(QThread):
         self.aspect_ratio = aspect_ratio
         self.image_size = image_size
         self.thinking_level = thinking_level
+        self.reuse_results = reuse_results
 
     def run(self):
         try:
             self.progress.emit("正在初始化 Gemini 客户端...")
-            config_manager = AIConfigManager()
-            gemini_config = config_manager.get_gemini_config()
-
-            base_url = (gemini_config.get("base_url") or "").strip()
-            api_key = (gemini_config.get("api_key") or "").strip()
-            model = (gemini_config.get("model") or "gemini-3-pro-image-preview").strip() or "gemini-3-pro-image-preview"
-
-            if not base_url or not api_key:
-                self.error.emit("请先在配置中填写 Gemini Base URL 和 API Key")
+            try:
+                client = create_gemini_client(
+                    AIConfigManager(),
+                    self.aspect_ratio,
+                    self.image_size,
+                    self.thinking_level,
+                    reuse_results=self.reuse_results,
+                )
+            except ValueError as exc:
+                self.error.emit(str(exc))
                 return
-
-            client = GeminiClient(
-                base_url=base_url,
-                api_key=api_key,
-                image_model=model,
+            client.set_retry_listener(
+                lambda attempt, max_retries, delay, exc: self.progress.emit(
+                    format_retry_message(attempt, max_retries, delay, exc)
+                )
             )
-            client.set_aspect_ratio(self.aspect_ratio)
-            client.set_image_size(self.image_size)
-            client.set_thinking_level(self.thinking_level)
 
             self.progress.emit("正在生成图片...")
-            image = client.generate_image(
+            image_data = client.generate_image_bytes(
                 text=self.prompt,
                 images=self.image_paths if self.image_paths else None,
             )
-            if image is None:
+            if image_data is None:
                 self.error.emit("未生成图片，请尝试调整提示词或参数")
                 return
 
-            buffer = BytesIO()
-            image.save(buffer, format="PNG")
-            self.image_ready.emit(buffer.getvalue())
+            # 直接传递接口返回的原始数据，由界面解码一次用于显示
+            self.image_ready.emit(*image_data)
+        except Exception as exc:  # noqa: BLE001
+            self.error.emit(str(exc))
+
+
+class GeminiVariantsThread(QThread):
+    """后台线程：在 Gemini 异步事件循环中并发生成多张候选图，每完成一张立即发送"""
+
+    variant_ready = pyqtSignal(int, bytes, str)   # (序号, 原始图片字节, MIME类型)
+    variant_failed = pyqtSignal(int, str)    # (序号, 错误信息)
+    error = pyqtSignal(str)
+    progress = pyqtSignal(str)
+
+    def __init__(
+        self,
+        prompt: str,
+        image_paths: List[str],
+        aspect_ratio: str,
+        image_size: str,
+        thinking_level: str,
+        count: int,
+        max_concurrency: int,
+    ):
+        super().__init__()
+        self.prompt = prompt
+        self.image_paths = image_paths
+        self.aspect_ratio = aspect_ratio
+        self.image_size = image_size
+        self.thinking_level = thinking_level
+        self.count = max(1, count)
+        self.max_concurrency = max(1, max_concurrency)
+        self._cancelled = False
+
+    def cancel(self):
+        """停止剩余候选图：排队中和进行中的请求都会被取消"""
+        self._cancelled = True
+
+    def run(self):
+        try:
+            self.progress.emit("正在初始化 Gemini 客户端...")
+            try:
+                client = create_gemini_client(
+                    AIConfigManager(),
+                    self.aspect_ratio,
+                    self.image_size,
+                    self.thinking_level,
+                    max_concurrency=self.max_concurrency,
+                )
+            except ValueError as exc:
+                self.error.emit(str(exc))
+                return
+            client.set_retry_listener(
+                lambda attempt, max_retries, delay, exc: self.progress.emit(
+                    format_retry_message(attempt, max_retries, delay, exc)
+                )
+            )
+
+            self.progress.emit(f"正在生成 {self.count} 张候选图...")
+            images = self.image_paths if self.image_paths else None
+            futures = {
+                client.submit(client.agenerate_image_bytes(text=self.prompt, images=images)): index
+                for index in range(self.count)
+            }
+            pending = set(futures)
+            completed = 0
+            try:
+                while pending and not self._cancelled:
+                    done, pending = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        index = futures[future]
+                        completed += 1
+                        try:
+                            image_data = future.result()
+                        except Exception as exc:  # noqa: BLE001
+                            self.variant_failed.emit(index, str(exc))
+                        else:
+                            if image_data is None:
+                                self.variant_failed.emit(index, "未生成图片")
+                            else:
+                                self.variant_ready.emit(index, *image_data)
+                        self.progress.emit(f"已完成 {completed}/{self.count} 张")
+            finally:
+                # 取消排队中和进行中的请求，不等待其结束
+                client.cancel_all()
+            if self._cancelled:
+                self.progress.emit(f"已停止，完成 {completed}/{self.count} 张")
         except Exception as exc:  # noqa: BLE001
             self.error.emit(str(exc))
 
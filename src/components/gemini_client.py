@@ -23,17 +23,34 @@ Gemini AI 客户端封装模块
     # 图片编辑
     image = client.generate_image("把水果换成香蕉", images=["input.jpg"])
     image.save("edited.png")
+    
+    # 异步接口（同一事件循环可同时驱动多个请求，并发数受 max_concurrency 限制）
+    images = await asyncio.gather(*[client.agenerate_image("画一只柴犬") for _ in range(4)])
 """
 
 import os
 import base64
+import hashlib
+import asyncio
+import threading
+import weakref
+from concurrent.futures import Future
 from io import BytesIO
-from typing import List, Union, Optional, Tuple
-from PIL import Image
+from typing import TYPE_CHECKING, Awaitable, Callable, Dict, List, Union, Optional, Tuple
 from loguru import logger
 
-from google import genai
-from google.genai import types
+from utils.ai_config import AIConfigManager
+from utils.image_cache import get_image_cache
+from utils.image_preprocess import encode_reference_image, make_variant
+from utils.image_store import ImageStore, get_image_store, make_fingerprint
+from utils.rate_limiter import IMAGE_TOKENS, estimate_text_tokens, get_rate_limiter, resolve_limits
+from utils.retry import RetryPolicy, acall_with_retry, format_retry_message
+
+# google-genai 与 Pillow 导入较慢，只在首次使用时加载（见 _genai_types）
+if TYPE_CHECKING:
+    from PIL import Image
+    from google import genai
+    from google.genai import types
 
 os.environ['NO_PROXY'] = '*'
 os.environ['HTTP_PROXY'] = ''
@@ -43,6 +60,69 @@ ASPECT_RATIO_LIST = ["1:1", "2:3", "3:2", "3:4", "4:3", "4:5", "5:4", "9:16", "1
 IMAGE_SIZE_LIST = ["1K", "2K", "4K"]
 THINKING_LEVEL_LIST = ["none", "low", "medium", "high"]
 
+# 单个客户端默认的最大并发请求数
+DEFAULT_MAX_CONCURRENCY = 4
+
+# 按 (base_url, api_key) 共享的 genai.Client，复用底层连接
+_genai_clients: Dict[Tuple[str, str], "genai.Client"] = {}
+_genai_clients_lock = threading.Lock()
+
+# 阻塞接口共用的后台事件循环
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def _genai_types():
+    """google.genai.types 模块（首次调用时导入 google-genai）"""
+    from google.genai import types
+    return types
+
+
+def _client_key(base_url, api_key) -> Tuple[str, str]:
+    """共享客户端的键：去掉首尾空白和 base_url 末尾的斜杠"""
+    return str(base_url or "").strip().rstrip("/"), str(api_key or "").strip()
+
+
+def _get_genai_client(base_url: str, api_key: str) -> "genai.Client":
+    """获取（或创建）共享的 genai.Client"""
+    key = _client_key(base_url, api_key)
+    with _genai_clients_lock:
+        client = _genai_clients.get(key)
+        if client is None:
+            from google import genai
+            types = _genai_types()
+            client = genai.Client(
+                http_options=types.HttpOptions(base_url=key[0]),
+                api_key=key[1]
+            )
+            _genai_clients[key] = client
+        return client
+
+
+def _on_config_changed(config: dict):
+    """Gemini 地址或密钥变化时丢弃旧的 genai.Client，下次请求按新配置创建"""
+    current = _client_key(config.get("gemini_base_url"), config.get("gemini_api_key"))
+    with _genai_clients_lock:
+        for key in [key for key in _genai_clients if key != current]:
+            del _genai_clients[key]
+
+
+AIConfigManager.subscribe(_on_config_changed)
+
+
+def _get_event_loop() -> asyncio.AbstractEventLoop:
+    """获取后台事件循环（首次调用时在守护线程中启动）"""
+    global _loop
+    with _loop_lock:
+        if _loop is None or _loop.is_closed():
+            _loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=_loop.run_forever,
+                name="gemini-aio",
+                daemon=True,
+            ).start()
+        return _loop
+
 
 class GeminiClient:
     """Gemini AI 客户端封装类"""
@@ -52,7 +132,8 @@ class GeminiClient:
         base_url: str,
         api_key: str,
         text_model: str = "gemini-3-pro-preview",
-        image_model: str = "gemini-3-pro-image-preview"
+        image_model: str = "gemini-3-pro-image-preview",
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY
     ):
         """
         初始化 Gemini 客户端
@@ -62,6 +143,7 @@ class GeminiClient:
             api_key: API 密钥
             text_model: 文本模型名称（用于对话，可识图）
             image_model: 图片生成模型名称
+            max_concurrency: 同时进行的最大请求数
         """
         self.base_url = base_url.rstrip('/')
         self.api_key = api_key
@@ -73,11 +155,34 @@ class GeminiClient:
         self.image_size = "2K"
         self.thinking_level = "low"
         
-        # 初始化客户端
-        self.client = genai.Client(
-            http_options=types.HttpOptions(base_url=self.base_url),
-            api_key=self.api_key
+        # 参考图预处理配置（None 表示原样上传）
+        self.image_preprocess: Optional[dict] = None
+        
+        # 生成结果归档；reuse_results 为 True 时相同请求直接返回归档中的图片
+        self.image_store: Optional[ImageStore] = None
+        self.reuse_results = False
+        
+        # 并发控制：每个事件循环一个信号量
+        self.max_concurrency = max(1, max_concurrency)
+        # 事件循环关闭并被回收后对应的信号量自动移除
+        self._semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+            weakref.WeakKeyDictionary()
         )
+        self._semaphores_lock = threading.Lock()
+        
+        # 失败重试策略；on_retry 在每次重试前调用 (第几次重试, 最多重试次数, 等待秒数, 异常)
+        self.retry_policy = RetryPolicy()
+        self.on_retry: Optional[Callable[[int, int, float, BaseException], None]] = None
+        
+        # 限流配置（见 AIConfigManager.get_rate_limit_config），None 表示不限流
+        self.rate_limit: Optional[dict] = None
+        
+        # 通过阻塞接口提交、尚未完成的请求（用于 cancel_all）
+        self._pending: set = set()
+        self._pending_lock = threading.Lock()
+        
+        # 同一配置共享客户端，复用连接
+        self.client = _get_genai_client(self.base_url, self.api_key)
         
         logger.info(f"[GeminiClient] 初始化完成，API地址: {self.base_url}")
     
@@ -102,34 +207,70 @@ class GeminiClient:
         self.thinking_level = level
         return self
     
-    @staticmethod
-    def _get_mime_type(file_path: str) -> str:
-        """根据文件扩展名获取 MIME 类型"""
-        ext = os.path.splitext(file_path)[1].lower()
-        mime_types = {
-            '.jpg': 'image/jpeg',
-            '.jpeg': 'image/jpeg',
-            '.png': 'image/png',
-            '.gif': 'image/gif',
-            '.webp': 'image/webp',
-            '.bmp': 'image/bmp'
-        }
-        return mime_types.get(ext, 'image/jpeg')
+    def set_image_preprocess(self, options: Optional[dict]) -> "GeminiClient":
+        """设置参考图预处理配置（见 AIConfigManager.get_image_preprocess_config）"""
+        self.image_preprocess = options
+        return self
     
-    @staticmethod
-    def _load_image_as_base64(image_path: str) -> Tuple[str, str]:
+    def set_image_store(self, store: Optional[ImageStore], reuse: bool = False) -> "GeminiClient":
+        """
+        设置生成图片仓库
+        
+        Args:
+            store: 图片仓库，所有生成结果都会归档；None 表示不归档
+            reuse: 是否对相同请求（提示词、模型、宽高比、尺寸、参考图均一致）直接复用已有结果
+        """
+        self.image_store = store
+        self.reuse_results = reuse
+        return self
+    
+    def set_retry_policy(self, policy: RetryPolicy) -> "GeminiClient":
+        """设置失败重试策略（见 AIConfigManager.get_retry_config）"""
+        self.retry_policy = policy
+        return self
+    
+    def set_retry_listener(
+        self, callback: Optional[Callable[[int, int, float, BaseException], None]]
+    ) -> "GeminiClient":
+        """设置重试回调（在后台事件循环线程中调用），用于显示重试进度"""
+        self.on_retry = callback
+        return self
+    
+    def set_rate_limit(self, config: Optional[dict]) -> "GeminiClient":
+        """设置限流配置，同一 API 地址和模型的请求在进程内共享额度"""
+        self.rate_limit = config
+        return self
+    
+    async def _wait_rate_limit(self, model: str, tokens: int):
+        """按限流额度排队等待（不占用并发名额）"""
+        if self.rate_limit is None:
+            return
+        limiter = get_rate_limiter("gemini", self.base_url, model, self.rate_limit)
+        delay = limiter.reserve(tokens)
+        if delay > 0:
+            logger.info(
+                f"[GeminiClient] 已达到速率限制，排队等待 {delay:.1f} 秒"
+                f"（队列中 {limiter.queued + 1} 个请求）: {model}"
+            )
+            await limiter.async_wait(delay)
+    
+    def _notify_retry(self, attempt: int, delay: float, error: BaseException):
+        max_retries = self.retry_policy.max_retries
+        logger.warning(f"[GeminiClient] {format_retry_message(attempt, max_retries, delay, error)} 错误: {error}")
+        if self.on_retry is not None:
+            self.on_retry(attempt, max_retries, delay, error)
+    
+    def _load_image_as_base64(self, image_path: str) -> Tuple[str, str]:
         """
-        读取图片文件并转为 base64
+        读取图片文件，预处理后转为 base64（通过共享缓存，重复请求不再重新编码）
         
         Returns:
             (mime_type, base64_data) 元组
         """
-        mime_type = GeminiClient._get_mime_type(image_path)
-        with open(image_path, 'rb') as f:
-            base64_data = base64.b64encode(f.read()).decode('utf-8')
-        return mime_type, base64_data
+        encoded = encode_reference_image(image_path, self.image_preprocess)
+        return encoded.mime_type, encoded.data
     
-    def _build_parts(self, text: str, images: Optional[List[str]] = None) -> List[types.Part]:
+    def _build_parts(self, text: str, images: Optional[List[str]] = None) -> List["types.Part"]:
         """
         构建请求的 parts 列表
         
@@ -140,6 +281,7 @@ class GeminiClient:
         Returns:
             types.Part 列表
         """
+        types = _genai_types()
         parts = [types.Part(text=text)]
         
         if images:
@@ -158,9 +300,238 @@ class GeminiClient:
                         data=base64_data
                     )
                 ))
+            logger.debug(f"[GeminiClient] 参考图缓存统计: {get_image_cache().stats()}")
         
         return parts
     
+    def _reference_ids(self, images: Optional[List[str]]) -> List[str]:
+        """参考图标识（内容哈希 + 预处理参数），用于计算请求指纹"""
+        ids = []
+        variant = make_variant(self.image_preprocess)
+        for img in images or []:
+            if os.path.isfile(img):
+                encoded = encode_reference_image(img, self.image_preprocess)
+                ids.append(f"{encoded.sha256}:{variant}")
+            else:
+                ids.append(hashlib.sha256(img.encode("utf-8")).hexdigest())
+        return ids
+    
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        """获取当前事件循环对应的并发信号量"""
+        loop = asyncio.get_running_loop()
+        with self._semaphores_lock:
+            semaphore = self._semaphores.get(loop)
+            if semaphore is None:
+                semaphore = asyncio.Semaphore(self.max_concurrency)
+                self._semaphores[loop] = semaphore
+        return semaphore
+    
+    async def _agenerate_content(self, model: str, text: str, images: Optional[List[str]], config):
+        """异步调用 generate_content（受限流和并发信号量限制，失败时按 retry_policy 重试）"""
+        # 图片预处理可能较慢，放到线程中执行，避免阻塞事件循环
+        parts = await asyncio.to_thread(self._build_parts, text, images)
+        contents = [_genai_types().Content(parts=parts)]
+        tokens = (
+            estimate_text_tokens(text)
+            + len(images or ()) * IMAGE_TOKENS["gemini"]
+            + resolve_limits(self.rate_limit, model)["output_tokens"]
+        )
+        
+        async def attempt():
+            # 每次请求（包括重试）都计入额度
+            await self._wait_rate_limit(model, tokens)
+            # 只在请求期间占用并发名额，重试等待时让给其他请求
+            async with self._get_semaphore():
+                return await self.client.aio.models.generate_content(
+                    model=model,
+                    contents=contents,
+                    config=config
+                )
+        
+        # 生成请求不是幂等的（服务端可能已经处理并计费），只在确定未被处理时重试
+        return await acall_with_retry(
+            attempt, self.retry_policy, idempotent=False, on_retry=self._notify_retry
+        )
+    
+    def _image_config(self):
+        types = _genai_types()
+        return types.GenerateContentConfig(
+            image_config=types.ImageConfig(
+                aspect_ratio=self.aspect_ratio,
+                image_size=self.image_size
+            )
+        )
+    
+    @staticmethod
+    def _extract_image_data(response) -> Optional[Tuple[bytes, str]]:
+        """从响应中提取第一张图片的 (原始字节, MIME类型)"""
+        image_parts = [part for part in (response.parts or []) if part.inline_data]
+        if not image_parts:
+            return None
+        inline_data = image_parts[0].inline_data
+        # data 可能是 bytes 或 base64 字符串
+        data = inline_data.data
+        if isinstance(data, bytes):
+            image_bytes = data
+        elif isinstance(data, str):
+            image_bytes = base64.b64decode(data)
+        else:
+            # 尝试直接转 bytes
+            image_bytes = bytes(data)
+        return image_bytes, inline_data.mime_type or "image/png"
+    
+    async def _agenerate_image_data(
+        self,
+        text: str,
+        images: Optional[List[str]],
+        model: str
+    ) -> Tuple[Optional[Tuple[bytes, str]], str]:
+        """
+        生成图片并返回原始数据，配置了图片仓库时先查找、后归档
+        
+        Returns:
+            ((图片字节, MIME类型) 或 None, 文本响应)
+        """
+        fingerprint = None
+        references: List[str] = []
+        if self.image_store is not None:
+            references = await asyncio.to_thread(self._reference_ids, images)
+            fingerprint = make_fingerprint(
+                model, text, self.aspect_ratio, self.image_size, references
+            )
+            if self.reuse_results:
+                cached = await asyncio.to_thread(self.image_store.lookup, fingerprint)
+                if cached is not None:
+                    logger.info(f"[GeminiClient] 复用已生成的图片: {fingerprint[:12]}")
+                    return cached, ""
+        
+        response = await self._agenerate_content(model, text, images, self._image_config())
+        image_data = self._extract_image_data(response)
+        text_response = response.text or ""
+        
+        if image_data is not None and self.image_store is not None:
+            try:
+                await asyncio.to_thread(
+                    self.image_store.put,
+                    fingerprint,
+                    image_data[0],
+                    image_data[1],
+                    {
+                        "model": model,
+                        "prompt": text,
+                        "aspect_ratio": self.aspect_ratio,
+                        "image_size": self.image_size,
+                        "references": references,
+                    },
+                )
+            except Exception as e:
+                logger.warning(f"[GeminiClient] 归档生成图片失败: {e}")
+        return image_data, text_response
+    
+    def submit(self, coro: Awaitable) -> Future:
+        """
+        在后台事件循环中调度协程
+        
+        Returns:
+            concurrent.futures.Future，调用 cancel() 会取消对应的请求
+        """
+        future = asyncio.run_coroutine_threadsafe(coro, _get_event_loop())
+        with self._pending_lock:
+            self._pending.add(future)
+        future.add_done_callback(self._discard_pending)
+        return future
+    
+    def _discard_pending(self, future: Future):
+        with self._pending_lock:
+            self._pending.discard(future)
+    
+    def cancel_all(self):
+        """取消所有通过阻塞接口或 submit 提交、尚未完成的请求"""
+        with self._pending_lock:
+            pending = list(self._pending)
+        for future in pending:
+            future.cancel()
+    
+    async def achat(
+        self,
+        text: str,
+        images: Optional[List[str]] = None,
+        model: Optional[str] = None
+    ) -> str:
+        """文本对话模式的异步版本，参数同 chat"""
+        model = model or self.text_model
+        types = _genai_types()
+        try:
+            response = await self._agenerate_content(
+                model,
+                text,
+                images,
+                types.GenerateContentConfig(
+                    thinking_config=types.ThinkingConfig(thinking_level=self.thinking_level)
+                )
+            )
+            return response.text or ""
+        except asyncio.CancelledError:
+            logger.info("[GeminiClient] chat 已取消")
+            raise
+        except Exception as e:
+            logger.error(f"[GeminiClient] chat 调用失败: {e}")
+            raise
+    
+    async def agenerate_image(
+        self,
+        text: str,
+        images: Optional[List[str]] = None,
+        model: Optional[str] = None
+    ) -> Optional["Image.Image"]:
+        """图片生成模式的异步版本，参数同 generate_image"""
+        image, _ = await self.agenerate_image_with_text(text, images, model)
+        return image
+    
+    async def agenerate_image_bytes(
+        self,
+        text: str,
+        images: Optional[List[str]] = None,
+        model: Optional[str] = None
+    ) -> Optional[Tuple[bytes, str]]:
+        """generate_image_bytes 的异步版本"""
+        model = model or self.image_model
+        try:
+            image_data, text_response = await self._agenerate_image_data(text, images, model)
+            if image_data is None and text_response:
+                logger.warning(f"[GeminiClient] 未生成图片，返回文本: {text_response[:100]}")
+            return image_data
+        except asyncio.CancelledError:
+            logger.info("[GeminiClient] generate_image 已取消")
+            raise
+        except Exception as e:
+            logger.error(f"[GeminiClient] generate_image 调用失败: {e}")
+            raise
+    
+    async def agenerate_image_with_text(
+        self,
+        text: str,
+        images: Optional[List[str]] = None,
+        model: Optional[str] = None
+    ) -> Tuple[Optional["Image.Image"], str]:
+        """图片生成模式的异步版本，同时返回图片和文本，参数同 generate_image_with_text"""
+        model = model or self.image_model
+        try:
+            image_data, text_response = await self._agenerate_image_data(text, images, model)
+            image = None
+            if image_data:
+                from PIL import Image
+                image = Image.open(BytesIO(image_data[0]))
+            if image is None and text_response:
+                logger.warning(f"[GeminiClient] 未生成图片，返回文本: {text_response[:100]}")
+            return image, text_response
+        except asyncio.CancelledError:
+            logger.info("[GeminiClient] generate_image 已取消")
+            raise
+        except Exception as e:
+            logger.error(f"[GeminiClient] generate_image 调用失败: {e}")
+            raise
+    
     def chat(
         self,
         text: str,
@@ -185,28 +556,14 @@ class GeminiClient:
             >>> client.chat("描述这张图片", images=["photo.jpg"])
             '这是一张...'
         """
-        model = model or self.text_model
-        parts = self._build_parts(text, images)
-        
-        try:
-            response = self.client.models.generate_content(
-                model=model,
-                contents=[types.Content(parts=parts)],
-                config=types.GenerateContentConfig(
-                    thinking_config=types.ThinkingConfig(thinking_level=self.thinking_level)
-                )
-            )
-            return response.text or ""
-        except Exception as e:
-            logger.error(f"[GeminiClient] chat 调用失败: {e}")
-            raise
+        return self.submit(self.achat(text, images, model)).result()
     
     def generate_image(
         self,
         text: str,
         images: Optional[List[str]] = None,
         model: Optional[str] = None
-    ) -> Optional[Image.Image]:
+    ) -> Optional["Image.Image"]:
         """
         图片生成模式（传入文本和可选图片，返回生成的图片）
         
@@ -227,57 +584,37 @@ class GeminiClient:
             >>> image = client.generate_image("把水果换成香蕉", images=["fruit.jpg"])
             >>> image.save("edited.png")
         """
-        model = model or self.image_model
-        parts = self._build_parts(text, images)
+        return self.submit(self.agenerate_image(text, images, model)).result()
+    
+    def generate_image_bytes(
+        self,
+        text: str,
+        images: Optional[List[str]] = None,
+        model: Optional[str] = None
+    ) -> Optional[Tuple[bytes, str]]:
+        """
+        图片生成模式，返回接口输出的原始图片数据（不解码、不重新编码）
         
-        try:
-            response = self.client.models.generate_content(
-                model=model,
-                contents=[types.Content(parts=parts)],
-                config=types.GenerateContentConfig(
-                    image_config=types.ImageConfig(
-                        aspect_ratio=self.aspect_ratio,
-                        image_size=self.image_size
-                    )
-                )
-            )
-            
-            # 提取图片
-            image_parts = [part for part in response.parts if part.inline_data]
-            if image_parts:
-                # 从 inline_data 创建 PIL Image
-                inline_data = image_parts[0].inline_data
-                # logger.debug(f"inline_data type: {type(inline_data)}")
-                # logger.debug(f"inline_data.data type: {type(inline_data.data)}")
-                # logger.debug(f"inline_data.data[:50]: {inline_data.data[:50] if inline_data.data else None}")
-                # logger.debug(f"inline_data.mime_type: {inline_data.mime_type}")
-                
-                # data 可能是 bytes 或 base64 字符串
-                data = inline_data.data
-                if isinstance(data, bytes):
-                    image_bytes = data
-                elif isinstance(data, str):
-                    image_bytes = base64.b64decode(data)
-                else:
-                    # 尝试直接转 bytes
-                    image_bytes = bytes(data)
-                return Image.open(BytesIO(image_bytes))
-            
-            # 没有图片，可能返回了文本
-            if response.text:
-                logger.warning(f"[GeminiClient] 未生成图片，返回文本: {response.text[:100]}")
-            return None
-            
-        except Exception as e:
-            logger.error(f"[GeminiClient] generate_image 调用失败: {e}")
-            raise
+        Args:
+            text: 文本提示
+            images: 输入图片列表（可选）
+            model: 指定模型（可选，默认使用 image_model）
+        
+        Returns:
+            (图片字节, MIME类型) 元组，如果没有生成图片则返回 None
+        
+        Examples:
+            >>> data, mime_type = client.generate_image_bytes("画一只可爱的柴犬")
+            >>> open("dog.jpg" if mime_type == "image/jpeg" else "dog.png", "wb").write(data)
+        """
+        return self.submit(self.agenerate_image_bytes(text, images, model)).result()
     
     def generate_image_with_text(
         self,
         text: str,
         images: Optional[List[str]] = None,
         model: Optional[str] = None
-    ) -> Tuple[Optional[Image.Image], str]:
+    ) -> Tuple[Optional["Image.Image"], str]:
         """
         图片生成模式，同时返回图片和可能的文本响应
         
@@ -289,40 +626,43 @@ class GeminiClient:
         Returns:
             (image, text) 元组，image 可能为 None
         """
-        model = model or self.image_model
-        parts = self._build_parts(text, images)
-        
-        try:
-            response = self.client.models.generate_content(
-                model=model,
-                contents=[types.Content(parts=parts)],
-                config=types.GenerateContentConfig(
-                    image_config=types.ImageConfig(
-                        aspect_ratio=self.aspect_ratio,
-                        image_size=self.image_size
-                    )
-                )
-            )
-            
-            # 提取图片
-            image_parts = [part for part in response.parts if part.inline_data]
-            if image_parts:
-                inline_data = image_parts[0].inline_data
-                if isinstance(inline_data.data, bytes):
-                    image_bytes = inline_data.data
-                else:
-                    image_bytes = base64.b64decode(inline_data.data)
-                image = Image.open(BytesIO(image_bytes))
-            else:
-                image = None
-            
-            # 提取文本
-            text_response = response.text or ""
-            
-            return image, text_response
-            
-        except Exception as e:
-            logger.error(f"[GeminiClient] generate_image_with_text 调用失败: {e}")
-            raise
+        return self.submit(self.agenerate_image_with_text(text, images, model)).result()
+
+
+def create_gemini_client(
+    config_manager: AIConfigManager,
+    aspect_ratio: str,
+    image_size: str,
+    thinking_level: str,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    reuse_results: bool = False,
+) -> "GeminiClient":
+    """
+    按当前配置创建 Gemini 客户端，未配置时抛出 ValueError
+
+    启用归档时所有生成结果写入图片仓库；reuse_results 为 True 时相同请求直接复用归档结果。
+    """
+    gemini_config = config_manager.get_gemini_config()
+
+    base_url = (gemini_config.get("base_url") or "").strip()
+    api_key = (gemini_config.get("api_key") or "").strip()
+    model = (gemini_config.get("model") or "gemini-3-pro-image-preview").strip() or "gemini-3-pro-image-preview"
 
+    if not base_url or not api_key:
+        raise ValueError("请先在配置中填写 Gemini Base URL 和 API Key")
 
+    client = GeminiClient(
+        base_url=base_url,
+        api_key=api_key,
+        image_model=model,
+        max_concurrency=max_concurrency,
+    )
+    client.set_aspect_ratio(aspect_ratio)
+    client.set_image_size(image_size)
+    client.set_thinking_level(thinking_level)
+    client.set_image_preprocess(config_manager.get_image_preprocess_config("gemini"))
+    client.set_retry_policy(RetryPolicy.from_config(config_manager.get_retry_config()))
+    client.set_rate_limit(config_manager.get_rate_limit_config("gemini"))
+    if config_manager.get_image_store_config()["enabled"]:
+        client.set_image_store(get_image_store(), reuse=reuse_results)
+    return client
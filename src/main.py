@@ -4,6 +4,7 @@ AI绘画提示词可视化编辑工具
 
 使用方法:
     python main.py
+    python main.py --profile-startup    # 输出启动性能报告
 """
 import sys
 import os
@@ -11,11 +12,24 @@ import os
 # 确保src目录在路径中
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
+# 最先导入，记录启动开始时间；要求时开启启动性能分析（记录之后的模块导入耗时）
+from utils.startup import exit_after_startup, finish_startup, mark, profile_phase, start_profiling
+start_profiling()
+
 from PyQt6.QtWidgets import QApplication, QStyleFactory
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import Qt, QTimer
 from PyQt6.QtGui import QFont, QPalette, QColor
 
 from app import PromptGeneratorApp
+from utils.ai_config import AIConfigManager
+from utils.client_pool import close_all_clients
+from utils.warmup import start_warmup
+from utils.yaml_handler import configure_write_behind, flush_options
+
+mark("imports")
+
+# 窗口显示后等待多久开始后台预加载（毫秒），避免与首次绘制争抢
+WARMUP_DELAY_MS = 300
 
 
 def setup_light_palette(app: QApplication):
@@ -90,10 +104,11 @@ def main():
 
     app = QApplication(sys.argv)
 
-    app.setStyle(QStyleFactory.create("Fusion"))
-    
-    # ===== 应用自定义浅色调色板 =====
-    setup_light_palette(app)
+    with profile_phase("style_and_palette"):
+        app.setStyle(QStyleFactory.create("Fusion"))
+        
+        # ===== 应用自定义浅色调色板 =====
+        setup_light_palette(app)
 
     # 设置应用信息
     app.setApplicationName("Nano Banana 生图工具")
@@ -104,9 +119,33 @@ def main():
     font = QFont("Microsoft YaHei", 10)
     app.setFont(font)
 
+    # 选项编辑延迟合并写入
+    configure_write_behind(**AIConfigManager().get_options_storage_config())
+
+    mark("qapplication")
+
     # 创建并显示主窗口
-    window = PromptGeneratorApp()
-    window.show()
+    with profile_phase("PromptGeneratorApp"):
+        window = PromptGeneratorApp()
+    mark("window_created")
+    with profile_phase("window.show"):
+        window.show()
+    mark("window_shown")
+
+    # 事件循环开始后的第一个回调视为首次绘制完成
+    def _on_started():
+        finish_startup()
+        if exit_after_startup():
+            app.quit()
+        else:
+            # AI 相关依赖在后台预加载，首次使用时无需等待导入
+            QTimer.singleShot(WARMUP_DELAY_MS, start_warmup)
+
+    QTimer.singleShot(0, _on_started)
+
+    # 退出时写入未保存的选项修改，并关闭复用的 AI 连接
+    app.aboutToQuit.connect(flush_options)
+    app.aboutToQuit.connect(close_all_clients)
 
     sys.exit(app.exec())
 
@@ -0,0 +1 @@
+"""命令行入口包：python -m nano_banana（见 cli.py）"""
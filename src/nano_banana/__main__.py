@@ -0,0 +1,10 @@
+"""python -m nano_banana - 命令行工具入口（在 src 目录下运行）"""
+import os
+import sys
+
+# 确保src目录在路径中
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cli import main
+
+sys.exit(main())
@@ -0,0 +1,453 @@
+"""
+本地任务服务 - 多人/脚本共用同一份配置、缓存和预设，通过 HTTP 提交生成任务
+
+使用方法（在 src 目录下）:
+    python -m nano_banana serve [--host 127.0.0.1 --port 8765 --workers 2]
+
+接口（请求和响应均为 JSON，任务格式见 utils/jobs.py）:
+    POST   /jobs                  提交任务（对象或数组），返回 202 和任务记录
+    POST   /generate|/modify|/image  同上，任务类型由路径决定
+    GET    /jobs?status=&limit=   任务列表（按提交时间倒序）
+    GET    /jobs/{id}             任务状态
+    GET    /jobs/{id}/events      SSE 事件流：progress / chunk / image / status，最后为 result
+    GET    /jobs/{id}/result      任务结果（未完成时 409）
+    GET    /jobs/{id}/files/{n}   下载第 n 张生成的图片
+    DELETE /jobs/{id}             取消任务（运行中的任务返回 202 和 cancel_requested，需轮询状态）
+    GET    /presets?q=            预设列表 / 搜索
+    GET    /health                工作线程数、各状态任务数、限流和参考图缓存统计
+
+任务保存在 src/cache/jobs.db，服务重启后未完成的任务继续执行；图片保存在 src/cache/jobs/{id}/。
+"""
+import json
+import mimetypes
+import os
+import re
+import sys
+import threading
+import uuid
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+# 确保src目录在路径中
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from utils.image_cache import get_image_cache
+from utils.job_queue import FINISHED_STATUSES, STATUS_CANCELLED, STATUS_RUNNING, JobQueue
+from utils.jobs import JOB_TYPES, JobRunner
+from utils.preset_manager import PresetManager
+from utils.rate_limiter import rate_limit_stats
+from utils.resource_path import get_cache_dir
+
+
+# 请求体大小上限（字节）
+MAX_BODY_SIZE = 1024 * 1024
+
+# SSE 无新事件时发送心跳的间隔（秒），同时用于发现已断开的连接
+SSE_HEARTBEAT = 15.0
+
+# 工作线程没有任务时的最长等待时间（秒）
+WORKER_IDLE_WAIT = 5.0
+
+
+class JobStream:
+    """运行中任务的事件记录，供 SSE 连接回放和等待新事件"""
+
+    def __init__(self):
+        self.events: List[tuple] = []  # (事件名, 数据)
+        self.done = False
+        self._cond = threading.Condition()
+
+    def append(self, name: str, data: dict):
+        with self._cond:
+            self.events.append((name, data))
+            self._cond.notify_all()
+
+    def finish(self):
+        with self._cond:
+            self.done = True
+            self._cond.notify_all()
+
+    def wait(self, start: int, timeout: float) -> tuple:
+        """等待序号 start 之后的事件，返回 (新事件列表, 是否已结束)"""
+        with self._cond:
+            if start >= len(self.events) and not self.done:
+                self._cond.wait(timeout)
+            return self.events[start:], self.done
+
+
+class JobServer:
+    """任务调度：持久化队列 + 固定数量的工作线程"""
+
+    def __init__(self, workers: int = 2, db_path: Optional[Path] = None, out_dir: Optional[Path] = None,
+                 use_cache: bool = True):
+        self.workers = max(1, workers)
+        self.out_dir = Path(out_dir or get_cache_dir() / "jobs")
+        self.queue = JobQueue(db_path or get_cache_dir() / "jobs.db")
+        self.runner = JobRunner(out_dir=str(self.out_dir), use_cache=use_cache)
+        self.preset_manager = PresetManager()
+        # 未结束任务的事件流；_lock 同时保证“读取状态 + 获取事件流”与“记录结果 + 结束事件流”互斥
+        self._streams: Dict[str, JobStream] = {}
+        self._cancel_requested: set = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition()
+        self._stopping = False
+        self._threads: List[threading.Thread] = []
+
+    # ---------- 工作线程 ----------
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"job-worker-{i + 1}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """停止工作线程；进行中的任务不记录结果，下次启动时重新执行"""
+        self._stopping = True
+        self.runner.cancel()
+        with self._wakeup:
+            self._wakeup.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=5)
+
+    def _work(self):
+        while not self._stopping:
+            row = self.queue.claim()
+            if row is None:
+                with self._wakeup:
+                    self._wakeup.wait(WORKER_IDLE_WAIT)
+                continue
+            self._run(row)
+
+    def _run(self, row: dict):
+        job_id = row["id"]
+        stream = self.get_stream(job_id)
+        stream.append("status", {"status": STATUS_RUNNING})
+        result = self.runner.run_job(
+            row["job"],
+            job_id,
+            on_event=lambda event: stream.append(event["event"], event),
+            cancelled=lambda: job_id in self._cancel_requested,
+            out_dir=str(self.out_dir / job_id),
+        )
+        if self._stopping:
+            # 不记录结果，下次启动时重新执行
+            stream.finish()
+            return
+        with self._lock:
+            cancelled = job_id in self._cancel_requested
+            self._cancel_requested.discard(job_id)
+            self.queue.finish(job_id, result, STATUS_CANCELLED if cancelled else None)
+            self._streams.pop(job_id, None)
+        stream.finish()
+
+    # ---------- 任务 ----------
+
+    @staticmethod
+    def _validate(job) -> dict:
+        """检查任务格式，返回规范化后的任务"""
+        if not isinstance(job, dict):
+            raise ValueError("任务必须是 JSON 对象")
+        job = dict(job)
+        job["type"] = job.get("type") or "generate"
+        if job["type"] not in JOB_TYPES:
+            raise ValueError(f"未知的任务类型: {job['type']}（可选: {', '.join(JOB_TYPES)}）")
+        # 图片保存位置由服务决定
+        job.pop("out_dir", None)
+        return job
+
+    def submit(self, jobs: List[dict]) -> List[dict]:
+        """
+        加入一批任务：全部检查通过后在一个事务中写入，任一任务不正确时都不加入
+
+        :raises ValueError: 任务格式不正确时
+        """
+        checked = []
+        for index, job in enumerate(jobs):
+            try:
+                checked.append(self._validate(job))
+            except ValueError as e:
+                raise ValueError(f"第 {index + 1} 个任务: {e}" if len(jobs) > 1 else str(e))
+        rows = self.queue.submit_many([(uuid.uuid4().hex, job) for job in checked])
+        with self._wakeup:
+            self._wakeup.notify_all()
+        return rows
+
+    def cancel(self, job_id: str) -> Optional[dict]:
+        """
+        取消任务：排队中的直接取消，运行中的在下一个数据块时停止
+
+        :return: 任务记录；运行中的任务附带 cancel_requested=True（此时状态仍为 running）
+        """
+        with self._lock:
+            if not self.queue.cancel_queued(job_id):
+                row = self.queue.get(job_id)
+                if row is None:
+                    return None
+                if row["status"] == STATUS_RUNNING:
+                    self._cancel_requested.add(job_id)
+                    row["cancel_requested"] = True
+                return row
+            stream = self._streams.pop(job_id, None)
+        if stream is not None:
+            stream.finish()
+        return self.queue.get(job_id)
+
+    def get_stream(self, job_id: str) -> Optional[JobStream]:
+        """未结束任务的事件流，任务不存在或已结束时返回 None"""
+        with self._lock:
+            stream = self._streams.get(job_id)
+            if stream is not None:
+                return stream
+            row = self.queue.get(job_id)
+            if row is None or row["status"] in FINISHED_STATUSES:
+                return None
+            stream = self._streams[job_id] = JobStream()
+            return stream
+
+
+def public_job(row: dict) -> dict:
+    """任务记录的对外形式：附带结果下载地址"""
+    row = dict(row)
+    job_id = row["id"]
+    row["links"] = {
+        "self": f"/jobs/{job_id}",
+        "events": f"/jobs/{job_id}/events",
+        "result": f"/jobs/{job_id}/result",
+    }
+    result = row.get("result")
+    if result and result.get("files"):
+        row["links"]["files"] = [f"/jobs/{job_id}/files/{i}" for i in range(len(result["files"]))]
+    return row
+
+
+class JobRequestHandler(BaseHTTPRequestHandler):
+    """HTTP 接口"""
+
+    server_version = "NanoBananaJobServer/1.0"
+
+    ROUTES = [
+        ("GET", re.compile(r"^/health$"), "health"),
+        ("GET", re.compile(r"^/presets$"), "list_presets"),
+        ("GET", re.compile(r"^/jobs$"), "list_jobs"),
+        ("POST", re.compile(r"^/jobs$"), "create_jobs"),
+        ("POST", re.compile(r"^/(generate|modify|image)$"), "create_jobs"),
+        ("GET", re.compile(r"^/jobs/([0-9a-f]+)$"), "get_job"),
+        ("DELETE", re.compile(r"^/jobs/([0-9a-f]+)$"), "cancel_job"),
+        ("GET", re.compile(r"^/jobs/([0-9a-f]+)/events$"), "job_events"),
+        ("GET", re.compile(r"^/jobs/([0-9a-f]+)/result$"), "job_result"),
+        ("GET", re.compile(r"^/jobs/([0-9a-f]+)/files/(\d+)$"), "job_file"),
+    ]
+
+    @property
+    def app(self) -> JobServer:
+        return self.server.app
+
+    def log_message(self, format, *args):
+        sys.stderr.write(f"[{self.log_date_time_string()}] {format % args}\n")
+
+    # ---------- 响应 ----------
+
+    def _send_json(self, status: int, data):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status: int, message: str):
+        self._send_json(status, {"error": message})
+
+    def _read_json(self):
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            raise ValueError("Content-Length 无效")
+        if length < 0:
+            raise ValueError("Content-Length 无效")
+        if length > MAX_BODY_SIZE:
+            raise ValueError("请求体过大")
+        raw = self.rfile.read(length) if length else b""
+        try:
+            return json.loads(raw.decode("utf-8") or "null")
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            raise ValueError(f"请求体不是有效的 JSON: {e}")
+
+    def _dispatch(self, method: str):
+        url = urlparse(self.path)
+        self.query = parse_qs(url.query)
+        for route_method, pattern, handler in self.ROUTES:
+            match = pattern.match(url.path)
+            if match and route_method == method:
+                try:
+                    getattr(self, handler)(*match.groups())
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                except Exception as e:  # noqa: BLE001
+                    self._send_error(HTTPStatus.INTERNAL_SERVER_ERROR, f"{type(e).__name__}: {e}")
+                return
+        self._send_error(HTTPStatus.NOT_FOUND, "接口不存在")
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+    def _job_or_404(self, job_id: str) -> Optional[dict]:
+        row = self.app.queue.get(job_id)
+        if row is None:
+            self._send_error(HTTPStatus.NOT_FOUND, "任务不存在")
+        return row
+
+    # ---------- 接口 ----------
+
+    def health(self):
+        self._send_json(HTTPStatus.OK, {
+            "status": "ok",
+            "workers": self.app.workers,
+            "jobs": self.app.queue.counts(),
+            "rate_limits": rate_limit_stats(),
+            "image_cache": get_image_cache().stats(),
+        })
+
+    def list_presets(self):
+        query = (self.query.get("q") or [""])[0]
+        if query:
+            presets = self.app.preset_manager.search_presets(query)
+        else:
+            presets = [
+                {"name": p["name"], "summary": p.get("summary", "")}
+                for p in self.app.preset_manager.get_all_presets()
+            ]
+        self._send_json(HTTPStatus.OK, {"presets": presets})
+
+    def list_jobs(self):
+        status = (self.query.get("status") or [None])[0]
+        try:
+            limit = int((self.query.get("limit") or [100])[0])
+        except ValueError:
+            limit = 100
+        rows = self.app.queue.list(status, max(1, min(limit, 1000)))
+        self._send_json(HTTPStatus.OK, {"jobs": [public_job(row) for row in rows]})
+
+    def create_jobs(self, job_type: Optional[str] = None):
+        try:
+            body = self._read_json()
+            jobs = body if isinstance(body, list) else [body]
+            if job_type:
+                jobs = [dict(job, type=job_type) if isinstance(job, dict) else job for job in jobs]
+            rows = self.app.submit(jobs)
+        except ValueError as e:
+            self._send_error(HTTPStatus.BAD_REQUEST, str(e))
+            return
+        rows = [public_job(row) for row in rows]
+        self._send_json(HTTPStatus.ACCEPTED, {"jobs": rows} if isinstance(body, list) else rows[0])
+
+    def get_job(self, job_id: str):
+        row = self._job_or_404(job_id)
+        if row is not None:
+            self._send_json(HTTPStatus.OK, public_job(row))
+
+    def cancel_job(self, job_id: str):
+        row = self.app.cancel(job_id)
+        if row is None:
+            self._send_error(HTTPStatus.NOT_FOUND, "任务不存在")
+        elif row.get("cancel_requested"):
+            # 运行中的任务只是请求取消，客户端需轮询状态确认
+            self._send_json(HTTPStatus.ACCEPTED, public_job(row))
+        else:
+            self._send_json(HTTPStatus.OK, public_job(row))
+
+    def job_result(self, job_id: str):
+        row = self._job_or_404(job_id)
+        if row is None:
+            return
+        if row["status"] not in FINISHED_STATUSES:
+            self._send_error(HTTPStatus.CONFLICT, f"任务尚未完成（{row['status']}）")
+            return
+        self._send_json(HTTPStatus.OK, public_job(row)["result"] or {"ok": False, "error": row["error"]})
+
+    def job_file(self, job_id: str, index: str):
+        row = self._job_or_404(job_id)
+        if row is None:
+            return
+        files = (row.get("result") or {}).get("files") or []
+        index = int(index)
+        if index >= len(files) or not os.path.isfile(files[index]):
+            self._send_error(HTTPStatus.NOT_FOUND, "文件不存在")
+            return
+        path = files[index]
+        with open(path, "rb") as f:
+            data = f.read()
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", mimetypes.guess_type(path)[0] or "application/octet-stream")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Content-Disposition", f'attachment; filename="{os.path.basename(path)}"')
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_event(self, name: str, data: dict, event_id: Optional[int] = None):
+        lines = []
+        if event_id is not None:
+            lines.append(f"id: {event_id}")
+        lines.append(f"event: {name}")
+        lines.append(f"data: {json.dumps(data, ensure_ascii=False)}")
+        self.wfile.write(("\n".join(lines) + "\n\n").encode("utf-8"))
+        self.wfile.flush()
+
+    def job_events(self, job_id: str):
+        """SSE：回放已有事件（支持 Last-Event-ID 断点续传），持续推送直到任务结束"""
+        row = self._job_or_404(job_id)
+        if row is None:
+            return
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+        try:
+            position = int(self.headers.get("Last-Event-ID")) + 1
+        except (TypeError, ValueError):
+            position = 0
+        stream = self.app.get_stream(job_id)
+        if stream is not None:
+            if position == 0 and row["status"] != STATUS_RUNNING:
+                # 排队中：开始运行时工作线程会发送 running
+                self._send_event("status", {"status": row["status"]})
+            while True:
+                events, done = stream.wait(position, SSE_HEARTBEAT)
+                for name, data in events:
+                    self._send_event(name, data, position)
+                    position += 1
+                if done:
+                    break
+                if not events:
+                    self.wfile.write(b": keep-alive\n\n")
+                    self.wfile.flush()
+        self._send_event("result", public_job(self.app.queue.get(job_id)))
+
+
+def serve(host: str, port: int, workers: int, use_cache: bool = True) -> int:
+    """启动任务服务，直到 Ctrl+C"""
+    app = JobServer(workers=workers, use_cache=use_cache)
+    httpd = ThreadingHTTPServer((host, port), JobRequestHandler)
+    httpd.daemon_threads = True
+    httpd.app = app
+    app.start()
+    print(f"任务服务已启动: http://{host}:{port}（{app.workers} 个工作线程），按 Ctrl+C 停止")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        print("正在停止...")
+    finally:
+        httpd.server_close()
+        app.stop()
+    return 0
@@ -1,4 +1,4 @@
 # Utils package
 from .yaml_handler import YamlHandler
 from .preset_manager import PresetManager
-from .resource_path import get_base_path, get_resource_path, get_config_path, get_presets_dir, get_images_dir
+from .resource_path import get_base_path, get_resource_path, get_config_path, get_presets_dir, get_images_dir, get_cache_dir, get_generated_dir
@@ -1,8 +1,45 @@
 """AI API 配置管理"""
+import threading
 import yaml
 from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
 from utils.resource_path import get_resource_path
 
+# 优先使用 libyaml 加速的解析器
+try:
+    from yaml import CSafeLoader as _SafeLoader
+except ImportError:
+    from yaml import SafeLoader as _SafeLoader
+
+
+# 已解析的配置：路径 -> ((修改时间, 文件大小), 数据)，所有 AIConfigManager 实例共享
+_config_cache: Dict[Path, Tuple[Optional[Tuple[int, int]], dict]] = {}
+_config_cache_lock = threading.RLock()
+
+# 配置变化回调，参数为变化后的原始配置
+_listeners: List[Callable[[dict], None]] = []
+_listeners_lock = threading.Lock()
+
+
+def _stat_key(path: Path) -> Optional[Tuple[int, int]]:
+    """文件的 (修改时间, 大小)，用于判断缓存是否仍然有效"""
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _notify(data: dict):
+    """通知所有订阅者配置已变化（在触发变化的线程中同步调用）"""
+    with _listeners_lock:
+        listeners = list(_listeners)
+    for callback in listeners:
+        try:
+            callback(data)
+        except Exception as e:
+            print(f"AI配置变化回调失败: {e}")
+
 
 class AIConfigManager:
     """管理AI API配置的保存和加载"""
@@ -16,55 +53,174 @@ class AIConfigManager:
         "gemini_model": "gemini-3-pro-image-preview",
     }
     
+    # 参考图预处理默认配置，max_edge 按服务商区分
+    DEFAULT_IMAGE_PREPROCESS = {
+        "enabled": True,
+        "format": "JPEG",
+        "quality": 85,
+        "max_edge": {
+            "openai": 2048,
+            "gemini": 3072,
+        },
+    }
+    
+    # 提示词响应缓存默认配置
+    DEFAULT_RESPONSE_CACHE = {
+        "enabled": True,
+        "max_entries": 1000,
+        "max_size_mb": 50,
+        "max_age_days": 30,
+    }
+    
+    # 生成图片归档默认配置
+    DEFAULT_IMAGE_STORE = {
+        "enabled": True,
+        "reuse_identical": False,
+    }
+    
+    # options.yaml 延迟写入默认配置
+    DEFAULT_OPTIONS_STORAGE = {
+        "flush_delay_ms": 500,
+        "fsync": "always",
+    }
+    
+    # 多张候选图并发生成的默认配置
+    DEFAULT_IMAGE_VARIANTS = {
+        "max_concurrency": 2,
+    }
+    
+    # 预设存储默认配置
+    DEFAULT_PRESET_STORAGE = {
+        "backend": "json",
+    }
+    
+    # 接口请求失败重试的默认配置（max_attempts 含首次请求）
+    DEFAULT_RETRY = {
+        "max_attempts": 3,
+        "base_delay": 1.0,
+        "max_delay": 30.0,
+        "max_retry_after": 60.0,
+    }
+    
+    # 客户端限流默认配置，按服务商区分；额度为每分钟，0 表示不限制
+    # output_tokens 为每次请求预估的输出 token 数，计入 tokens_per_minute
+    DEFAULT_RATE_LIMIT = {
+        "openai": {
+            "requests_per_minute": 0,
+            "tokens_per_minute": 0,
+            "output_tokens": 2000,
+        },
+        "gemini": {
+            "requests_per_minute": 0,
+            "tokens_per_minute": 0,
+            "output_tokens": 1500,
+        },
+    }
+    
+    # 本地任务服务默认配置
+    DEFAULT_JOB_SERVER = {
+        "host": "127.0.0.1",
+        "port": 8765,
+        "workers": 2,
+    }
+    
     def __init__(self):
+        # 实例本身不保存状态，可随处创建；解析结果在所有实例间共享
         self.config_path = get_resource_path("config/ai_config.yaml")
         self._ensure_config_exists()
     
     def _ensure_config_exists(self):
         """确保配置文件目录存在"""
-        self.config_path.parent.mkdir(parents=True, exist_ok=True)
+        if self.config_path not in _config_cache:
+            self.config_path.parent.mkdir(parents=True, exist_ok=True)
+    
+    @staticmethod
+    def subscribe(callback: Callable[[dict], None]):
+        """
+        订阅配置变化
+        
+        保存配置或检测到文件被外部修改（内容确有变化）时调用 callback(原始配置)。
+        回调在触发变化的线程中执行，界面代码需自行切回主线程。
+        """
+        with _listeners_lock:
+            if callback not in _listeners:
+                _listeners.append(callback)
+    
+    @staticmethod
+    def unsubscribe(callback: Callable[[dict], None]):
+        """取消订阅配置变化"""
+        with _listeners_lock:
+            if callback in _listeners:
+                _listeners.remove(callback)
+    
+    def _load_raw(self) -> dict:
+        """
+        读取配置文件原始内容（内部共享对象，调用方不可直接修改）
+        
+        文件的修改时间或大小变化时重新解析，否则直接复用内存中的结果。
+        """
+        with _config_cache_lock:
+            cached = _config_cache.get(self.config_path)
+            stat_key = _stat_key(self.config_path)
+            if cached is not None and cached[0] == stat_key:
+                return cached[1]
+            
+            data = {}
+            try:
+                if stat_key is not None:
+                    with open(self.config_path, "r", encoding="utf-8") as f:
+                        loaded = yaml.load(f, Loader=_SafeLoader)
+                    if isinstance(loaded, dict):
+                        data = loaded
+            except Exception as e:
+                # 解析失败时按空配置处理，文件变化后会重新尝试
+                print(f"加载AI配置失败: {e}")
+            _config_cache[self.config_path] = (stat_key, data)
+        
+        # 首次加载不算变化；文件被外部修改且内容不同时通知订阅者
+        if cached is not None and cached[1] != data:
+            _notify(data)
+        return data
     
     def load_config(self) -> dict:
         """加载AI配置"""
-        try:
-            if self.config_path.exists():
-                with open(self.config_path, "r", encoding="utf-8") as f:
-                    data = yaml.safe_load(f)
-                    if data:
-                        # 直接返回配置文件中的值，不合并默认值
-                        # 确保所有字段都存在，但使用空字符串作为默认值
-                        result = {}
-                        for key in self.DEFAULT_CONFIG.keys():
-                            result[key] = data.get(key, "")
-                        return result
-        except Exception as e:
-            print(f"加载AI配置失败: {e}")
+        data = self._load_raw()
+        if data:
+            # 直接返回配置文件中的值，不合并默认值
+            # 确保所有字段都存在，但使用空字符串作为默认值
+            result = {}
+            for key in self.DEFAULT_CONFIG.keys():
+                result[key] = data.get(key, "")
+            return result
         # 如果配置文件不存在或加载失败，返回所有字段为空字符串
         return {key: "" for key in self.DEFAULT_CONFIG.keys()}
     
     def save_config(self, config: dict, merge_existing: bool = True) -> bool:
         """保存AI配置，默认保留已有字段"""
         try:
-            data_to_save = {}
-            if merge_existing and self.config_path.exists():
-                with open(self.config_path, "r", encoding="utf-8") as f:
-                    existing = yaml.safe_load(f) or {}
-                    if isinstance(existing, dict):
-                        data_to_save.update(existing)
-            data_to_save.update(config)
-
-            with open(self.config_path, "w", encoding="utf-8") as f:
-                yaml.dump(
-                    data_to_save,
-                    f,
-                    allow_unicode=True,
-                    default_flow_style=False,
-                    sort_keys=False,
-                )
-            return True
+            with _config_cache_lock:
+                old_data = self._load_raw()
+                data_to_save = {}
+                if merge_existing:
+                    data_to_save.update(old_data)
+                data_to_save.update(config)
+
+                with open(self.config_path, "w", encoding="utf-8") as f:
+                    yaml.dump(
+                        data_to_save,
+                        f,
+                        allow_unicode=True,
+                        default_flow_style=False,
+                        sort_keys=False,
+                    )
+                # 直接记录写入后的状态，避免下次读取时重新解析
+                _config_cache[self.config_path] = (_stat_key(self.config_path), data_to_save)
         except Exception as e:
             print(f"保存AI配置失败: {e}")
             return False
+        if data_to_save != old_data:
+            _notify(data_to_save)
+        return True
     
     def is_configured(self) -> bool:
         """检查是否已配置API"""
@@ -97,3 +253,165 @@ class AIConfigManager:
     def get_gemini_model(self) -> str:
         return self.get_gemini_config().get("model", "")
 
+    @staticmethod
+    def _to_int(value, default: int, minimum: int = 0) -> int:
+        """配置值转为整数，无法转换时使用默认值，小于 minimum（默认 0，不允许负数）时取 minimum"""
+        try:
+            result = int(value)
+        except (TypeError, ValueError):
+            result = default
+        return max(minimum, result)
+
+    @staticmethod
+    def _to_float(value, default: float, minimum: float = 0.0) -> float:
+        """配置值转为浮点数，规则同 _to_int"""
+        try:
+            result = float(value)
+        except (TypeError, ValueError):
+            result = default
+        return max(minimum, result)
+
+    def get_image_preprocess_config(self, provider: str) -> dict:
+        """
+        获取参考图预处理配置
+        
+        :param provider: 服务商，"openai" 或 "gemini"
+        :return: {enabled, format, quality, max_edge}
+        """
+        defaults = self.DEFAULT_IMAGE_PREPROCESS
+        data = self._load_raw().get("image_preprocess")
+        if not isinstance(data, dict):
+            data = {}
+        
+        default_max_edge = defaults["max_edge"].get(provider, 0)
+        max_edge = data.get("max_edge", defaults["max_edge"])
+        if isinstance(max_edge, dict):
+            max_edge = max_edge.get(provider, default_max_edge)
+        
+        return {
+            "enabled": bool(data.get("enabled", defaults["enabled"])),
+            "format": str(data.get("format", defaults["format"])).upper(),
+            "quality": min(100, self._to_int(data.get("quality", defaults["quality"]), defaults["quality"], minimum=1)),
+            "max_edge": self._to_int(max_edge or 0, default_max_edge),
+        }
+
+    def get_image_variant_concurrency(self) -> int:
+        """获取候选图并发生成数上限（至少为 1）"""
+        data = self._load_raw().get("image_variants")
+        if not isinstance(data, dict):
+            data = {}
+        default = self.DEFAULT_IMAGE_VARIANTS["max_concurrency"]
+        return self._to_int(data.get("max_concurrency", default), default, minimum=1)
+
+    def get_response_cache_config(self) -> dict:
+        """获取提示词响应缓存配置 {enabled, max_entries, max_size_mb, max_age_days}"""
+        defaults = self.DEFAULT_RESPONSE_CACHE
+        data = self._load_raw().get("response_cache")
+        if not isinstance(data, dict):
+            data = {}
+        return {
+            "enabled": bool(data.get("enabled", defaults["enabled"])),
+            "max_entries": self._to_int(data.get("max_entries", defaults["max_entries"]), defaults["max_entries"]),
+            "max_size_mb": self._to_int(data.get("max_size_mb", defaults["max_size_mb"]), defaults["max_size_mb"]),
+            "max_age_days": self._to_int(data.get("max_age_days", defaults["max_age_days"]), defaults["max_age_days"]),
+        }
+
+    def get_image_store_config(self) -> dict:
+        """获取生成图片归档配置 {enabled, reuse_identical}"""
+        defaults = self.DEFAULT_IMAGE_STORE
+        data = self._load_raw().get("image_store")
+        if not isinstance(data, dict):
+            data = {}
+        return {
+            "enabled": bool(data.get("enabled", defaults["enabled"])),
+            "reuse_identical": bool(data.get("reuse_identical", defaults["reuse_identical"])),
+        }
+
+    def get_options_storage_config(self) -> dict:
+        """
+        获取 options.yaml 延迟写入配置
+        
+        :return: {flush_delay: 合并写入等待秒数, fsync: "always" | "never"}
+        """
+        defaults = self.DEFAULT_OPTIONS_STORAGE
+        data = self._load_raw().get("options_storage")
+        if not isinstance(data, dict):
+            data = {}
+        fsync = str(data.get("fsync", defaults["fsync"])).lower()
+        if fsync not in ("always", "never"):
+            fsync = defaults["fsync"]
+        return {
+            "flush_delay": self._to_int(
+                data.get("flush_delay_ms", defaults["flush_delay_ms"]), defaults["flush_delay_ms"]
+            ) / 1000,
+            "fsync": fsync,
+        }
+
+    def get_preset_storage_config(self) -> dict:
+        """获取预设存储配置 {backend: "json" | "sqlite"}"""
+        defaults = self.DEFAULT_PRESET_STORAGE
+        data = self._load_raw().get("preset_storage")
+        if not isinstance(data, dict):
+            data = {}
+        backend = str(data.get("backend", defaults["backend"])).lower()
+        if backend not in ("json", "sqlite"):
+            backend = defaults["backend"]
+        return {"backend": backend}
+
+    def get_retry_config(self) -> dict:
+        """获取重试配置 {max_attempts, base_delay, max_delay, max_retry_after}（秒）"""
+        defaults = self.DEFAULT_RETRY
+        data = self._load_raw().get("retry")
+        if not isinstance(data, dict):
+            data = {}
+        config = {
+            key: self._to_float(data.get(key, default), default)
+            for key, default in defaults.items()
+        }
+        config["max_attempts"] = self._to_int(
+            data.get("max_attempts", defaults["max_attempts"]), defaults["max_attempts"], minimum=1
+        )
+        return config
+
+    def get_rate_limit_config(self, provider: str) -> dict:
+        """
+        获取限流配置
+        
+        :param provider: 服务商，"openai" 或 "gemini"
+        :return: {requests_per_minute, tokens_per_minute, output_tokens, models}，
+                 models 为按模型名单独设置的额度
+        """
+        defaults = self.DEFAULT_RATE_LIMIT[provider]
+        data = self._load_raw().get("rate_limit")
+        if not isinstance(data, dict):
+            data = {}
+        data = data.get(provider)
+        if not isinstance(data, dict):
+            data = {}
+        
+        def limits(source: dict, fallback: dict) -> dict:
+            return {
+                key: self._to_int(source.get(key, default), default)
+                for key, default in fallback.items()
+            }
+        
+        config = limits(data, defaults)
+        models = data.get("models")
+        config["models"] = {
+            str(model): limits(value, config)
+            for model, value in (models.items() if isinstance(models, dict) else ())
+            if isinstance(value, dict)
+        }
+        return config
+
+    def get_job_server_config(self) -> dict:
+        """获取本地任务服务配置 {host, port, workers}"""
+        defaults = self.DEFAULT_JOB_SERVER
+        data = self._load_raw().get("job_server")
+        if not isinstance(data, dict):
+            data = {}
+        return {
+            "host": str(data.get("host") or defaults["host"]),
+            "port": self._to_int(data.get("port", defaults["port"]), defaults["port"]),
+            "workers": self._to_int(data.get("workers", defaults["workers"]), defaults["workers"], minimum=1),
+        }
@@ -0,0 +1,973 @@
+"""
+AI 提示词生成核心 - 不依赖 Qt
+
+请求构建、流式调用（产出事件）和结果解析，可在线程池、进程池或 asyncio 事件循环中使用；
+界面中的 QThread（见 ai_service.py）只负责把事件转发为信号。
+
+使用示例：
+    request = prepare_generate_request("海边车站的少女", AIConfigManager())
+
+    # 逐个处理流式事件
+    for event in stream_events(request):
+        if isinstance(event, ChunkEvent):
+            print(event.text, end="")
+
+    # 或直接等待结果（AIRequest 可 pickle，也可以提交到进程池）
+    data = run_request(request).data
+"""
+import asyncio
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import AsyncIterator, Callable, Iterator, List, Optional, Tuple, Union
+
+from utils.ai_config import AIConfigManager
+from utils.client_pool import DEFAULT_TIMEOUT, MAX_CONNECTIONS, get_openai_client
+from utils.image_cache import EncodedImage
+from utils.image_preprocess import encode_reference_image, format_size_saving
+from utils.preset_manager import PresetManager
+from utils.rate_limiter import (
+    estimate_message_tokens,
+    format_wait_message,
+    get_rate_limiter,
+    resolve_limits,
+)
+from utils.response_cache import get_response_cache, make_request_key
+from utils.retry import RetryPolicy, format_retry_message, sleep_unless_cancelled
+
+
+# 系统提示词，指导AI生成符合格式的提示词
+SYSTEM_PROMPT = """你是一个专业的AI绘画提示词生成助手。用户会描述他们想要的画面，或者提供参考图片，你需要根据描述和图片内容生成一个结构化的JSON提示词。
+
+如果用户提供了参考图片，请仔细分析图片中的：
+- 角色特征（外貌、服装、配饰等）
+- 场景环境（地点、光线、天气等）
+- 画面风格（画风、色彩、质感等）
+- 构图和镜头角度
+
+然后结合用户的文字描述（如果有），生成符合图片风格和内容的提示词。
+
+请严格按照以下JSON格式输出，不要输出任何其他内容,禁止用```JSON```包裹：
+
+{
+  "风格模式": "高保真二次元插画, 官方立绘风格, 赛璐璐上色",
+  "画面气质": "清透, 治愈, 空灵, 极致可爱, 梦幻",
+  "场景": {
+    "环境": {
+      "地点设定": "蔚蓝档案风格的木质海边车站，背景是明亮的蓝天和巨大的积雨云",
+      "光线": "高调摄影风格（High-key lighting），明亮的日光，强烈的环境光，没有死黑阴影",
+      "天气氛围": "盛夏的晴朗午后，海风吹拂，空气中充满透明感"
+    },
+    "主体": {
+      "整体描述": "蔚蓝档案的角色小鸟游星野（Takanashi Hoshino），二次元美少女",
+      "外形特征": {
+        "身材": "娇小可爱，萝莉体型",
+        "面部": "圆润可爱的脸庞，带着标志性的慵懒神情，异色瞳（左蓝右橙）",
+        "头发": "粉色长发，发梢微卷，头顶有标志性的粉色光环（Halo）和呆毛",
+        "眼睛": "如宝石般闪亮通透的异色瞳孔，眼神清澈"
+      },
+      "表情与动作": {
+        "情绪": "开心，放松，充满好奇",
+        "动作": "坐在车站的木质长椅上，双腿悬空轻轻晃动，身体前倾，一只手放在椅子上撑着身体，另一只手在逗弄漂浮的蓝色小鲸鱼玩偶"
+      },
+      "服装": {
+        "穿着": "严格参考输入图片的蓝白配色国风",
+        "细节": "丝绸质感的宽大袖子，精致的腰封，飘动的丝带，可爱的绳结装饰"
+      },
+      "配饰": "头顶的兔子发饰，漂浮的蓝色鲸鱼玩偶"
+    },
+    "背景": {
+      "描述": "背景是高饱和度的蓝天、白云和波光粼粼的大海，画面极其干净",
+      "景深": "适度的景深虚化，让背景的云朵和大海成为清新的衬托"
+    }
+  },
+  "相机": {
+    "机位角度": "微微仰视或平视视角",
+    "构图": "全身中景，完整显示角色的身体，特别是脚部，强调人物与背景的互动",
+    "镜头特性": "虚拟35mm镜头感",
+    "传感器画质": "8K 超高清分辨率, 矢量级清晰度, 无噪点"
+  },
+  "审美控制": {
+    "呈现意图": "顶级二次元游戏CG，Pixiv高赞插画，清新的壁纸风格",
+    "材质真实度": [
+      "二次元赛璐璐风格的皮肤质感，白皙透红",
+      "头发具有光泽感和丝滑感",
+      "衣物布料呈现清晰的褶皱和飘逸感，非写实材质"
+    ],
+    "色彩风格": {
+      "整体色调": "清新的蓝白色调，粉色点缀，高亮度，低对比度",
+      "对比度": "柔和的明暗过渡，拒绝油腻的厚涂感，保持画面通透",
+      "特殊效果": "梦幻的粒子浮动，发光的线条"
+    }
+  }
+}
+
+注意事项：
+1. 只输出JSON，不要有任何解释或markdown代码块标记
+2. 所有字段都要填写，内容要简洁清楚，示例只是格式参考，不要完全照风格。
+3. 如果用户描述的不是人物，外形特征相关字段可以适当调整描述
+4. 生成的提示词要有画面感，用词要专业、优美
+5. 格式要完整按照示例实现，不要遗漏任何字段"""
+
+# 修改提示词的系统提示
+MODIFY_SYSTEM_PROMPT = """
+你是一个主要专注于“精准定位”与“最小化修改”的AI绘画提示词JSON编辑专家。
+你的核心任务是：根据用户的修改指令（及参考图），仅修改JSON中必要的字段，同时严格保持其他所有未提及字段的内容、数值和结构完全不变。
+
+输入包含：
+1. 当前JSON提示词
+2. 用户修改要求
+3. 参考图片（可选）
+
+请严格遵守以下执行逻辑：
+
+### 核心原则：最小化修改 (Principle of Minimal Modification)
+- **精准打击**：只修改用户明确要求或逻辑上必须随之改变的部分（例如：用户要求由“夏天”改为“冬天”，那么“短袖”改为“棉袄”是逻辑必须，但“发色”或“构图”绝不能变）。
+- **完全冻结**：凡是用户修改意图未覆盖的字段，必须与原JSON保持**逐字一致**，禁止进行同义词替换、润色或格式优化。
+- **禁止发散**：不要尝试“修复”你认为不合理的其他参数，除非它们直接导致了画面逻辑冲突。
+
+### 处理参考图片（如果提供）
+仅在用户要求“参考图片”或修改内容需要视觉依据时，才提取图片特征。
+- 提取范围仅限于用户要求的领域（例如：用户只说“换成图片里的衣服”，你就只分析衣服，不要去提取图片里的画风或背景）。
+
+### 操作步骤
+1. **分析意图**：拆解用户的修改要求，确定受影响的JSON节点路径（例如：`场景.环境` 或 `主体.服饰`）。
+2. **锁定范围**：明确哪些字段是“禁止触碰区”。
+3. **执行修改**：用精准的描述替换目标字段的值。
+4. **一致性检查**：在输出前自我校对，确保未修改部分的键值对与原JSON完全一致。
+
+### 输出格式
+- 仅输出修改后的完整JSON字符串。
+- 严禁包含 markdown 标记（如 ```json ... ```）。
+- 严禁包含任何解释性文字。
+
+### 示例
+**输入 JSON（实际输入会包含更多内容）：**
+{
+  "风格": "赛璐璐",
+  "角色": { "发色": "红色", "发型": "双马尾", "瞳色": "蓝色" },
+  "环境": "教室"
+}
+
+**用户要求：**
+"把头发改成黑色"
+
+**正确输出：**
+{
+  "风格": "赛璐璐",
+  "角色": { "发色": "黑色", "发型": "双马尾", "瞳色": "蓝色" },
+  "环境": "教室"
+}
+"""
+
+class StreamingJSONParser:
+    """
+    增量 JSON 解析器
+    
+    逐块输入流式文本，每当一个叶子值（字符串、数字、布尔、null）结束时
+    立即产出 (路径, 值) 事件，无需等待整个 JSON 完成。
+    路径为键或下标组成的元组，例如 ("场景", "环境", "光线")、("审美控制", "材质真实度", 0)。
+    第一个 '{' 或 '[' 之前的内容（如 ```json 标记）以及根节点结束后的内容会被忽略。
+    """
+    
+    _LITERAL_CHARS = set("0123456789+-.eEtrufalsn")
+    
+    def __init__(self):
+        # 每层容器: [类型("object"/"array"), 当前键或下标]
+        self._stack: list = []
+        self._state = "start"
+        self._buffer: List[str] = []
+        self._escape = False
+        self._is_key = False
+    
+    @property
+    def done(self) -> bool:
+        """根节点是否已解析完毕"""
+        return self._state == "done"
+    
+    def _path(self) -> tuple:
+        return tuple(frame[1] for frame in self._stack)
+    
+    def _push(self, char: str):
+        self._stack.append(["object", None] if char == "{" else ["array", 0])
+        self._state = "key_or_end" if char == "{" else "value_or_end"
+    
+    def _pop(self):
+        self._stack.pop()
+        self._state = "after_value" if self._stack else "done"
+    
+    def feed(self, chunk: str) -> List[tuple]:
+        """
+        输入一段文本
+        
+        :param chunk: 流式内容块
+        :return: 本次解析出的 [(路径, 值), ...]
+        """
+        events = []
+        for char in chunk:
+            state = self._state
+            
+            if state == "string":
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    # 模型输出的字符串中可能含有未转义的换行等控制字符
+                    value = json.loads('"' + "".join(self._buffer) + '"', strict=False)
+                    self._buffer = []
+                    if self._is_key:
+                        self._stack[-1][1] = value
+                        self._state = "colon"
+                    else:
+                        events.append((self._path(), value))
+                        self._state = "after_value"
+                    continue
+                self._buffer.append(char)
+                continue
+            
+            if state == "literal":
+                if char in self._LITERAL_CHARS:
+                    self._buffer.append(char)
+                    continue
+                try:
+                    events.append((self._path(), json.loads("".join(self._buffer))))
+                except ValueError:
+                    pass
+                self._buffer = []
+                self._state = state = "after_value"
+            
+            if state == "done" or char.isspace():
+                continue
+            
+            if state == "start":
+                if char in "{[":
+                    self._push(char)
+            elif state in ("key_or_end", "key"):
+                if char == '"':
+                    self._is_key = True
+                    self._state = "string"
+                elif char == "}" and state == "key_or_end":
+                    self._pop()
+            elif state == "colon":
+                if char == ":":
+                    self._state = "value"
+            elif state in ("value", "value_or_end"):
+                if char == "]" and state == "value_or_end":
+                    self._pop()
+                elif char == '"':
+                    self._is_key = False
+                    self._state = "string"
+                elif char in "{[":
+                    self._push(char)
+                elif char in self._LITERAL_CHARS:
+                    self._buffer = [char]
+                    self._state = "literal"
+            elif state == "after_value":
+                if char == ",":
+                    frame = self._stack[-1]
+                    if frame[0] == "array":
+                        frame[1] += 1
+                        self._state = "value"
+                    else:
+                        self._state = "key"
+                elif char in "}]":
+                    self._pop()
+        return events
+
+
+def build_generate_messages(
+    user_prompt: str,
+    config_manager: AIConfigManager,
+    image_paths: Optional[List[str]] = None,
+) -> Tuple[list, List[EncodedImage]]:
+    """
+    构建生成提示词的请求消息
+
+    :return: (messages, 已编码的参考图列表)
+    :raises ValueError: 既没有描述也没有图片时
+    :raises Exception: 读取图片失败时
+    """
+    user_content = []
+    encoded_images = []
+
+    # 如果有图片，预处理后添加到消息中
+    if image_paths:
+        preprocess = config_manager.get_image_preprocess_config("openai")
+        for image_path in image_paths:
+            try:
+                encoded = encode_reference_image(image_path, preprocess)
+            except Exception as e:
+                raise Exception(f"读取图片失败 {image_path}: {str(e)}")
+            encoded_images.append(encoded)
+            user_content.append({
+                "type": "image_url",
+                "image_url": {
+                    "url": encoded.data_url
+                }
+            })
+
+    # 添加文本内容
+    if user_prompt:
+        if user_content:
+            # 有图片和文本
+            user_content.append({
+                "type": "text",
+                "text": f"请根据以下描述和参考图片生成提示词：\n\n{user_prompt}"
+            })
+        else:
+            # 只有文本，没有图片
+            user_content = f"请根据以下描述生成提示词：\n\n{user_prompt}"
+    elif user_content:
+        # 只有图片没有文本
+        user_content.append({
+            "type": "text",
+            "text": "请根据参考图片生成提示词。"
+        })
+    else:
+        raise ValueError("请提供文字描述或参考图片")
+
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": user_content}
+    ]
+    return messages, encoded_images
+
+
+def build_modify_messages(
+    current_data: str,
+    modify_request: str,
+    config_manager: AIConfigManager,
+    image_paths: Optional[List[str]] = None,
+) -> Tuple[list, List[EncodedImage]]:
+    """
+    构建修改提示词的请求消息
+
+    :return: (messages, 已编码的参考图列表)
+    :raises Exception: 读取图片失败时
+    """
+    user_content = []
+    encoded_images = []
+
+    # 如果有图片，预处理后添加到消息中
+    if image_paths:
+        preprocess = config_manager.get_image_preprocess_config("openai")
+        for image_path in image_paths:
+            try:
+                encoded = encode_reference_image(image_path, preprocess)
+            except Exception as e:
+                raise Exception(f"读取图片失败 {image_path}: {str(e)}")
+            encoded_images.append(encoded)
+            user_content.append({
+                "type": "image_url",
+                "image_url": {
+                    "url": encoded.data_url
+                }
+            })
+
+    # 添加文本内容
+    text_content = f"当前提示词：\n{current_data}\n\n修改要求：{modify_request}\n\n请返回修改后的JSON提示词:"
+
+    if user_content:
+        # 有图片，使用多模态格式
+        user_content.append({
+            "type": "text",
+            "text": text_content
+        })
+        user_message_content = user_content
+    else:
+        # 只有文本
+        user_message_content = text_content
+
+    messages = [
+        {"role": "system", "content": MODIFY_SYSTEM_PROMPT},
+        {"role": "user", "content": user_message_content}
+    ]
+    return messages, encoded_images
+
+
+def response_cache_key(
+    config_manager: AIConfigManager,
+    use_cache: bool,
+    base_url: str,
+    model: str,
+    messages: list,
+    encoded_images: Optional[List[EncodedImage]] = None,
+) -> Optional[str]:
+    """计算响应缓存键，未启用缓存时返回 None"""
+    if not use_cache or not config_manager.get_response_cache_config()["enabled"]:
+        return None
+    return make_request_key(base_url, model, messages, encoded_images)
+
+
+def lookup_response(cache_config: Optional[dict], cache_key: Optional[str]) -> Optional[str]:
+    """按缓存键读取之前的响应"""
+    if not cache_key:
+        return None
+    return get_response_cache(cache_config).get(cache_key)
+
+
+def store_response(cache_config: Optional[dict], cache_key: Optional[str], content: str, model: str):
+    """写入响应缓存（只缓存可解析的JSON，避免回放错误结果）"""
+    if not cache_key:
+        return
+    try:
+        parse_json_content(content)
+    except ValueError:
+        return
+    get_response_cache(cache_config).put(cache_key, content, model)
+
+
+def parse_json_content(content: str) -> dict:
+    """
+    解析AI返回的JSON文本（容忍 ``` 代码块标记）
+
+    :raises json.JSONDecodeError: 内容不是有效JSON时
+    """
+    content = content.strip()
+    if content.startswith("```json"):
+        content = content[7:]
+    elif content.startswith("```"):
+        content = content[3:]
+    if content.endswith("```"):
+        content = content[:-3]
+    return json.loads(content.strip())
+
+
+def format_api_error(e: Exception) -> str:
+    """将API调用异常转换为用户可读的错误信息"""
+    error_msg = str(e)
+    if "401" in error_msg or "Unauthorized" in error_msg:
+        return "API密钥无效或已过期，请检查配置"
+    elif "429" in error_msg or "rate" in error_msg.lower():
+        return "请求过于频繁，请稍后再试"
+    elif "timeout" in error_msg.lower():
+        return "请求超时，请检查网络连接或稍后再试"
+    elif "connect" in error_msg.lower():
+        return f"网络连接失败: {error_msg}"
+    else:
+        return f"API调用失败: {error_msg}"
+
+
+class AIRequestError(Exception):
+    """请求失败（配置错误、接口错误、结果无法解析等），消息可直接展示给用户"""
+
+
+# ---------- 请求 ----------
+
+class AIRequest:
+    """
+    一次提示词生成/修改请求
+
+    构建时已完成配置校验、参考图编码和缓存键计算，只包含普通数据，
+    可以传给其他线程、进程（可 pickle）或事件循环执行。
+    """
+
+    __slots__ = (
+        "kind", "base_url", "api_key", "model", "messages",
+        "cache_key", "cache_config", "image_saving", "timeout", "retry",
+        "rate_limit",
+    )
+
+    def __init__(
+        self,
+        kind: str,
+        base_url: str,
+        api_key: str,
+        model: str,
+        messages: list,
+        cache_key: Optional[str] = None,
+        cache_config: Optional[dict] = None,
+        image_saving: str = "",
+        timeout: float = DEFAULT_TIMEOUT,
+        retry: Optional[RetryPolicy] = None,
+        rate_limit: Optional[dict] = None,
+    ):
+        self.kind = kind                  # "generate" / "modify"
+        self.base_url = base_url
+        self.api_key = api_key
+        self.model = model
+        self.messages = messages
+        self.cache_key = cache_key        # 响应缓存键，不使用缓存时为 None
+        self.cache_config = cache_config  # 响应缓存配置
+        self.image_saving = image_saving  # 参考图预处理节省的大小（进度提示用）
+        self.timeout = timeout
+        self.retry = retry or RetryPolicy()  # 失败重试策略
+        self.rate_limit = rate_limit      # 限流配置，None 表示不限流
+
+
+def load_openai_config(config_manager: AIConfigManager, strict: bool = False) -> Tuple[str, str, str]:
+    """
+    读取 OpenAI 兼容接口配置
+
+    :param strict: 为 True 时 Base URL 和模型名称也必须填写，否则模型默认 gpt-4o-mini
+    :return: (base_url, api_key, model)
+    :raises AIRequestError: 配置不完整时
+    """
+    config = config_manager.load_config()
+    base_url = config.get("base_url", "").rstrip("/")
+    api_key = config.get("api_key", "")
+    model = config.get("model", "")
+
+    if not api_key:
+        raise AIRequestError("请先配置API密钥")
+    if strict:
+        if not base_url:
+            raise AIRequestError("请先配置Base URL")
+        if not model:
+            raise AIRequestError("请先配置模型名称")
+    return base_url, api_key, model or "gpt-4o-mini"
+
+
+def _make_request(
+    kind: str,
+    config_manager: AIConfigManager,
+    config: Tuple[str, str, str],
+    messages: list,
+    encoded_images: List[EncodedImage],
+    use_cache: bool,
+) -> AIRequest:
+    base_url, api_key, model = config
+    return AIRequest(
+        kind,
+        base_url,
+        api_key,
+        model,
+        messages,
+        cache_key=response_cache_key(
+            config_manager, use_cache, base_url, model, messages, encoded_images
+        ),
+        cache_config=config_manager.get_response_cache_config(),
+        image_saving=format_size_saving(encoded_images),
+        retry=RetryPolicy.from_config(config_manager.get_retry_config()),
+        rate_limit=config_manager.get_rate_limit_config("openai"),
+    )
+
+
+def prepare_generate_request(
+    user_prompt: str,
+    config_manager: AIConfigManager,
+    image_paths: Optional[List[str]] = None,
+    use_cache: bool = True,
+) -> AIRequest:
+    """
+    构建生成提示词的请求
+
+    :raises AIRequestError: 未配置、没有描述也没有图片、读取图片失败时
+    """
+    config = load_openai_config(config_manager)
+    try:
+        messages, encoded_images = build_generate_messages(user_prompt, config_manager, image_paths)
+    except ValueError as e:
+        raise AIRequestError(str(e))
+    except Exception as e:
+        raise AIRequestError(f"处理图片失败: {str(e)}")
+    return _make_request("generate", config_manager, config, messages, encoded_images, use_cache)
+
+
+def prepare_modify_request(
+    current_data: str,
+    modify_request: str,
+    config_manager: AIConfigManager,
+    image_paths: Optional[List[str]] = None,
+    use_cache: bool = True,
+) -> AIRequest:
+    """
+    构建修改提示词的请求
+
+    :raises AIRequestError: 未配置、读取图片失败时
+    """
+    config = load_openai_config(config_manager, strict=True)
+    try:
+        messages, encoded_images = build_modify_messages(
+            current_data, modify_request, config_manager, image_paths
+        )
+    except Exception as e:
+        raise AIRequestError(f"处理图片失败: {str(e)}")
+    return _make_request("modify", config_manager, config, messages, encoded_images, use_cache)
+
+
+# ---------- 流式事件 ----------
+
+class ProgressEvent:
+    """进度信息"""
+
+    __slots__ = ("message",)
+    type = "progress"
+
+    def __init__(self, message: str):
+        self.message = message
+
+
+class ChunkEvent:
+    """流式内容块"""
+
+    __slots__ = ("text",)
+    type = "chunk"
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FieldEvent:
+    """流式解析出的叶子字段"""
+
+    __slots__ = ("path", "value")
+    type = "field"
+
+    def __init__(self, path: tuple, value):
+        self.path = path
+        self.value = value
+
+
+class DoneEvent:
+    """流式完成，content 为完整文本"""
+
+    __slots__ = ("content", "cached")
+    type = "done"
+
+    def __init__(self, content: str, cached: bool = False):
+        self.content = content
+        self.cached = cached  # 是否来自响应缓存
+
+
+class RetryEvent:
+    """请求失败，等待后重试（attempt 为第几次重试）"""
+
+    __slots__ = ("attempt", "max_retries", "delay", "error")
+    type = "retry"
+
+    def __init__(self, attempt: int, max_retries: int, delay: float, error: BaseException):
+        self.attempt = attempt
+        self.max_retries = max_retries
+        self.delay = delay      # 重试前等待的秒数
+        self.error = error
+
+    @property
+    def message(self) -> str:
+        return format_retry_message(self.attempt, self.max_retries, self.delay, self.error)
+
+
+class CancelledEvent:
+    """请求已取消（之后不会再有事件）"""
+
+    __slots__ = ()
+    type = "cancelled"
+
+
+AIEvent = Union[ProgressEvent, ChunkEvent, FieldEvent, DoneEvent, RetryEvent, CancelledEvent]
+
+
+def _get_client(request: AIRequest):
+    """从连接池获取客户端（复用 keep-alive 连接，首次使用时才导入 openai）"""
+    try:
+        return get_openai_client(request.base_url, request.api_key, timeout=request.timeout)
+    except ImportError as e:
+        raise AIRequestError(f"openai 导入失败: {e}")
+    except Exception as e:
+        raise AIRequestError(f"openai 加载异常: {type(e).__name__}: {e}")
+
+
+def _feed_fields(parser: StreamingJSONParser, text: str) -> Optional[list]:
+    """
+    逐字段预览解析
+
+    :return: 解析出的字段；解析出错时返回 None（只停止 FieldEvent，不影响请求本身）
+    """
+    try:
+        return parser.feed(text)
+    except Exception as e:
+        print(f"流式字段解析失败，停止字段预览: {e}")
+        return None
+
+
+def stream_events(
+    request: AIRequest,
+    cancelled: Optional[Callable[[], bool]] = None,
+    parse_fields: bool = False,
+) -> Iterator[AIEvent]:
+    """
+    执行请求，逐个产出事件
+
+    命中缓存时以同样的事件回放（一个 ChunkEvent 包含全部内容），调用方处理流程不变。
+    正常结束时最后一个事件为 DoneEvent；cancelled() 返回 True 时关闭连接并以 CancelledEvent 结束。
+    配置了限流时超出额度的请求先排队等待（产出 ProgressEvent）；请求失败时按 request.retry 重试（只重试服务端确定未处理的错误，每次重试前产出 RetryEvent），已输出内容后失败则不再重试。
+
+    :param cancelled: 每收到一个数据块检查一次是否取消
+    :param parse_fields: 是否用 StreamingJSONParser 产出 FieldEvent
+    :raises AIRequestError: 接口调用失败时
+    """
+    cached = lookup_response(request.cache_config, request.cache_key)
+    if cached is not None:
+        yield ProgressEvent("已使用缓存结果")
+        yield ChunkEvent(cached)
+        if parse_fields:
+            for path, value in _feed_fields(StreamingJSONParser(), cached) or ():
+                yield FieldEvent(path, value)
+        yield DoneEvent(cached, cached=True)
+        return
+
+    limiter, tokens = None, 0
+    if request.rate_limit is not None:
+        limiter = get_rate_limiter("openai", request.base_url, request.model, request.rate_limit)
+        tokens = (
+            estimate_message_tokens(request.messages)
+            + resolve_limits(request.rate_limit, request.model)["output_tokens"]
+        )
+    attempt = 1
+    while True:
+        # 每次请求（包括重试）都计入额度，超出时排队等待
+        if limiter is not None:
+            delay = limiter.reserve(tokens)
+            if delay > 0:
+                yield ProgressEvent(format_wait_message(delay, limiter.queued + 1))
+                if not limiter.wait(delay, cancelled):
+                    yield CancelledEvent()
+                    return
+        # 每次请求都从连接池获取：重试等待期间配置变化时使用新的客户端
+        client = _get_client(request)
+        parts = []
+        parser = StreamingJSONParser() if parse_fields else None
+        try:
+            stream = client.chat.completions.create(
+                model=request.model,
+                messages=request.messages,
+                stream=True,
+            )
+            # 提前结束（取消或调用方不再迭代）时关闭流，以便连接归还连接池
+            with stream:
+                for chunk in stream:
+                    if cancelled is not None and cancelled():
+                        yield CancelledEvent()
+                        return
+                    if chunk.choices and len(chunk.choices) > 0:
+                        delta = chunk.choices[0].delta
+                        if delta and delta.content:
+                            parts.append(delta.content)
+                            yield ChunkEvent(delta.content)
+                            if parser is not None:
+                                fields = _feed_fields(parser, delta.content)
+                                if fields is None:
+                                    parser = None
+                                    continue
+                                for path, value in fields:
+                                    yield FieldEvent(path, value)
+            break
+        except Exception as e:
+            # 生成请求不是幂等的：只在服务端确定未处理时重试；已经输出了内容时不再重试
+            delay = None if parts else request.retry.next_delay(e, attempt, idempotent=False)
+            if delay is None:
+                message = format_api_error(e)
+                if attempt > 1:
+                    message += f"（已重试 {attempt - 1} 次）"
+                raise AIRequestError(message)
+            error = e
+        yield RetryEvent(attempt, request.retry.max_retries, delay, error)
+        if not sleep_unless_cancelled(delay, cancelled):
+            yield CancelledEvent()
+            return
+        attempt += 1
+
+    content = "".join(parts)
+    store_response(request.cache_config, request.cache_key, content, request.model)
+    yield DoneEvent(content)
+
+
+async def astream_events(
+    request: AIRequest,
+    cancelled: Optional[Callable[[], bool]] = None,
+    parse_fields: bool = False,
+) -> AsyncIterator[AIEvent]:
+    """stream_events 的异步版本（阻塞的网络读取在默认线程池中执行，不阻塞事件循环）"""
+    loop = asyncio.get_running_loop()
+    events = stream_events(request, cancelled, parse_fields)
+    end = object()
+    try:
+        while True:
+            event = await loop.run_in_executor(None, next, events, end)
+            if event is end:
+                return
+            yield event
+    finally:
+        # 被取消时生成器可能仍在线程池中执行，此时无法关闭，由其自行结束
+        try:
+            events.close()
+        except ValueError:
+            pass
+
+
+# ---------- 结果 ----------
+
+class AIResult:
+    """请求结果"""
+
+    __slots__ = ("data", "content", "cached")
+
+    def __init__(self, data: dict, content: str, cached: bool = False):
+        self.data = data        # 解析后的JSON
+        self.content = content  # 原始文本
+        self.cached = cached    # 是否来自响应缓存
+
+
+def parse_result(content: str) -> dict:
+    """
+    解析完整的返回文本
+
+    :raises AIRequestError: 内容不是有效JSON时
+    """
+    try:
+        return parse_json_content(content)
+    except json.JSONDecodeError as e:
+        raise AIRequestError(f"AI返回的内容不是有效的JSON格式: {e}")
+
+
+def run_request(
+    request: AIRequest,
+    cancelled: Optional[Callable[[], bool]] = None,
+    on_event: Optional[Callable[[AIEvent], None]] = None,
+) -> AIResult:
+    """
+    执行请求直到完成并解析结果（可直接提交到线程池或进程池）
+
+    :param on_event: 每个事件的回调（如转发流式内容）
+    :raises AIRequestError: 失败或取消时
+    """
+    for event in stream_events(request, cancelled):
+        if on_event is not None:
+            on_event(event)
+        if isinstance(event, CancelledEvent):
+            raise AIRequestError("已取消")
+        if isinstance(event, DoneEvent):
+            return AIResult(parse_result(event.content), event.content, event.cached)
+    raise AIRequestError("AI返回为空")
+
+
+async def arun_request(request: AIRequest) -> AIResult:
+    """run_request 的异步版本"""
+    return await asyncio.to_thread(run_request, request)
+
+
+# ---------- 批量生成 ----------
+
+class BatchItemResult:
+    """批量生成中单条描述的结果"""
+
+    __slots__ = ("index", "description", "data", "error", "preset_name", "cached")
+
+    def __init__(self, index: int, description: str):
+        self.index = index              # 在输入列表中的序号
+        self.description = description  # 画面描述
+        self.data: Optional[dict] = None       # 成功时为解析后的JSON
+        self.error: Optional[str] = None       # 失败时的错误信息
+        self.preset_name: Optional[str] = None  # 已保存的预设名称
+        self.cached = False                     # 是否来自响应缓存
+
+    @property
+    def ok(self) -> bool:
+        return self.data is not None
+
+
+class BatchRunner:
+    """批量生成 - 在工作线程池中并发生成多条提示词，每条结束时回调"""
+
+    def __init__(
+        self,
+        descriptions: List[str],
+        config_manager: AIConfigManager,
+        images: Optional[Union[List[str], List[List[str]]]] = None,
+        max_concurrency: int = 4,
+        save_to_presets: bool = False,
+        preset_prefix: str = "批量",
+        use_cache: bool = True,
+    ):
+        self.config_manager = config_manager
+        self.images = images or []
+        self.max_concurrency = max(1, min(int(max_concurrency), MAX_CONNECTIONS))
+        self.save_to_presets = save_to_presets
+        self.preset_prefix = preset_prefix
+        self.use_cache = use_cache
+        # 按序号排列的结果，未执行的条目保持初始状态
+        self.results = [BatchItemResult(i, d) for i, d in enumerate(descriptions)]
+        self._cancelled = False
+        self._save_lock = threading.Lock()
+
+    def cancel(self):
+        """取消尚未完成的条目"""
+        self._cancelled = True
+
+    def is_cancelled(self) -> bool:
+        return self._cancelled
+
+    def images_for(self, index: int) -> List[str]:
+        """参考图可以是所有条目共用的列表，也可以是与描述一一对应的列表"""
+        if self.images and isinstance(self.images[0], (list, tuple)):
+            return list(self.images[index]) if index < len(self.images) else []
+        return list(self.images)
+
+    def _save(self, result: BatchItemResult):
+        """保存为预设，名称按序号排列"""
+        summary = result.description.strip().replace("\n", " ")[:20]
+        name = PresetManager.safe_name(f"{self.preset_prefix}_{result.index + 1:03d} {summary}")
+        with self._save_lock:
+            if PresetManager().save_preset(name, result.data):
+                result.preset_name = name
+
+    def run_item(
+        self,
+        result: BatchItemResult,
+        on_started: Optional[Callable[[int], None]] = None,
+    ) -> BatchItemResult:
+        """生成单条提示词（在工作线程中执行，不抛出异常）"""
+        if self._cancelled:
+            result.error = "已取消"
+            return result
+        if on_started is not None:
+            on_started(result.index)
+        try:
+            request = prepare_generate_request(
+                result.description,
+                self.config_manager,
+                self.images_for(result.index),
+                self.use_cache,
+            )
+            outcome = run_request(request, self.is_cancelled)
+            result.data = outcome.data
+            result.cached = outcome.cached
+        except AIRequestError as e:
+            result.error = str(e)
+        except Exception as e:
+            result.error = format_api_error(e)
+        if result.ok and self.save_to_presets:
+            self._save(result)
+        return result
+
+    def run(
+        self,
+        on_started: Optional[Callable[[int], None]] = None,
+        on_result: Optional[Callable[[BatchItemResult], None]] = None,
+        on_progress: Optional[Callable[[int, int], None]] = None,
+    ) -> List[BatchItemResult]:
+        """
+        执行所有条目，按完成顺序回调
+
+        :return: 按序号排列的结果列表
+        :raises AIRequestError: 未配置API密钥时
+        """
+        load_openai_config(self.config_manager)
+        total = len(self.results)
+        done = 0
+        if on_progress is not None:
+            on_progress(0, total)
+        # 所有工作线程共用连接池中的同一个客户端
+        with ThreadPoolExecutor(
+            max_workers=self.max_concurrency, thread_name_prefix="ai-batch"
+        ) as executor:
+            futures = [executor.submit(self.run_item, r, on_started) for r in self.results]
+            for future in as_completed(futures):
+                result = future.result()
+                done += 1
+                if on_result is not None:
+                    on_result(result)
+                if on_progress is not None:
+                    on_progress(done, total)
+        return self.results
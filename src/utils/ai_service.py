@@ -1,467 +1,195 @@
-"""AI 提示词生成服务 - 使用 OpenAI SDK（流式输出）"""
-import json
-import base64
-from typing import Callable, Optional, List
+"""AI 提示词生成服务 - 使用 OpenAI SDK（流式输出）
+
+请求构建、流式调用和结果解析在 ai_core.py 中（不依赖 Qt），这里的线程只把事件转发为信号。
+"""
+from typing import Callable, Optional, List, Union
 from PyQt6.QtCore import QThread, pyqtSignal
 
 from utils.ai_config import AIConfigManager
+from utils.ai_core import (
+    AIRequest,
+    AIRequestError,
+    BatchItemResult,
+    BatchRunner,
+    CancelledEvent,
+    ChunkEvent,
+    DoneEvent,
+    FieldEvent,
+    ProgressEvent,
+    RetryEvent,
+    prepare_generate_request,
+    prepare_modify_request,
+    stream_events,
+)
 
 
-# 系统提示词，指导AI生成符合格式的提示词
-SYSTEM_PROMPT = """你是一个专业的AI绘画提示词生成助手。用户会描述他们想要的画面，或者提供参考图片，你需要根据描述和图片内容生成一个结构化的JSON提示词。
-
-如果用户提供了参考图片，请仔细分析图片中的：
-- 角色特征（外貌、服装、配饰等）
-- 场景环境（地点、光线、天气等）
-- 画面风格（画风、色彩、质感等）
-- 构图和镜头角度
-
-然后结合用户的文字描述（如果有），生成符合图片风格和内容的提示词。
-
-请严格按照以下JSON格式输出，不要输出任何其他内容,禁止用```JSON```包裹：
-
-{
-  "风格模式": "高保真二次元插画, 官方立绘风格, 赛璐璐上色",
-  "画面气质": "清透, 治愈, 空灵, 极致可爱, 梦幻",
-  "场景": {
-    "环境": {
-      "地点设定": "蔚蓝档案风格的木质海边车站，背景是明亮的蓝天和巨大的积雨云",
-      "光线": "高调摄影风格（High-key lighting），明亮的日光，强烈的环境光，没有死黑阴影",
-      "天气氛围": "盛夏的晴朗午后，海风吹拂，空气中充满透明感"
-    },
-    "主体": {
-      "整体描述": "蔚蓝档案的角色小鸟游星野（Takanashi Hoshino），二次元美少女",
-      "外形特征": {
-        "身材": "娇小可爱，萝莉体型",
-        "面部": "圆润可爱的脸庞，带着标志性的慵懒神情，异色瞳（左蓝右橙）",
-        "头发": "粉色长发，发梢微卷，头顶有标志性的粉色光环（Halo）和呆毛",
-        "眼睛": "如宝石般闪亮通透的异色瞳孔，眼神清澈"
-      },
-      "表情与动作": {
-        "情绪": "开心，放松，充满好奇",
-        "动作": "坐在车站的木质长椅上，双腿悬空轻轻晃动，身体前倾，一只手放在椅子上撑着身体，另一只手在逗弄漂浮的蓝色小鲸鱼玩偶"
-      },
-      "服装": {
-        "穿着": "严格参考输入图片的蓝白配色国风",
-        "细节": "丝绸质感的宽大袖子，精致的腰封，飘动的丝带，可爱的绳结装饰"
-      },
-      "配饰": "头顶的兔子发饰，漂浮的蓝色鲸鱼玩偶"
-    },
-    "背景": {
-      "描述": "背景是高饱和度的蓝天、白云和波光粼粼的大海，画面极其干净",
-      "景深": "适度的景深虚化，让背景的云朵和大海成为清新的衬托"
-    }
-  },
-  "相机": {
-    "机位角度": "微微仰视或平视视角",
-    "构图": "全身中景，完整显示角色的身体，特别是脚部，强调人物与背景的互动",
-    "镜头特性": "虚拟35mm镜头感",
-    "传感器画质": "8K 超高清分辨率, 矢量级清晰度, 无噪点"
-  },
-  "审美控制": {
-    "呈现意图": "顶级二次元游戏CG，Pixiv高赞插画，清新的壁纸风格",
-    "材质真实度": [
-      "二次元赛璐璐风格的皮肤质感，白皙透红",
-      "头发具有光泽感和丝滑感",
-      "衣物布料呈现清晰的褶皱和飘逸感，非写实材质"
-    ],
-    "色彩风格": {
-      "整体色调": "清新的蓝白色调，粉色点缀，高亮度，低对比度",
-      "对比度": "柔和的明暗过渡，拒绝油腻的厚涂感，保持画面通透",
-      "特殊效果": "梦幻的粒子浮动，发光的线条"
-    }
-  }
-}
-
-注意事项：
-1. 只输出JSON，不要有任何解释或markdown代码块标记
-2. 所有字段都要填写，内容要简洁清楚，示例只是格式参考，不要完全照风格。
-3. 如果用户描述的不是人物，外形特征相关字段可以适当调整描述
-4. 生成的提示词要有画面感，用词要专业、优美
-5. 格式要完整按照示例实现，不要遗漏任何字段"""
-
-# 修改提示词的系统提示
-MODIFY_SYSTEM_PROMPT = """
-你是一个主要专注于“精准定位”与“最小化修改”的AI绘画提示词JSON编辑专家。
-你的核心任务是：根据用户的修改指令（及参考图），仅修改JSON中必要的字段，同时严格保持其他所有未提及字段的内容、数值和结构完全不变。
-
-输入包含：
-1. 当前JSON提示词
-2. 用户修改要求
-3. 参考图片（可选）
-
-请严格遵守以下执行逻辑：
-
-### 核心原则：最小化修改 (Principle of Minimal Modification)
-- **精准打击**：只修改用户明确要求或逻辑上必须随之改变的部分（例如：用户要求由“夏天”改为“冬天”，那么“短袖”改为“棉袄”是逻辑必须，但“发色”或“构图”绝不能变）。
-- **完全冻结**：凡是用户修改意图未覆盖的字段，必须与原JSON保持**逐字一致**，禁止进行同义词替换、润色或格式优化。
-- **禁止发散**：不要尝试“修复”你认为不合理的其他参数，除非它们直接导致了画面逻辑冲突。
-
-### 处理参考图片（如果提供）
-仅在用户要求“参考图片”或修改内容需要视觉依据时，才提取图片特征。
-- 提取范围仅限于用户要求的领域（例如：用户只说“换成图片里的衣服”，你就只分析衣服，不要去提取图片里的画风或背景）。
-
-### 操作步骤
-1. **分析意图**：拆解用户的修改要求，确定受影响的JSON节点路径（例如：`场景.环境` 或 `主体.服饰`）。
-2. **锁定范围**：明确哪些字段是“禁止触碰区”。
-3. **执行修改**：用精准的描述替换目标字段的值。
-4. **一致性检查**：在输出前自我校对，确保未修改部分的键值对与原JSON完全一致。
-
-### 输出格式
-- 仅输出修改后的完整JSON字符串。
-- 严禁包含 markdown 标记（如 ```json ... ```）。
-- 严禁包含任何解释性文字。
-
-### 示例
-**输入 JSON（实际输入会包含更多内容）：**
-{
-  "风格": "赛璐璐",
-  "角色": { "发色": "红色", "发型": "双马尾", "瞳色": "蓝色" },
-  "环境": "教室"
-}
-
-**用户要求：**
-"把头发改成黑色"
-
-**正确输出：**
-{
-  "风格": "赛璐璐",
-  "角色": { "发色": "黑色", "发型": "双马尾", "瞳色": "蓝色" },
-  "环境": "教室"
-}
-"""
+class _AIStreamThread(QThread):
+    """流式请求线程 - 在线程中执行 stream_events，把事件转发为信号"""
 
-class AIGenerateThread(QThread):
-    """AI生成线程 - 流式输出"""
-    
     # 信号
     finished = pyqtSignal(dict)      # 成功时发送生成的数据
     error = pyqtSignal(str)          # 错误时发送错误信息
     progress = pyqtSignal(str)       # 进度信息
     stream_chunk = pyqtSignal(str)   # 流式内容块
     stream_done = pyqtSignal(str)    # 流式完成，发送完整内容
-    
-    def __init__(self, user_prompt: str, config_manager: AIConfigManager, image_paths: Optional[List[str]] = None):
+    field_ready = pyqtSignal(object, object)  # 流式解析出的叶子字段 (路径, 值)
+
+    # 请求期间的进度文字
+    working_message = ""
+    # 是否流式解析字段（发送 field_ready）
+    parse_fields = False
+
+    def __init__(
+        self,
+        config_manager: AIConfigManager,
+        image_paths: Optional[List[str]] = None,
+        use_cache: bool = True,
+    ):
         super().__init__()
-        self.user_prompt = user_prompt
         self.config_manager = config_manager
         self.image_paths = image_paths or []
+        self.use_cache = use_cache
         self._cancelled = False
-    
-    def _encode_image(self, image_path: str) -> str:
-        """将图片编码为base64"""
-        try:
-            with open(image_path, "rb") as image_file:
-                return base64.b64encode(image_file.read()).decode('utf-8')
-        except Exception as e:
-            raise Exception(f"读取图片失败 {image_path}: {str(e)}")
-    
-    def _get_image_mime_type(self, image_path: str) -> str:
-        """根据文件扩展名获取MIME类型"""
-        ext = image_path.lower().split('.')[-1]
-        mime_types = {
-            'png': 'image/png',
-            'jpg': 'image/jpeg',
-            'jpeg': 'image/jpeg',
-            'webp': 'image/webp',
-            'bmp': 'image/bmp',
-        }
-        return mime_types.get(ext, 'image/png')
-    
+
     def cancel(self):
         """取消生成"""
         self._cancelled = True
-    
+
+    def _prepare(self) -> AIRequest:
+        raise NotImplementedError
+
+    def _emit(self, event):
+        if isinstance(event, ChunkEvent):
+            self.stream_chunk.emit(event.text)
+        elif isinstance(event, FieldEvent):
+            self.field_ready.emit(event.path, event.value)
+        elif isinstance(event, DoneEvent):
+            self.stream_done.emit(event.content)
+        elif isinstance(event, (ProgressEvent, RetryEvent)):
+            self.progress.emit(event.message)
+        elif isinstance(event, CancelledEvent):
+            self.progress.emit("已取消")
+
     def run(self):
         try:
             self.progress.emit("正在连接AI服务...")
-            
-            config = self.config_manager.load_config()
-            base_url = config.get("base_url", "").rstrip("/")
-            api_key = config.get("api_key", "")
-            model = config.get("model", "gpt-4o-mini")
-            
-            if not api_key:
-                self.error.emit("请先配置API密钥")
-                return
-            
-            # 延迟导入
-            try:
-                from openai import OpenAI
-            except ImportError as e:
-                self.error.emit(f"openai 导入失败: {e}")
-                return
-            except Exception as e:
-                self.error.emit(f"openai 加载异常: {type(e).__name__}: {e}")
-                return
-            
-            # 创建客户端（禁用 http2 避免 cffi/pycparser 问题）
-            import httpx
-            http_client = httpx.Client(http2=False)
-            client = OpenAI(
-                api_key=api_key,
-                base_url=base_url,
-                timeout=180,
-                http_client=http_client,
-            )
-            
-            self.progress.emit("正在生成提示词...")
-            
-            # 构建消息
-            user_content = []
-            
-            # 如果有图片，添加图片到消息中
-            if self.image_paths:
-                for image_path in self.image_paths:
-                    try:
-                        base64_image = self._encode_image(image_path)
-                        mime_type = self._get_image_mime_type(image_path)
-                        user_content.append({
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:{mime_type};base64,{base64_image}"
-                            }
-                        })
-                    except Exception as e:
-                        self.error.emit(f"处理图片失败: {str(e)}")
-                        return
-            
-            # 添加文本内容
-            if self.user_prompt:
-                if user_content:
-                    # 有图片和文本
-                    user_content.append({
-                        "type": "text",
-                        "text": f"请根据以下描述和参考图片生成提示词：\n\n{self.user_prompt}"
-                    })
-                else:
-                    # 只有文本，没有图片
-                    user_content = f"请根据以下描述生成提示词：\n\n{self.user_prompt}"
-            elif user_content:
-                # 只有图片没有文本
-                user_content.append({
-                    "type": "text",
-                    "text": "请根据参考图片生成提示词。"
-                })
+            request = self._prepare()
+            if request.image_saving:
+                self.progress.emit(f"{self.working_message}（{request.image_saving}）")
             else:
-                self.error.emit("请提供文字描述或参考图片")
-                return
-            
-            # 构建消息
-            messages = [
-                {"role": "system", "content": SYSTEM_PROMPT},
-                {"role": "user", "content": user_content}
-            ]
-            
-            # 流式调用API
-            try:
-                stream = client.chat.completions.create(
-                    model=model,
-                    messages=messages,
-                    stream=True,
-                )
-                
-                full_content = ""
-                for chunk in stream:
-                    if self._cancelled:
-                        self.progress.emit("已取消")
-                        return
-                    
-                    if chunk.choices and len(chunk.choices) > 0:
-                        delta = chunk.choices[0].delta
-                        if delta and delta.content:
-                            content_piece = delta.content
-                            full_content += content_piece
-                            # 发送流式块
-                            self.stream_chunk.emit(content_piece)
-                
-                # 流式完成
-                self.stream_done.emit(full_content)
-                
-            except Exception as e:
-                error_msg = str(e)
-                if "401" in error_msg or "Unauthorized" in error_msg:
-                    self.error.emit("API密钥无效或已过期，请检查配置")
-                elif "429" in error_msg or "rate" in error_msg.lower():
-                    self.error.emit("请求过于频繁，请稍后再试")
-                elif "timeout" in error_msg.lower():
-                    self.error.emit("请求超时，请检查网络连接或稍后再试")
-                elif "connect" in error_msg.lower():
-                    self.error.emit(f"网络连接失败: {error_msg}")
-                else:
-                    self.error.emit(f"API调用失败: {error_msg}")
-                return
-                
+                self.progress.emit(self.working_message)
+            for event in stream_events(
+                request, cancelled=lambda: self._cancelled, parse_fields=self.parse_fields
+            ):
+                self._emit(event)
+        except AIRequestError as e:
+            self.error.emit(str(e))
         except Exception as e:
             import traceback
             self.error.emit(f"发生未知错误: {str(e)}\n{traceback.format_exc()}")
 
 
-class AIModifyThread(QThread):
+class AIGenerateThread(_AIStreamThread):
+    """AI生成线程 - 流式输出"""
+
+    working_message = "正在生成提示词..."
+    parse_fields = True
+
+    def __init__(
+        self,
+        user_prompt: str,
+        config_manager: AIConfigManager,
+        image_paths: Optional[List[str]] = None,
+        use_cache: bool = True,
+    ):
+        super().__init__(config_manager, image_paths, use_cache)
+        self.user_prompt = user_prompt
+
+    def _prepare(self) -> AIRequest:
+        return prepare_generate_request(
+            self.user_prompt, self.config_manager, self.image_paths, self.use_cache
+        )
+
+
+class AIModifyThread(_AIStreamThread):
     """AI修改线程 - 流式输出"""
-    
-    # 信号
-    finished = pyqtSignal(dict)      # 成功时发送生成的数据
-    error = pyqtSignal(str)          # 错误时发送错误信息
-    progress = pyqtSignal(str)       # 进度信息
-    stream_chunk = pyqtSignal(str)   # 流式内容块
-    stream_done = pyqtSignal(str)    # 流式完成，发送完整内容
-    
-    def __init__(self, current_data: str, modify_request: str, config_manager: AIConfigManager, image_paths: Optional[List[str]] = None):
-        super().__init__()
+
+    working_message = "正在修改提示词..."
+
+    def __init__(
+        self,
+        current_data: str,
+        modify_request: str,
+        config_manager: AIConfigManager,
+        image_paths: Optional[List[str]] = None,
+        use_cache: bool = True,
+    ):
+        super().__init__(config_manager, image_paths, use_cache)
         self.current_data = current_data
         self.modify_request = modify_request
-        self.config_manager = config_manager
-        self.image_paths = image_paths or []
-        self._cancelled = False
-    
-    def _encode_image(self, image_path: str) -> str:
-        """将图片编码为base64"""
-        try:
-            with open(image_path, "rb") as image_file:
-                return base64.b64encode(image_file.read()).decode('utf-8')
-        except Exception as e:
-            raise Exception(f"读取图片失败 {image_path}: {str(e)}")
-    
-    def _get_image_mime_type(self, image_path: str) -> str:
-        """根据文件扩展名获取MIME类型"""
-        ext = image_path.lower().split('.')[-1]
-        mime_types = {
-            'png': 'image/png',
-            'jpg': 'image/jpeg',
-            'jpeg': 'image/jpeg',
-            'webp': 'image/webp',
-            'bmp': 'image/bmp',
-        }
-        return mime_types.get(ext, 'image/png')
-    
+
+    def _prepare(self) -> AIRequest:
+        return prepare_modify_request(
+            self.current_data, self.modify_request, self.config_manager, self.image_paths, self.use_cache
+        )
+
+
+class AIBatchThread(QThread):
+    """AI批量生成线程 - 在工作线程池中并发生成多条提示词（见 BatchRunner）"""
+
+    # 信号
+    item_started = pyqtSignal(int)               # 开始处理 (序号)
+    item_finished = pyqtSignal(object)           # 单条成功 (BatchItemResult)
+    item_failed = pyqtSignal(object)             # 单条失败 (BatchItemResult)
+    progress = pyqtSignal(int, int)              # 进度 (已完成数, 总数)
+    error = pyqtSignal(str)                      # 整体错误（配置/客户端问题）
+    all_done = pyqtSignal(list)                  # 全部结束，发送按序号排列的结果列表
+
+    def __init__(
+        self,
+        descriptions: List[str],
+        config_manager: AIConfigManager,
+        images: Optional[Union[List[str], List[List[str]]]] = None,
+        max_concurrency: int = 4,
+        save_to_presets: bool = False,
+        preset_prefix: str = "批量",
+        use_cache: bool = True,
+    ):
+        super().__init__()
+        self.runner = BatchRunner(
+            descriptions,
+            config_manager,
+            images=images,
+            max_concurrency=max_concurrency,
+            save_to_presets=save_to_presets,
+            preset_prefix=preset_prefix,
+            use_cache=use_cache,
+        )
+
     def cancel(self):
-        """取消生成"""
-        self._cancelled = True
-    
+        """取消尚未完成的条目"""
+        self.runner.cancel()
+
+    def _on_result(self, result: BatchItemResult):
+        if result.ok:
+            self.item_finished.emit(result)
+        else:
+            self.item_failed.emit(result)
+
     def run(self):
         try:
-            self.progress.emit("正在连接AI服务...")
-            
-            config = self.config_manager.load_config()
-            base_url = config.get("base_url", "").rstrip("/")
-            api_key = config.get("api_key", "")
-            model = config.get("model", "")
-            
-            if not api_key:
-                self.error.emit("请先配置API密钥")
-                return
-            
-            if not base_url:
-                self.error.emit("请先配置Base URL")
-                return
-            
-            if not model:
-                self.error.emit("请先配置模型名称")
-                return
-            
-            # 延迟导入
-            try:
-                from openai import OpenAI
-            except ImportError as e:
-                self.error.emit(f"openai 导入失败: {e}")
-                return
-            except Exception as e:
-                self.error.emit(f"openai 加载异常: {type(e).__name__}: {e}")
-                return
-            
-            # 创建客户端（禁用 http2 避免 cffi/pycparser 问题）
-            import httpx
-            http_client = httpx.Client(http2=False)
-            client = OpenAI(
-                api_key=api_key,
-                base_url=base_url,
-                timeout=180,
-                http_client=http_client,
+            self.runner.run(
+                on_started=self.item_started.emit,
+                on_result=self._on_result,
+                on_progress=self.progress.emit,
             )
-            
-            self.progress.emit("正在修改提示词...")
-            
-            # 构建消息
-            user_content = []
-            
-            # 如果有图片，添加图片到消息中
-            if self.image_paths:
-                for image_path in self.image_paths:
-                    try:
-                        base64_image = self._encode_image(image_path)
-                        mime_type = self._get_image_mime_type(image_path)
-                        user_content.append({
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:{mime_type};base64,{base64_image}"
-                            }
-                        })
-                    except Exception as e:
-                        self.error.emit(f"处理图片失败: {str(e)}")
-                        return
-            
-            # 添加文本内容
-            text_content = f"当前提示词：\n{self.current_data}\n\n修改要求：{self.modify_request}\n\n请返回修改后的JSON提示词:"
-            
-            if user_content:
-                # 有图片，使用多模态格式
-                user_content.append({
-                    "type": "text",
-                    "text": text_content
-                })
-                user_message_content = user_content
-            else:
-                # 只有文本
-                user_message_content = text_content
-            
-            messages = [
-                {"role": "system", "content": MODIFY_SYSTEM_PROMPT},
-                {"role": "user", "content": user_message_content}
-            ]
-            
-            # 流式调用API
-            try:
-                stream = client.chat.completions.create(
-                    model=model,
-                    messages=messages,
-                    stream=True,
-                )
-                
-                full_content = ""
-                for chunk in stream:
-                    if self._cancelled:
-                        self.progress.emit("已取消")
-                        return
-                    
-                    if chunk.choices and len(chunk.choices) > 0:
-                        delta = chunk.choices[0].delta
-                        if delta and delta.content:
-                            content_piece = delta.content
-                            full_content += content_piece
-                            # 发送流式块
-                            self.stream_chunk.emit(content_piece)
-                
-                # 流式完成
-                self.stream_done.emit(full_content)
-                
-            except Exception as e:
-                error_msg = str(e)
-                if "401" in error_msg or "Unauthorized" in error_msg:
-                    self.error.emit("API密钥无效或已过期，请检查配置")
-                elif "429" in error_msg or "rate" in error_msg.lower():
-                    self.error.emit("请求过于频繁，请稍后再试")
-                elif "timeout" in error_msg.lower():
-                    self.error.emit("请求超时，请检查网络连接或稍后再试")
-                elif "connect" in error_msg.lower():
-                    self.error.emit(f"网络连接失败: {error_msg}")
-                else:
-                    self.error.emit(f"API调用失败: {error_msg}")
-                return
-                
+        except AIRequestError as e:
+            self.error.emit(str(e))
         except Exception as e:
             import traceback
             self.error.emit(f"发生未知错误: {str(e)}\n{traceback.format_exc()}")
+        finally:
+            self.all_done.emit(self.runner.results)
 
 
 class AIService:
@@ -470,6 +198,7 @@ class AIService:
     def __init__(self):
         self.config_manager = AIConfigManager()
         self._current_thread: Optional[AIGenerateThread] = None
+        self._batch_thread: Optional[AIBatchThread] = None
     
     def is_configured(self) -> bool:
         """检查是否已配置"""
@@ -484,6 +213,8 @@ class AIService:
         on_stream_chunk: Callable[[str], None] = None,
         on_stream_done: Callable[[str], None] = None,
         image_paths: Optional[List[str]] = None,
+        on_field_ready: Callable[[tuple, object], None] = None,
+        use_cache: bool = True,
     ) -> AIGenerateThread:
         """
         异步流式生成提示词
@@ -495,6 +226,8 @@ class AIService:
         :param on_stream_chunk: 流式内容块回调
         :param on_stream_done: 流式完成回调，参数为完整文本
         :param image_paths: 参考图片路径列表（可选）
+        :param on_field_ready: 字段流式解析完成回调，参数为 (路径元组, 值)
+        :param use_cache: 是否使用响应缓存（False 时总是重新请求）
         :return: 线程对象
         """
         # 如果有正在运行的线程，先停止
@@ -502,7 +235,7 @@ class AIService:
             self._current_thread.cancel()
             self._current_thread.wait(1000)
         
-        thread = AIGenerateThread(user_prompt, self.config_manager, image_paths)
+        thread = AIGenerateThread(user_prompt, self.config_manager, image_paths, use_cache=use_cache)
         thread.finished.connect(on_finished)
         thread.error.connect(on_error)
         if on_progress:
@@ -511,6 +244,8 @@ class AIService:
             thread.stream_chunk.connect(on_stream_chunk)
         if on_stream_done:
             thread.stream_done.connect(on_stream_done)
+        if on_field_ready:
+            thread.field_ready.connect(on_field_ready)
         
         self._current_thread = thread
         thread.start()
@@ -526,6 +261,7 @@ class AIService:
         on_stream_chunk: Callable[[str], None] = None,
         on_stream_done: Callable[[str], None] = None,
         image_paths: Optional[List[str]] = None,
+        use_cache: bool = True,
     ) -> AIModifyThread:
         """
         异步流式修改提示词
@@ -538,6 +274,7 @@ class AIService:
         :param on_stream_chunk: 流式内容块回调
         :param on_stream_done: 流式完成回调，参数为完整文本
         :param image_paths: 参考图片路径列表（可选）
+        :param use_cache: 是否使用响应缓存（False 时总是重新请求）
         :return: 线程对象
         """
         # 如果有正在运行的线程，先停止
@@ -545,7 +282,9 @@ class AIService:
             self._current_thread.cancel()
             self._current_thread.wait(1000)
         
-        thread = AIModifyThread(current_data, modify_request, self.config_manager, image_paths)
+        thread = AIModifyThread(
+            current_data, modify_request, self.config_manager, image_paths, use_cache=use_cache
+        )
         thread.finished.connect(on_finished)
         thread.error.connect(on_error)
         if on_progress:
@@ -559,8 +298,74 @@ class AIService:
         thread.start()
         return thread
     
+    def generate_batch(
+        self,
+        descriptions: List[str],
+        images: Optional[Union[List[str], List[List[str]]]] = None,
+        max_concurrency: int = 4,
+        on_item_finished: Callable[[BatchItemResult], None] = None,
+        on_item_failed: Callable[[BatchItemResult], None] = None,
+        on_progress: Callable[[int, int], None] = None,
+        on_all_done: Callable[[list], None] = None,
+        on_error: Callable[[str], None] = None,
+        save_to_presets: bool = False,
+        preset_prefix: str = "批量",
+        use_cache: bool = True,
+    ) -> AIBatchThread:
+        """
+        批量生成提示词（并发数受 max_concurrency 限制）
+
+        与 generate_async 互不影响，不会取消正在进行的单条生成。
+
+        :param descriptions: 画面描述列表
+        :param images: 参考图片，所有条目共用的路径列表，或与描述一一对应的路径列表的列表
+        :param max_concurrency: 最大并发请求数（不超过连接池上限）
+        :param on_item_finished: 单条成功回调，参数为 BatchItemResult
+        :param on_item_failed: 单条失败回调，参数为 BatchItemResult
+        :param on_progress: 进度回调，参数为 (已完成数, 总数)
+        :param on_all_done: 全部结束回调，参数为按输入顺序排列的 BatchItemResult 列表
+        :param on_error: 整体错误回调（如未配置API密钥）
+        :param save_to_presets: 是否将成功的结果保存为预设
+        :param preset_prefix: 保存预设时的名称前缀
+        :param use_cache: 是否使用响应缓存（重复运行时命中的条目不再请求API）
+        :return: 线程对象
+        """
+        if self._batch_thread and self._batch_thread.isRunning():
+            self._batch_thread.cancel()
+            self._batch_thread.wait(1000)
+
+        thread = AIBatchThread(
+            descriptions,
+            self.config_manager,
+            images=images,
+            max_concurrency=max_concurrency,
+            save_to_presets=save_to_presets,
+            preset_prefix=preset_prefix,
+            use_cache=use_cache,
+        )
+        if on_item_finished:
+            thread.item_finished.connect(on_item_finished)
+        if on_item_failed:
+            thread.item_failed.connect(on_item_failed)
+        if on_progress:
+            thread.progress.connect(on_progress)
+        if on_all_done:
+            thread.all_done.connect(on_all_done)
+        if on_error:
+            thread.error.connect(on_error)
+
+        self._batch_thread = thread
+        thread.start()
+        return thread
+
     def cancel(self):
         """取消当前生成"""
         if self._current_thread and self._current_thread.isRunning():
             self._current_thread.cancel()
-            self._current_thread.wait(1000)
\ No newline at end of file
+            self._current_thread.wait(1000)
+
+    def cancel_batch(self):
+        """取消批量生成（已完成的条目保留）"""
+        if self._batch_thread and self._batch_thread.isRunning():
+            self._batch_thread.cancel()
+            self._batch_thread.wait(1000)
\ No newline at end of file
@@ -0,0 +1,228 @@
+"""OpenAI 兼容客户端连接池 - 进程内复用长连接"""
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+
+# 默认请求超时（秒）
+DEFAULT_TIMEOUT = 180
+
+# 连接池参数
+MAX_CONNECTIONS = 10
+MAX_KEEPALIVE_CONNECTIONS = 5
+KEEPALIVE_EXPIRY = 120
+
+# 同时保留的客户端配置数，超出时停用最久未使用的
+MAX_CLIENTS = 4
+
+
+def _client_key(base_url, api_key, timeout: float = DEFAULT_TIMEOUT) -> Tuple[str, str, float]:
+    """客户端的键：去掉首尾空白和 base_url 末尾的斜杠"""
+    return str(base_url or "").strip().rstrip("/"), str(api_key or "").strip(), float(timeout)
+
+
+class _PoolEntry:
+    """一个配置对应的客户端，记录进行中的请求数"""
+
+    __slots__ = ("http_client", "client", "active", "retired")
+
+    def __init__(self):
+        self.http_client = None
+        self.client = None
+        self.active = 0        # 进行中的请求数（流式响应在关闭前都算进行中）
+        self.retired = False   # 已被新配置替换，请求全部结束后关闭
+
+
+# 统计进行中请求的 httpx.Client 子类，首次创建客户端时定义（避免启动时导入 httpx）
+_tracked_client_class = None
+
+
+def _get_tracked_client_class():
+    global _tracked_client_class
+    if _tracked_client_class is None:
+        import httpx
+
+        class _TrackedStream(httpx.SyncByteStream):
+            """响应流关闭时通知连接池（只通知一次）"""
+
+            def __init__(self, stream, on_close):
+                self._stream = stream
+                self._on_close = on_close
+
+            def __iter__(self):
+                yield from self._stream
+
+            def close(self):
+                try:
+                    self._stream.close()
+                finally:
+                    on_close, self._on_close = self._on_close, None
+                    if on_close is not None:
+                        on_close()
+
+        class TrackedClient(httpx.Client):
+            def __init__(self, *args, on_begin, on_end, **kwargs):
+                super().__init__(*args, **kwargs)
+                self._on_begin = on_begin
+                self._on_end = on_end
+
+            def send(self, request, **kwargs):
+                self._on_begin()
+                try:
+                    response = super().send(request, **kwargs)
+                except BaseException:
+                    self._on_end()
+                    raise
+                if response.is_closed:
+                    # 非流式响应在 send 中已读取完毕
+                    self._on_end()
+                else:
+                    response.stream = _TrackedStream(response.stream, self._on_end)
+                return response
+
+        _tracked_client_class = TrackedClient
+    return _tracked_client_class
+
+
+class OpenAIClientPool:
+    """
+    进程级 OpenAI 客户端注册表
+
+    按 (base_url, api_key, timeout) 缓存 httpx.Client + OpenAI 实例，
+    同一配置的多次请求复用同一个 keep-alive 连接，避免每次重新握手。
+    配置变化时（订阅 AIConfigManager 的变化通知）停用旧配置的客户端，最多保留 MAX_CLIENTS 个配置；
+    停用的客户端在进行中的请求（包括流式响应）全部结束后关闭。
+    """
+
+    _instance: Optional["OpenAIClientPool"] = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # 按最近使用排序
+        self._clients: "OrderedDict[Tuple[str, str, float], _PoolEntry]" = OrderedDict()
+        # 已停用但仍有进行中请求的客户端
+        self._retired: List[_PoolEntry] = []
+
+    @classmethod
+    def instance(cls) -> "OpenAIClientPool":
+        """获取全局唯一的连接池"""
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = cls()
+                    # 延迟导入，连接池本身不依赖配置模块
+                    from utils.ai_config import AIConfigManager
+                    AIConfigManager.subscribe(cls._instance._on_config_changed)
+        return cls._instance
+
+    def _on_config_changed(self, config: dict):
+        """API 地址或密钥变化时停用旧客户端，下次请求按新配置重建连接"""
+        current = _client_key(config.get("base_url"), config.get("api_key"))[:2]
+        with self._lock:
+            stale = [key for key in self._clients if key[:2] != current]
+            idle = [self._retire(key) for key in stale]
+        self._close_entries([entry for entry in idle if entry is not None])
+
+    def _retire(self, key) -> Optional[_PoolEntry]:
+        """停用客户端（需持有锁），没有进行中的请求时返回该客户端，由调用方关闭"""
+        entry = self._clients.pop(key)
+        entry.retired = True
+        if entry.active == 0:
+            return entry
+        self._retired.append(entry)
+        return None
+
+    def _begin(self, entry: _PoolEntry):
+        with self._lock:
+            entry.active += 1
+
+    def _end(self, entry: _PoolEntry):
+        with self._lock:
+            entry.active -= 1
+            if not (entry.retired and entry.active == 0 and entry in self._retired):
+                return
+            self._retired.remove(entry)
+        self._close_entries([entry])
+
+    def get_client(self, base_url: str, api_key: str, timeout: float = DEFAULT_TIMEOUT):
+        """
+        获取（或创建）指定配置的 OpenAI 客户端
+
+        :param base_url: API 基础地址
+        :param api_key: API 密钥
+        :param timeout: 请求超时（秒）
+        :return: OpenAI 客户端实例
+        """
+        key = _client_key(base_url, api_key, timeout)
+        idle = []
+        with self._lock:
+            entry = self._clients.get(key)
+            if entry is not None:
+                self._clients.move_to_end(key)
+                return entry.client
+
+            # 延迟导入，避免启动时加载 openai/httpx
+            from openai import OpenAI
+            import httpx
+
+            entry = _PoolEntry()
+            # 禁用 http2 避免 cffi/pycparser 问题
+            entry.http_client = _get_tracked_client_class()(
+                http2=False,
+                timeout=timeout,
+                limits=httpx.Limits(
+                    max_connections=MAX_CONNECTIONS,
+                    max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=KEEPALIVE_EXPIRY,
+                ),
+                on_begin=lambda: self._begin(entry),
+                on_end=lambda: self._end(entry),
+            )
+            entry.client = OpenAI(
+                api_key=key[1],
+                base_url=key[0],
+                timeout=timeout,
+                http_client=entry.http_client,
+                # 重试由 utils/retry.py 的统一策略处理（流式输出开始后不再重试）
+                max_retries=0,
+            )
+            self._clients[key] = entry
+
+            # 配置过多时停用最久未使用的客户端
+            while len(self._clients) > MAX_CLIENTS:
+                idle.append(self._retire(next(iter(self._clients))))
+            client = entry.client
+        self._close_entries([entry for entry in idle if entry is not None])
+        return client
+
+    @staticmethod
+    def _close_entries(entries: List[_PoolEntry]):
+        for entry in entries:
+            try:
+                entry.client.close()
+            except Exception:
+                pass
+            try:
+                entry.http_client.close()
+            except Exception:
+                pass
+
+    def close_all(self):
+        """关闭所有客户端（应用退出时调用）"""
+        with self._lock:
+            entries = list(self._clients.values()) + self._retired
+            self._clients.clear()
+            self._retired = []
+        self._close_entries(entries)
+
+
+def get_openai_client(base_url: str, api_key: str, timeout: float = DEFAULT_TIMEOUT):
+    """从全局连接池获取 OpenAI 客户端"""
+    return OpenAIClientPool.instance().get_client(base_url, api_key, timeout)
+
+
+def close_all_clients():
+    """关闭全局连接池中的所有客户端"""
+    if OpenAIClientPool._instance is not None:
+        OpenAIClientPool._instance.close_all()
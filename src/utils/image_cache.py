@@ -0,0 +1,276 @@
+"""参考图片编码缓存 - 避免重复读取和 base64 编码同一张图片"""
+import base64
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+from utils.resource_path import get_cache_dir
+
+
+# 内存缓存上限（按 base64 数据字节数计算）
+DEFAULT_MEMORY_LIMIT = 64 * 1024 * 1024
+# 磁盘缓存上限
+DEFAULT_DISK_LIMIT = 512 * 1024 * 1024
+
+MIME_TYPES = {
+    ".png": "image/png",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".webp": "image/webp",
+    ".bmp": "image/bmp",
+    ".gif": "image/gif",
+}
+
+
+def get_image_mime_type(image_path: str, default: str = "image/png") -> str:
+    """根据文件扩展名获取MIME类型"""
+    ext = os.path.splitext(image_path)[1].lower()
+    return MIME_TYPES.get(ext, default)
+
+
+class EncodedImage:
+    """编码后的图片数据"""
+
+    __slots__ = ("mime_type", "data", "sha256", "source_size")
+
+    def __init__(self, mime_type: str, data: str, sha256: str, source_size: int):
+        self.mime_type = mime_type    # 编码后数据的 MIME 类型
+        self.data = data              # base64 字符串
+        self.sha256 = sha256          # 源文件内容哈希
+        self.source_size = source_size  # 源文件字节数
+
+    @property
+    def payload_size(self) -> int:
+        """编码前（解 base64 后）的数据字节数"""
+        return len(self.data) * 3 // 4 - self.data[-2:].count("=")
+
+    @property
+    def data_url(self) -> str:
+        """data URL 形式（用于 OpenAI 兼容接口）"""
+        return f"data:{self.mime_type};base64,{self.data}"
+
+    def to_dict(self) -> dict:
+        return {
+            "mime_type": self.mime_type,
+            "data": self.data,
+            "sha256": self.sha256,
+            "source_size": self.source_size,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "EncodedImage":
+        return cls(data["mime_type"], data["data"], data["sha256"], data.get("source_size", 0))
+
+
+# 编码器：输入源文件字节和路径，返回 (编码后字节, MIME类型)
+Encoder = Callable[[bytes, str], Tuple[bytes, str]]
+
+
+def _raw_encoder(raw: bytes, path: str) -> Tuple[bytes, str]:
+    """默认编码器：原样输出"""
+    return raw, get_image_mime_type(path)
+
+
+class EncodedImageCache:
+    """
+    编码图片缓存
+
+    以 (路径, 文件大小, 修改时间, 变体) 为键，记录源文件内容哈希和编码结果。
+    内存层为按字节数限制的 LRU，可选磁盘层用于跨进程复用。
+    磁盘文件的访问时间和大小在首次写入时扫描一次目录后保存在内存中，超出上限时才淘汰。
+    """
+
+    def __init__(
+        self,
+        memory_limit: int = DEFAULT_MEMORY_LIMIT,
+        disk_dir: Optional[Path] = None,
+        disk_limit: int = DEFAULT_DISK_LIMIT,
+    ):
+        self.memory_limit = memory_limit
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.disk_limit = disk_limit
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[tuple, EncodedImage]" = OrderedDict()
+        self._memory_bytes = 0
+
+        self._disk_lock = threading.Lock()
+        # 磁盘文件名 -> (访问时间, 大小)，首次写入时扫描目录
+        self._disk_files: Optional[Dict[str, Tuple[float, int]]] = None
+        self._disk_bytes = 0
+
+        # 统计计数
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _make_key(path: str, variant: str) -> tuple:
+        stat = os.stat(path)
+        return (os.path.abspath(path), stat.st_size, stat.st_mtime_ns, variant)
+
+    @staticmethod
+    def _disk_name(key: tuple) -> str:
+        return hashlib.sha256(repr(key).encode("utf-8")).hexdigest() + ".json"
+
+    def get(self, path: str, variant: str = "", encoder: Optional[Encoder] = None) -> EncodedImage:
+        """
+        获取图片的编码结果，未命中时读取并编码
+
+        :param path: 图片文件路径
+        :param variant: 编码变体标识（不同的编码参数需使用不同的变体）
+        :param encoder: 自定义编码器，默认原样编码
+        :return: EncodedImage
+        """
+        key = self._make_key(path, variant)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+
+        entry = self._load_from_disk(key)
+        if entry is not None:
+            with self._lock:
+                self.disk_hits += 1
+            self._put_memory(key, entry)
+            return entry
+
+        with open(path, "rb") as f:
+            raw = f.read()
+        payload, mime_type = (encoder or _raw_encoder)(raw, path)
+        entry = EncodedImage(
+            mime_type=mime_type,
+            data=base64.b64encode(payload).decode("utf-8"),
+            sha256=hashlib.sha256(raw).hexdigest(),
+            source_size=len(raw),
+        )
+
+        with self._lock:
+            self.misses += 1
+        self._put_memory(key, entry)
+        self._save_to_disk(key, entry)
+        return entry
+
+    def _put_memory(self, key: tuple, entry: EncodedImage):
+        size = len(entry.data)
+        if size > self.memory_limit:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._memory_bytes -= len(old.data)
+            self._entries[key] = entry
+            self._memory_bytes += size
+            while self._memory_bytes > self.memory_limit and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._memory_bytes -= len(evicted.data)
+                self.evictions += 1
+
+    def _load_from_disk(self, key: tuple) -> Optional[EncodedImage]:
+        if not self.disk_dir:
+            return None
+        file_path = self.disk_dir / self._disk_name(key)
+        try:
+            if file_path.exists():
+                with open(file_path, "r", encoding="utf-8") as f:
+                    entry = EncodedImage.from_dict(json.load(f))
+                # 更新访问时间，用于磁盘淘汰
+                os.utime(file_path)
+                with self._disk_lock:
+                    if self._disk_files is not None and file_path.name in self._disk_files:
+                        self._disk_files[file_path.name] = (time.time(), self._disk_files[file_path.name][1])
+                return entry
+        except Exception as e:
+            print(f"读取图片缓存失败: {e}")
+        return None
+
+    def _save_to_disk(self, key: tuple, entry: EncodedImage):
+        if not self.disk_dir:
+            return
+        try:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+            file_path = self.disk_dir / self._disk_name(key)
+            tmp_path = file_path.with_suffix(f".{threading.get_ident()}.tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entry.to_dict(), f)
+            size = tmp_path.stat().st_size
+            os.replace(tmp_path, file_path)
+            with self._disk_lock:
+                files = self._load_disk_files()
+                old = files.pop(file_path.name, None)
+                if old is not None:
+                    self._disk_bytes -= old[1]
+                files[file_path.name] = (time.time(), size)
+                self._disk_bytes += size
+                if self._disk_bytes > self.disk_limit:
+                    self._trim_disk()
+        except Exception as e:
+            print(f"写入图片缓存失败: {e}")
+
+    def _load_disk_files(self) -> Dict[str, Tuple[float, int]]:
+        """扫描磁盘缓存目录（需持有 _disk_lock，只在首次写入时执行）"""
+        if self._disk_files is None:
+            self._disk_files = {}
+            self._disk_bytes = 0
+            for file in self.disk_dir.glob("*.json"):
+                try:
+                    stat = file.stat()
+                except OSError:
+                    continue
+                self._disk_files[file.name] = (stat.st_mtime, stat.st_size)
+                self._disk_bytes += stat.st_size
+        return self._disk_files
+
+    def _trim_disk(self):
+        """磁盘缓存超出上限时删除最久未使用的文件（需持有 _disk_lock）"""
+        files = self._disk_files
+        for name, (_, size) in sorted(files.items(), key=lambda item: item[1][0]):
+            if self._disk_bytes <= self.disk_limit:
+                break
+            try:
+                (self.disk_dir / name).unlink(missing_ok=True)
+            except OSError:
+                continue
+            del files[name]
+            self._disk_bytes -= size
+
+    def clear(self):
+        """清空内存缓存"""
+        with self._lock:
+            self._entries.clear()
+            self._memory_bytes = 0
+
+    def stats(self) -> dict:
+        """缓存统计信息"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "memory_bytes": self._memory_bytes,
+            }
+
+
+_image_cache: Optional[EncodedImageCache] = None
+_image_cache_lock = threading.Lock()
+
+
+def get_image_cache() -> EncodedImageCache:
+    """获取全局共享的图片编码缓存"""
+    global _image_cache
+    if _image_cache is None:
+        with _image_cache_lock:
+            if _image_cache is None:
+                _image_cache = EncodedImageCache(disk_dir=get_cache_dir() / "images")
+    return _image_cache
@@ -0,0 +1,134 @@
+"""参考图片预处理 - 上传前纠正方向、缩放、去除元数据并重新编码"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from typing import Iterable, Optional, Tuple
+
+from utils.image_cache import EncodedImage, get_image_cache, get_image_mime_type
+
+
+# 输出格式对应的 MIME 类型
+FORMAT_MIME_TYPES = {
+    "JPEG": "image/jpeg",
+    "WEBP": "image/webp",
+    "PNG": "image/png",
+}
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def make_variant(options: dict) -> str:
+    """根据预处理参数生成缓存变体标识"""
+    if not options or not options.get("enabled"):
+        return ""
+    return f"pre:{options['format']}:{options['quality']}:{options['max_edge']}"
+
+
+def preprocess_image_bytes(raw: bytes, path: str, options: dict) -> Tuple[bytes, str]:
+    """
+    预处理单张图片
+
+    按 EXIF 纠正方向，最长边超过 max_edge 时等比缩小，
+    以指定格式和质量重新编码（不写入 EXIF 等元数据）。
+
+    :param raw: 原始文件字节
+    :param path: 文件路径（用于推断原始 MIME 类型）
+    :param options: 预处理配置 {enabled, format, quality, max_edge}
+    :return: (编码后字节, MIME类型)，处理失败时返回原始数据
+    """
+    if not options or not options.get("enabled"):
+        return raw, get_image_mime_type(path)
+
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        return raw, get_image_mime_type(path)
+
+    try:
+        with Image.open(BytesIO(raw)) as source:
+            image = ImageOps.exif_transpose(source)
+            if image is source:
+                image = source.copy()
+
+        max_edge = options.get("max_edge") or 0
+        if max_edge and max(image.size) > max_edge:
+            image.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+
+        fmt = options.get("format", "JPEG")
+        if fmt not in FORMAT_MIME_TYPES:
+            fmt = "JPEG"
+
+        has_alpha = image.mode in ("RGBA", "LA") or (
+            image.mode == "P" and "transparency" in image.info
+        )
+        if fmt == "JPEG" and has_alpha:
+            # JPEG 不支持透明通道，改用 WebP 保留
+            fmt = "WEBP"
+
+        if fmt == "PNG":
+            image = image.convert("RGBA" if has_alpha else "RGB")
+            save_kwargs = {"optimize": True}
+        else:
+            image = image.convert("RGBA" if has_alpha and fmt == "WEBP" else "RGB")
+            save_kwargs = {"quality": int(options.get("quality", 85))}
+            if fmt == "JPEG":
+                save_kwargs["optimize"] = True
+
+        buffer = BytesIO()
+        image.save(buffer, format=fmt, **save_kwargs)
+        return buffer.getvalue(), FORMAT_MIME_TYPES[fmt]
+    except Exception as e:
+        print(f"预处理图片失败 {path}: {e}")
+        return raw, get_image_mime_type(path)
+
+
+def encode_reference_image(path: str, options: Optional[dict] = None) -> EncodedImage:
+    """
+    预处理并编码参考图片（结果进入共享缓存）
+
+    :param path: 图片文件路径
+    :param options: 预处理配置，None 或 enabled=False 时原样编码
+    :return: EncodedImage
+    """
+    variant = make_variant(options)
+    if not variant:
+        return get_image_cache().get(path)
+    return get_image_cache().get(
+        path,
+        variant=variant,
+        encoder=lambda raw, p: preprocess_image_bytes(raw, p, options),
+    )
+
+
+def prefetch_reference_images(paths: Iterable[str], options: Optional[dict] = None):
+    """
+    在后台线程中提前预处理参考图，选图后即可开始，
+    真正发起请求时直接命中缓存
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="image-preprocess")
+        executor = _executor
+
+    def _task(p: str):
+        try:
+            encode_reference_image(p, options)
+        except Exception as e:
+            print(f"预处理图片失败 {p}: {e}")
+
+    for path in paths:
+        executor.submit(_task, path)
+
+
+def format_size_saving(images: Iterable[EncodedImage]) -> str:
+    """汇总预处理节省的字节数，用于进度提示"""
+    before = 0
+    after = 0
+    for image in images:
+        before += image.source_size
+        after += image.payload_size
+    if before <= 0:
+        return ""
+    return f"参考图 {before / 1024 / 1024:.1f}MB → {after / 1024 / 1024:.1f}MB"
@@ -0,0 +1,169 @@
+"""生成图片归档 - 按内容寻址保存所有生成结果，并记录请求指纹"""
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from utils.resource_path import get_generated_dir
+
+
+# 指纹格式版本，请求参数结构变化时递增
+FINGERPRINT_VERSION = 1
+
+# MIME 类型对应的文件扩展名
+MIME_EXTENSIONS = {
+    "image/png": ".png",
+    "image/jpeg": ".jpg",
+    "image/webp": ".webp",
+    "image/gif": ".gif",
+}
+
+
+def make_fingerprint(
+    model: str,
+    prompt: str,
+    aspect_ratio: str,
+    image_size: str,
+    references: Optional[List[str]] = None,
+) -> str:
+    """
+    计算生图请求指纹
+
+    :param references: 参考图标识列表（内容哈希 + 预处理参数），顺序有意义
+    """
+    payload = json.dumps(
+        {
+            "version": FINGERPRINT_VERSION,
+            "model": model,
+            "prompt": prompt,
+            "aspect_ratio": aspect_ratio,
+            "image_size": image_size,
+            "references": list(references or []),
+        },
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ImageStore:
+    """
+    生成图片仓库
+
+    blobs/ 下按内容 sha256 保存图片（相同图片只存一份），
+    index.jsonl 逐行追加每次生成的记录（指纹、图片哈希、请求参数、时间）。
+    """
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.blobs_dir = self.root / "blobs"
+        self.index_path = self.root / "index.jsonl"
+        self._lock = threading.Lock()
+        # 指纹 -> 最近一次生成的记录，首次使用时从索引加载
+        self._by_fingerprint: Optional[Dict[str, dict]] = None
+
+    def _blob_path(self, sha256: str, mime_type: str) -> Path:
+        ext = MIME_EXTENSIONS.get(mime_type, ".bin")
+        return self.blobs_dir / sha256[:2] / f"{sha256}{ext}"
+
+    def _load_index(self) -> Dict[str, dict]:
+        """读取索引文件（需持有锁）"""
+        if self._by_fingerprint is not None:
+            return self._by_fingerprint
+        records = {}
+        try:
+            if self.index_path.exists():
+                with open(self.index_path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        line = line.strip()
+                        if not line:
+                            continue
+                        try:
+                            record = json.loads(line)
+                        except json.JSONDecodeError:
+                            # 忽略异常退出时写了一半的行
+                            continue
+                        records[record.get("fingerprint")] = record
+        except Exception as e:
+            print(f"读取生成图片索引失败: {e}")
+        self._by_fingerprint = records
+        return records
+
+    def put(self, fingerprint: str, data: bytes, mime_type: str, meta: Optional[dict] = None) -> dict:
+        """
+        保存一次生成结果
+
+        :param fingerprint: 请求指纹（见 make_fingerprint）
+        :param data: 图片原始字节
+        :param mime_type: 图片 MIME 类型
+        :param meta: 附加的请求参数（提示词、模型等），写入索引便于检索
+        :return: 索引记录
+        """
+        sha256 = hashlib.sha256(data).hexdigest()
+        blob_path = self._blob_path(sha256, mime_type)
+        record = {
+            "fingerprint": fingerprint,
+            "sha256": sha256,
+            "mime_type": mime_type,
+            "size": len(data),
+            "created": time.time(),
+            **(meta or {}),
+        }
+        with self._lock:
+            if not blob_path.exists():
+                blob_path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = blob_path.with_suffix(f".{threading.get_ident()}.tmp")
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, blob_path)
+
+            self.root.mkdir(parents=True, exist_ok=True)
+            with open(self.index_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._load_index()[fingerprint] = record
+        return record
+
+    def lookup(self, fingerprint: str) -> Optional[Tuple[bytes, str]]:
+        """
+        查找相同请求之前的生成结果
+
+        :return: (图片字节, MIME类型)，未找到或文件已丢失时返回 None
+        """
+        with self._lock:
+            record = self._load_index().get(fingerprint)
+        if not record:
+            return None
+        blob_path = self._blob_path(record["sha256"], record["mime_type"])
+        try:
+            with open(blob_path, "rb") as f:
+                return f.read(), record["mime_type"]
+        except OSError:
+            return None
+
+    def records(self) -> List[dict]:
+        """所有指纹的最近一次记录，按时间倒序"""
+        with self._lock:
+            records = list(self._load_index().values())
+        records.sort(key=lambda r: r.get("created", 0), reverse=True)
+        return records
+
+    def blob_path(self, record: dict) -> Path:
+        """记录对应的图片文件路径"""
+        return self._blob_path(record["sha256"], record["mime_type"])
+
+
+_image_store: Optional[ImageStore] = None
+_image_store_lock = threading.Lock()
+
+
+def get_image_store() -> ImageStore:
+    """获取全局生成图片仓库"""
+    global _image_store
+    if _image_store is None:
+        with _image_store_lock:
+            if _image_store is None:
+                _image_store = ImageStore(get_generated_dir())
+    return _image_store
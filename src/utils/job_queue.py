@@ -0,0 +1,189 @@
+"""持久化任务队列 - SQLite（WAL 模式），供本地任务服务使用"""
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+
+# 任务状态
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+STATUS_CANCELLED = "cancelled"
+
+JOB_STATUSES = (STATUS_QUEUED, STATUS_RUNNING, STATUS_DONE, STATUS_FAILED, STATUS_CANCELLED)
+FINISHED_STATUSES = (STATUS_DONE, STATUS_FAILED, STATUS_CANCELLED)
+
+
+class JobQueue:
+    """
+    持久化任务队列
+
+    任务按提交顺序执行；程序退出时仍在运行的任务，下次打开队列时重新排队。
+    同一个数据库只应由一个任务服务使用。每个线程使用独立的连接。
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            id TEXT NOT NULL UNIQUE,
+            type TEXT NOT NULL,
+            status TEXT NOT NULL,
+            job TEXT NOT NULL,
+            result TEXT,
+            error TEXT,
+            created REAL NOT NULL,
+            started REAL,
+            finished REAL
+        );
+        CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, seq);
+    """
+
+    COLUMNS = "id, type, status, job, result, error, created, started, finished"
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self._local = threading.local()
+        # 领取任务时持有，避免多个工作线程领取同一个任务
+        self._lock = threading.Lock()
+
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(self.SCHEMA)
+        with conn:
+            requeued = conn.execute(
+                "UPDATE jobs SET status = ?, started = NULL WHERE status = ?",
+                (STATUS_QUEUED, STATUS_RUNNING),
+            ).rowcount
+        if requeued:
+            print(f"{requeued} 个中断的任务已重新排队")
+
+    def _conn(self) -> sqlite3.Connection:
+        """当前线程的数据库连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _row(row) -> Optional[dict]:
+        if row is None:
+            return None
+        job_id, job_type, status, job, result, error, created, started, finished = row
+        return {
+            "id": job_id,
+            "type": job_type,
+            "status": status,
+            "job": json.loads(job),
+            "result": json.loads(result) if result else None,
+            "error": error,
+            "created": created,
+            "started": started,
+            "finished": finished,
+        }
+
+    def submit(self, job_id: str, job: dict) -> dict:
+        """加入任务，返回任务记录"""
+        return self.submit_many([(job_id, job)])[0]
+
+    def submit_many(self, items: List[Tuple[str, dict]]) -> List[dict]:
+        """在一个事务中加入多个任务 [(任务ID, 任务), ...]，返回任务记录"""
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            conn.executemany(
+                "INSERT INTO jobs (id, type, status, job, created) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (
+                        job_id,
+                        job.get("type") or "generate",
+                        STATUS_QUEUED,
+                        json.dumps(job, ensure_ascii=False),
+                        now,
+                    )
+                    for job_id, job in items
+                ],
+            )
+        return [self.get(job_id) for job_id, _ in items]
+
+    def claim(self) -> Optional[dict]:
+        """领取最早排队的任务并标记为运行中，没有任务时返回 None"""
+        conn = self._conn()
+        with self._lock:
+            row = conn.execute(
+                f"SELECT {self.COLUMNS} FROM jobs WHERE status = ? ORDER BY seq LIMIT 1",
+                (STATUS_QUEUED,),
+            ).fetchone()
+            if row is None:
+                return None
+            with conn:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, started = ? WHERE id = ?",
+                    (STATUS_RUNNING, time.time(), row[0]),
+                )
+        return self.get(row[0])
+
+    def finish(self, job_id: str, result: dict, status: Optional[str] = None):
+        """
+        记录任务结果
+
+        :param result: JobRunner.run_job 返回的结果记录
+        :param status: 默认按 result["ok"] 记为 done / failed
+        """
+        if status is None:
+            status = STATUS_DONE if result.get("ok") else STATUS_FAILED
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished = ? WHERE id = ?",
+                (
+                    status,
+                    json.dumps(result, ensure_ascii=False),
+                    result.get("error"),
+                    time.time(),
+                    job_id,
+                ),
+            )
+
+    def cancel_queued(self, job_id: str) -> bool:
+        """取消尚未开始的任务，成功时返回 True"""
+        conn = self._conn()
+        with self._lock, conn:
+            return conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished = ? WHERE id = ? AND status = ?",
+                (STATUS_CANCELLED, "已取消", time.time(), job_id, STATUS_QUEUED),
+            ).rowcount > 0
+
+    def get(self, job_id: str) -> Optional[dict]:
+        row = self._conn().execute(
+            f"SELECT {self.COLUMNS} FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        return self._row(row)
+
+    def list(self, status: Optional[str] = None, limit: int = 100) -> List[dict]:
+        """任务记录，按提交时间倒序"""
+        if status:
+            rows = self._conn().execute(
+                f"SELECT {self.COLUMNS} FROM jobs WHERE status = ? ORDER BY seq DESC LIMIT ?",
+                (status, limit),
+            )
+        else:
+            rows = self._conn().execute(
+                f"SELECT {self.COLUMNS} FROM jobs ORDER BY seq DESC LIMIT ?", (limit,)
+            )
+        return [self._row(row) for row in rows]
+
+    def counts(self) -> Dict[str, int]:
+        """各状态的任务数"""
+        counts = {status: 0 for status in JOB_STATUSES}
+        for status, count in self._conn().execute(
+            "SELECT status, COUNT(*) FROM jobs GROUP BY status"
+        ):
+            counts[status] = count
+        return counts
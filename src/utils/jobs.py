@@ -0,0 +1,327 @@
+"""
+任务执行 - 命令行和本地任务服务共用的提示词生成/修改、图片生成任务（不依赖 Qt）
+
+任务为普通字典：
+    {"type": "generate", "prompt": "...", "images": ["ref.jpg"], "save_preset": "名称"}
+    {"type": "modify", "preset": "名称" | "data": {...}, "request": "...", "save_preset": "名称"}
+    {"type": "image", "prompt": "..." | "data": {...} | "preset": "名称", "requirement": "...",
+     "aspect_ratio": "16:9", "image_size": "2K", "count": 2, "reuse": false}
+结果记录：
+    {"id": ..., "type": ..., "ok": true, "data": {...}, "cached": false, "preset": ...}  # 文本任务
+    {"id": ..., "type": "image", "ok": true, "files": ["..."], "errors": [...]}         # 图片任务
+    {"id": ..., "type": ..., "ok": false, "error": "..."}                               # 失败
+"""
+import itertools
+import json
+import threading
+from concurrent.futures import FIRST_COMPLETED, wait
+from pathlib import Path
+from typing import Callable, Optional
+
+from utils.ai_config import AIConfigManager
+from utils.ai_core import (
+    AIRequest,
+    AIRequestError,
+    ChunkEvent,
+    ProgressEvent,
+    RetryEvent,
+    prepare_generate_request,
+    prepare_modify_request,
+    run_request,
+)
+from utils.image_store import MIME_EXTENSIONS
+from utils.preset_manager import PresetManager
+from utils.retry import format_retry_message
+
+
+JOB_TYPES = ("generate", "modify", "image")
+
+# 生图默认参数（与界面一致）
+DEFAULT_ASPECT_RATIO = "1:1"
+DEFAULT_IMAGE_SIZE = "1K"
+DEFAULT_THINKING_LEVEL = "low"
+
+# 等待图片结果时检查取消的间隔（秒）
+CANCEL_POLL_INTERVAL = 0.2
+
+
+def _write_new_file(directory: Path, stem: str, ext: str, data: bytes) -> Path:
+    """写入新文件；同名文件已存在时在文件名后追加 -2、-3 ...，不覆盖之前的结果"""
+    for n in itertools.count(1):
+        path = directory / (f"{stem}{ext}" if n == 1 else f"{stem}-{n}{ext}")
+        try:
+            with open(path, "xb") as f:
+                f.write(data)
+            return path
+        except FileExistsError:
+            continue
+
+
+class JobError(Exception):
+    """任务参数或执行错误（只影响当前任务）"""
+
+
+class _JobContext:
+    """单个任务执行时的回调和状态"""
+
+    __slots__ = ("id", "on_event", "cancelled", "out_dir")
+
+    def __init__(self, job_id: str, on_event, cancelled, out_dir: Path):
+        self.id = job_id
+        self.on_event = on_event    # 进度事件回调，参数为事件字典
+        self.cancelled = cancelled  # 返回是否已取消
+        self.out_dir = out_dir      # 图片保存目录
+
+    def emit(self, event: dict):
+        if self.on_event is not None:
+            self.on_event(event)
+
+
+class JobRunner:
+    """
+    执行任务，可在多个线程中同时调用 run_job
+
+    执行过程中通过 on_event 回调发送事件字典：
+        {"event": "progress", "message": "..."}
+        {"event": "chunk", "text": "..."}       # 提示词流式内容
+        {"event": "image", "file": "..."}       # 图片任务每保存一张
+        {"event": "retry", "attempt": 1, "max_retries": 2, "delay": 1.3, "message": "..."}  # 请求失败后重试
+    """
+
+    def __init__(self, out_dir: str = ".", use_cache: bool = True):
+        self.out_dir = Path(out_dir)
+        self.use_cache = use_cache
+        self.config_manager = AIConfigManager()
+        self.preset_manager = PresetManager()
+        self._preset_lock = threading.Lock()
+        self._cancelled = False
+
+    def cancel(self):
+        """停止所有任务（进行中的流式请求会在下一个数据块时关闭）"""
+        self._cancelled = True
+
+    # ---------- 预设 ----------
+
+    def _save_preset(self, name: Optional[str], data: dict) -> Optional[str]:
+        """保存为预设，返回实际使用的名称"""
+        if not name:
+            return None
+        name = PresetManager.safe_name(name)
+        with self._preset_lock:
+            if not self.preset_manager.save_preset(name, data):
+                raise JobError(f"保存预设失败: {name}")
+        return name
+
+    def _load_preset(self, name: str) -> dict:
+        with self._preset_lock:
+            data = self.preset_manager.load_preset(name)
+        if data is None:
+            raise JobError(f"预设不存在: {name}")
+        return data
+
+    @staticmethod
+    def _retry_event(attempt: int, max_retries: int, delay: float, error: BaseException) -> dict:
+        return {
+            "event": "retry",
+            "attempt": attempt,
+            "max_retries": max_retries,
+            "delay": round(delay, 1),
+            "message": format_retry_message(attempt, max_retries, delay, error),
+        }
+
+    # ---------- 文本提示词 ----------
+
+    def _complete(self, ctx: _JobContext, request: AIRequest) -> tuple:
+        """执行请求并转发流式内容，返回 (解析后的JSON, 是否来自缓存)"""
+        def on_event(event):
+            if isinstance(event, ChunkEvent):
+                ctx.emit({"event": "chunk", "text": event.text})
+            elif isinstance(event, ProgressEvent):
+                ctx.emit({"event": "progress", "message": event.message})
+            elif isinstance(event, RetryEvent):
+                ctx.emit(self._retry_event(event.attempt, event.max_retries, event.delay, event.error))
+
+        try:
+            result = run_request(request, ctx.cancelled, on_event)
+        except AIRequestError as e:
+            raise JobError(str(e))
+        return result.data, result.cached
+
+    def _run_generate(self, job: dict, record: dict, ctx: _JobContext):
+        try:
+            request = prepare_generate_request(
+                job.get("prompt") or "", self.config_manager, job.get("images") or [], self.use_cache
+            )
+        except AIRequestError as e:
+            raise JobError(str(e))
+        ctx.emit({"event": "progress", "message": "正在生成提示词..."})
+        record["data"], record["cached"] = self._complete(ctx, request)
+        record["preset"] = self._save_preset(job.get("save_preset"), record["data"])
+
+    def _run_modify(self, job: dict, record: dict, ctx: _JobContext):
+        request_text = (job.get("request") or "").strip()
+        if not request_text:
+            raise JobError("请提供修改要求（request）")
+        if job.get("data") is not None:
+            current = job["data"]
+        elif job.get("preset"):
+            current = self._load_preset(job["preset"])
+        else:
+            raise JobError("请提供要修改的提示词（preset 或 data）")
+        if not isinstance(current, str):
+            current = json.dumps(current, ensure_ascii=False, indent=2)
+
+        try:
+            request = prepare_modify_request(
+                current, request_text, self.config_manager, job.get("images") or [], self.use_cache
+            )
+        except AIRequestError as e:
+            raise JobError(str(e))
+        ctx.emit({"event": "progress", "message": "正在修改提示词..."})
+        record["data"], record["cached"] = self._complete(ctx, request)
+        record["preset"] = self._save_preset(job.get("save_preset"), record["data"])
+
+    # ---------- 图片 ----------
+
+    def _image_prompt(self, job: dict) -> str:
+        """生图提示词：结构化数据按界面的方式序列化，并追加特别要求"""
+        if job.get("data") is not None:
+            data = job["data"]
+        elif job.get("preset"):
+            data = self._load_preset(job["preset"])
+        else:
+            data = job.get("prompt")
+        if isinstance(data, (dict, list)):
+            prompt = json.dumps(data, ensure_ascii=False, indent=2)
+        else:
+            prompt = (data or "").strip()
+        if not prompt or prompt == "{}":
+            raise JobError("请提供生图提示词（prompt、data 或 preset）")
+
+        requirement = (job.get("requirement") or "").strip()
+        if requirement:
+            prompt = prompt + "\n\n特别要求：" + requirement
+        return prompt
+
+    def _run_image(self, job: dict, record: dict, ctx: _JobContext):
+        from components.gemini_client import (
+            ASPECT_RATIO_LIST,
+            IMAGE_SIZE_LIST,
+            THINKING_LEVEL_LIST,
+            create_gemini_client,
+        )
+
+        prompt = self._image_prompt(job)
+        aspect_ratio = job.get("aspect_ratio") or DEFAULT_ASPECT_RATIO
+        image_size = job.get("image_size") or DEFAULT_IMAGE_SIZE
+        thinking_level = job.get("thinking_level") or DEFAULT_THINKING_LEVEL
+        for value, choices, label in (
+            (aspect_ratio, ASPECT_RATIO_LIST, "宽高比"),
+            (image_size, IMAGE_SIZE_LIST, "输出尺寸"),
+            (thinking_level, THINKING_LEVEL_LIST, "思考级别"),
+        ):
+            if value not in choices:
+                raise JobError(f"不支持的{label}: {value}（可选: {', '.join(choices)}）")
+        try:
+            count = max(1, int(job.get("count") or 1))
+        except (TypeError, ValueError):
+            raise JobError(f"生成数量无效: {job.get('count')}")
+
+        try:
+            client = create_gemini_client(
+                self.config_manager,
+                aspect_ratio,
+                image_size,
+                thinking_level,
+                max_concurrency=self.config_manager.get_image_variant_concurrency(),
+                reuse_results=bool(job.get("reuse")),
+            )
+        except ValueError as e:
+            raise JobError(str(e))
+        client.set_retry_listener(
+            lambda attempt, max_retries, delay, error: ctx.emit(
+                self._retry_event(attempt, max_retries, delay, error)
+            )
+        )
+
+        ctx.emit({"event": "progress", "message": f"正在生成 {count} 张图片..."})
+        images = job.get("images") or None
+        futures = {
+            client.submit(client.agenerate_image_bytes(text=prompt, images=images)): index
+            for index in range(count)
+        }
+        ctx.out_dir.mkdir(parents=True, exist_ok=True)
+        stem = PresetManager.safe_name(ctx.id)
+
+        files, errors = {}, []
+        pending = set(futures)
+        try:
+            while pending:
+                if ctx.cancelled():
+                    raise JobError("已取消")
+                done, pending = wait(pending, timeout=CANCEL_POLL_INTERVAL, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = futures[future]
+                    try:
+                        image_data = future.result()
+                    except Exception as e:  # noqa: BLE001
+                        errors.append(str(e))
+                        continue
+                    if image_data is None:
+                        errors.append("未生成图片，请尝试调整提示词或参数")
+                        continue
+                    image_bytes, mime_type = image_data
+                    suffix = f"_{index + 1}" if count > 1 else ""
+                    path = _write_new_file(
+                        ctx.out_dir, f"{stem}{suffix}", MIME_EXTENSIONS.get(mime_type, ".bin"), image_bytes
+                    )
+                    files[index] = str(path)
+                    ctx.emit({"event": "image", "file": str(path)})
+        finally:
+            client.cancel_all()
+
+        record["files"] = [files[index] for index in sorted(files)]
+        if errors:
+            record["errors"] = errors
+        if not files:
+            raise JobError(errors[0] if errors else "未生成图片")
+
+    # ---------- 调度 ----------
+
+    def run_job(
+        self,
+        job,
+        job_id: str,
+        on_event: Optional[Callable[[dict], None]] = None,
+        cancelled: Optional[Callable[[], bool]] = None,
+        out_dir: Optional[str] = None,
+    ) -> dict:
+        """
+        执行单个任务，返回结果记录（不抛出异常）
+
+        :param job: 任务字典（字符串视为生成任务的描述）
+        :param on_event: 执行过程中的事件回调
+        :param cancelled: 返回 True 时停止该任务
+        :param out_dir: 图片保存目录，默认为 JobRunner 的目录
+        """
+        if not isinstance(job, dict):
+            job = {"type": "generate", "prompt": str(job)}
+        record = {"id": job_id, "type": job.get("type") or "generate", "ok": False}
+        ctx = _JobContext(
+            job_id,
+            on_event,
+            lambda: self._cancelled or (cancelled is not None and cancelled()),
+            Path(out_dir) if out_dir else self.out_dir,
+        )
+        try:
+            if ctx.cancelled():
+                raise JobError("已取消")
+            if record["type"] not in JOB_TYPES:
+                raise JobError(f"未知的任务类型: {record['type']}（可选: {', '.join(JOB_TYPES)}）")
+            getattr(self, f"_run_{record['type']}")(job, record, ctx)
+            record["ok"] = True
+        except JobError as e:
+            record["error"] = str(e)
+        except Exception as e:  # noqa: BLE001
+            record["error"] = f"发生未知错误: {type(e).__name__}: {e}"
+        return record
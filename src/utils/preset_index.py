@@ -0,0 +1,264 @@
+"""预设元数据索引 - 避免每次列出预设都扫描目录并读取文件状态"""
+import hashlib
+import json
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from utils.resource_path import get_cache_dir
+
+
+# 索引格式版本，记录结构变化时递增以重建索引
+INDEX_VERSION = 1
+
+# 摘要最大长度
+SUMMARY_LENGTH = 60
+
+
+def make_summary(data) -> str:
+    """
+    提取预设的简短摘要
+
+    优先使用主体的整体描述，否则取第一个非空文本值。
+    """
+    summary = ""
+    if isinstance(data, dict):
+        subject = (data.get("场景") or {}).get("主体") if isinstance(data.get("场景"), dict) else None
+        if isinstance(subject, dict) and isinstance(subject.get("整体描述"), str):
+            summary = subject["整体描述"].strip()
+
+    if not summary:
+        stack = [data]
+        while stack and not summary:
+            value = stack.pop(0)
+            if isinstance(value, dict):
+                stack.extend(value.values())
+            elif isinstance(value, list):
+                stack.extend(value)
+            elif isinstance(value, str):
+                summary = value.strip()
+
+    if len(summary) > SUMMARY_LENGTH:
+        summary = summary[:SUMMARY_LENGTH] + "…"
+    return summary
+
+
+class PresetIndex:
+    """
+    预设元数据索引
+
+    为每个预设记录 {name, path, mtime, size, sha256, summary}，保存在本地索引文件中。
+    保存/重命名/删除时增量更新；目录本身的修改时间未变时直接使用内存中的结果，
+    变化时（外部增删了文件）只重新读取新增或修改时间、大小有变化的文件。
+    """
+
+    def __init__(self, presets_dir: Path, index_path: Path):
+        self.presets_dir = Path(presets_dir)
+        self.index_path = Path(index_path)
+        self._lock = threading.RLock()
+        # 预设名称 -> 记录，首次使用时从索引文件加载
+        self._entries: Optional[Dict[str, dict]] = None
+        # 上次核对时的目录修改时间
+        self._dir_mtime: Optional[int] = None
+        # 按修改时间倒序的列表缓存，索引变化时清空
+        self._sorted: Optional[List[dict]] = None
+
+    def _dir_stat(self) -> Optional[int]:
+        try:
+            return self.presets_dir.stat().st_mtime_ns
+        except OSError:
+            return None
+
+    def _load(self) -> Dict[str, dict]:
+        """读取索引文件（需持有锁）"""
+        if self._entries is not None:
+            return self._entries
+        entries = {}
+        try:
+            if self.index_path.exists():
+                with open(self.index_path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if (
+                    data.get("version") == INDEX_VERSION
+                    and data.get("presets_dir") == str(self.presets_dir)
+                ):
+                    entries = data.get("entries") or {}
+                    self._dir_mtime = data.get("dir_mtime")
+        except Exception as e:
+            print(f"读取预设索引失败: {e}")
+        self._entries = entries
+        return entries
+
+    def _save(self):
+        """写入索引文件（需持有锁）"""
+        try:
+            self.index_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.index_path.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(
+                    {
+                        "version": INDEX_VERSION,
+                        "presets_dir": str(self.presets_dir),
+                        "dir_mtime": self._dir_mtime,
+                        "entries": self._entries,
+                    },
+                    f,
+                    ensure_ascii=False,
+                )
+            os.replace(tmp_path, self.index_path)
+        except Exception as e:
+            print(f"写入预设索引失败: {e}")
+
+    def _read_entry(self, file_path: Path, stat: os.stat_result) -> Optional[dict]:
+        """读取预设文件，生成索引记录"""
+        try:
+            with open(file_path, "rb") as f:
+                raw = f.read()
+            try:
+                summary = make_summary(json.loads(raw.decode("utf-8")))
+            except ValueError:
+                summary = ""
+        except OSError:
+            return None
+        return {
+            "name": file_path.stem,
+            "path": str(file_path),
+            "mtime": stat.st_mtime,
+            "size": stat.st_size,
+            "sha256": hashlib.sha256(raw).hexdigest(),
+            "summary": summary,
+        }
+
+    def _reconcile(self) -> Dict[str, dict]:
+        """目录有变化时与磁盘核对（需持有锁）"""
+        entries = self._load()
+        dir_mtime = self._dir_stat()
+        if dir_mtime is not None and dir_mtime == self._dir_mtime:
+            return entries
+
+        fresh = {}
+        changed = False
+        try:
+            with os.scandir(self.presets_dir) as it:
+                for item in it:
+                    if not item.name.endswith(".json") or not item.is_file():
+                        continue
+                    try:
+                        stat = item.stat()
+                    except OSError:
+                        continue
+                    name = item.name[:-len(".json")]
+                    entry = entries.get(name)
+                    if (
+                        entry is None
+                        or entry.get("mtime") != stat.st_mtime
+                        or entry.get("size") != stat.st_size
+                    ):
+                        entry = self._read_entry(Path(item.path), stat)
+                        if entry is None:
+                            continue
+                        changed = True
+                    fresh[name] = entry
+        except OSError as e:
+            print(f"扫描预设目录失败: {e}")
+            return entries
+
+        if changed or fresh.keys() != entries.keys():
+            self._entries = fresh
+            self._sorted = None
+        self._dir_mtime = dir_mtime
+        self._save()
+        return self._entries
+
+    def list(self) -> List[dict]:
+        """所有预设记录，按修改时间倒序（返回列表副本）"""
+        with self._lock:
+            self._reconcile()
+            if self._sorted is None:
+                self._sorted = sorted(
+                    self._entries.values(), key=lambda e: e.get("mtime", 0), reverse=True
+                )
+            return list(self._sorted)
+
+    def get(self, name: str) -> Optional[dict]:
+        """指定预设的记录"""
+        with self._lock:
+            return self._reconcile().get(name)
+
+    def invalidate(self):
+        """下次使用时强制与磁盘核对（例如外部原地修改了文件内容）"""
+        with self._lock:
+            self._dir_mtime = None
+
+    @contextmanager
+    def changing(self):
+        """
+        修改预设文件时使用：先与磁盘核对，修改完成后记录新的目录状态
+
+        用法：
+            with index.changing():
+                写入/删除/重命名文件
+                index.update(name) / index.remove(name) / index.rename(old, new)
+        修改由本进程完成，因此结束后目录修改时间的变化不需要再次扫描；
+        期间出错时不记录，下次使用时重新核对。
+        """
+        with self._lock:
+            self._reconcile()
+            yield self
+            self._dir_mtime = self._dir_stat()
+            self._sorted = None
+            self._save()
+
+    def update(self, name: str):
+        """预设文件已写入后更新其记录"""
+        file_path = self.presets_dir / f"{name}.json"
+        with self._lock:
+            try:
+                entry = self._read_entry(file_path, file_path.stat())
+            except OSError:
+                entry = None
+            if entry is None:
+                self._load().pop(name, None)
+            else:
+                self._load()[name] = entry
+            self._sorted = None
+
+    def remove(self, name: str):
+        """预设文件已删除后移除其记录"""
+        with self._lock:
+            self._load().pop(name, None)
+            self._sorted = None
+
+    def rename(self, old_name: str, new_name: str):
+        """预设文件已重命名后更新其记录（内容未变，无需重新读取）"""
+        new_path = self.presets_dir / f"{new_name}.json"
+        with self._lock:
+            entry = self._load().pop(old_name, None)
+            if entry is None:
+                self.update(new_name)
+                return
+            try:
+                stat = new_path.stat()
+            except OSError:
+                self._sorted = None
+                return
+            self._entries[new_name] = dict(entry, name=new_name, path=str(new_path), mtime=stat.st_mtime)
+            self._sorted = None
+
+
+_preset_indexes: Dict[Path, PresetIndex] = {}
+_preset_indexes_lock = threading.Lock()
+
+
+def get_preset_index(presets_dir: Path) -> PresetIndex:
+    """获取指定预设目录的全局索引"""
+    presets_dir = Path(presets_dir)
+    with _preset_indexes_lock:
+        index = _preset_indexes.get(presets_dir)
+        if index is None:
+            name = hashlib.sha256(str(presets_dir).encode("utf-8")).hexdigest()[:16]
+            index = PresetIndex(presets_dir, get_cache_dir() / f"preset_index_{name}.json")
+            _preset_indexes[presets_dir] = index
+        return index
@@ -1,50 +1,99 @@
 """预设管理器"""
-import os
-import json
-from pathlib import Path
 from datetime import datetime
+from typing import Any
+from utils.ai_config import AIConfigManager
+from utils.preset_store import _ANY, get_preset_store
 from utils.resource_path import get_presets_dir
 
 
 class PresetManager:
     """管理提示词预设的保存和加载"""
 
-    def __init__(self):
+    def __init__(self, backend: str = None):
+        """
+        :param backend: 存储后端 "json" / "sqlite"，默认读取 ai_config.yaml 的 preset_storage 配置
+        """
         self.presets_dir = get_presets_dir()
         self._ensure_dir_exists()
+        if backend is None:
+            backend = AIConfigManager().get_preset_storage_config()["backend"]
+        # 存储后端，同一目录和后端的所有 PresetManager 实例共享
+        self.store = get_preset_store(backend, self.presets_dir)
 
     def _ensure_dir_exists(self):
         """确保预设目录存在"""
         self.presets_dir.mkdir(parents=True, exist_ok=True)
 
-    def get_all_presets(self) -> list[dict]:
-        """获取所有预设列表，返回 [{name, path, modified_time}, ...]"""
-        presets = []
-        for file in self.presets_dir.glob("*.json"):
-            try:
-                stat = file.stat()
-                presets.append({
-                    "name": file.stem,
-                    "path": str(file),
-                    "modified_time": datetime.fromtimestamp(stat.st_mtime),
-                })
-            except Exception:
-                continue
-        # 按修改时间倒序排列
-        presets.sort(key=lambda x: x["modified_time"], reverse=True)
-        return presets
+    def get_all_presets(self, refresh: bool = False) -> list[dict]:
+        """
+        获取所有预设列表（按修改时间倒序）
+
+        返回 [{name, path, modified_time, size, sha256, summary}, ...]，
+        数据来自存储后端的元数据，未变化时不访问磁盘。
+
+        :param refresh: 强制与磁盘核对
+        """
+        try:
+            entries = self.store.list(refresh)
+        except Exception as e:
+            print(f"获取预设列表失败: {e}")
+            return []
+        return [
+            {
+                "name": entry["name"],
+                "path": entry["path"],
+                "modified_time": datetime.fromtimestamp(entry["mtime"]),
+                "size": entry["size"],
+                "sha256": entry["sha256"],
+                "summary": entry["summary"],
+            }
+            for entry in entries
+        ]
+
+    def search_presets(self, query: str, limit: int = 20) -> list[dict]:
+        """
+        全文搜索预设（名称及所有字段值），按相关度排序
+
+        返回 [{name, score, summary}, ...]
+        """
+        try:
+            entries = {entry["name"]: entry for entry in self.store.list()}
+            found = self.store.search(query, limit)
+        except Exception as e:
+            print(f"搜索预设失败: {e}")
+            return []
+        results = []
+        for result in found:
+            entry = entries.get(result["name"])
+            if entry is not None:
+                results.append({**result, "summary": entry["summary"]})
+        return results
+
+    def find_presets(self, field: str, value: Any = _ANY) -> list[str]:
+        """
+        按顶层字段查询预设名称（按修改时间倒序）
+
+        find_presets("画幅设置") 返回包含该字段的预设；
+        find_presets("风格模式", "写实风格") 返回字段值等于给定值的预设。
+        """
+        try:
+            return self.store.find(field, value)
+        except Exception as e:
+            print(f"查询预设失败: {e}")
+            return []
+
+    @staticmethod
+    def safe_name(name: str) -> str:
+        """清理文件名中的非法字符，返回实际使用的预设名称"""
+        safe_name = "".join(c for c in name if c.isalnum() or c in (' ', '-', '_', '（', '）', '(', ')')).strip()
+        if not safe_name:
+            safe_name = f"preset_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        return safe_name
 
     def save_preset(self, name: str, data: dict) -> bool:
         """保存预设"""
         try:
-            # 清理文件名中的非法字符
-            safe_name = "".join(c for c in name if c.isalnum() or c in (' ', '-', '_', '（', '）', '(', ')')).strip()
-            if not safe_name:
-                safe_name = f"preset_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-            
-            file_path = self.presets_dir / f"{safe_name}.json"
-            with open(file_path, "w", encoding="utf-8") as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            self.store.save(self.safe_name(name), data)
             return True
         except Exception as e:
             print(f"保存预设失败: {e}")
@@ -53,10 +102,7 @@ class PresetManager:
     def load_preset(self, name: str) -> dict | None:
         """加载预设"""
         try:
-            file_path = self.presets_dir / f"{name}.json"
-            if file_path.exists():
-                with open(file_path, "r", encoding="utf-8") as f:
-                    return json.load(f)
+            return self.store.load(name)
         except Exception as e:
             print(f"加载预设失败: {e}")
         return None
@@ -64,10 +110,7 @@ class PresetManager:
     def delete_preset(self, name: str) -> bool:
         """删除预设"""
         try:
-            file_path = self.presets_dir / f"{name}.json"
-            if file_path.exists():
-                file_path.unlink()
-                return True
+            return self.store.delete(name)
         except Exception as e:
             print(f"删除预设失败: {e}")
         return False
@@ -75,12 +118,7 @@ class PresetManager:
     def rename_preset(self, old_name: str, new_name: str) -> bool:
         """重命名预设"""
         try:
-            old_path = self.presets_dir / f"{old_name}.json"
-            new_path = self.presets_dir / f"{new_name}.json"
-            if old_path.exists() and not new_path.exists():
-                old_path.rename(new_path)
-                return True
+            return self.store.rename(old_name, new_name)
         except Exception as e:
             print(f"重命名预设失败: {e}")
         return False
-
@@ -0,0 +1,311 @@
+"""预设全文搜索 - 基于倒排索引，支持中日韩文字（按字二元切分）"""
+import bisect
+import hashlib
+import itertools
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional
+
+from utils.resource_path import get_cache_dir
+
+
+# 索引格式版本，分词规则变化时递增以重建索引
+SEARCH_INDEX_VERSION = 1
+
+# 预设名称中的词在评分时的权重
+NAME_WEIGHT = 3
+
+# 输入中最后一个英文词按前缀匹配时，最多展开的词数
+PREFIX_EXPANSIONS = 50
+
+# BM25 参数
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# 平假名/片假名、中日韩统一表意文字（含扩展A、兼容区）、韩文音节
+_CJK_RANGES = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff"
+# 连续的中日韩文字，或连续的其他字母/数字
+_TOKEN_RE = re.compile(f"[{_CJK_RANGES}]+|[^\\W_{_CJK_RANGES}]+")
+_CJK_RE = re.compile(f"[{_CJK_RANGES}]")
+
+
+def tokenize(text: str, unigrams: bool = True) -> Iterator[str]:
+    """
+    分词
+
+    英文、数字按单词切分并转小写；中日韩文字按相邻两字切分（二元组），
+    unigrams 为 True 时同时输出单字，用于匹配只输入一个字的查询。
+    """
+    for match in _TOKEN_RE.finditer(text.lower()):
+        run = match.group()
+        if not _CJK_RE.match(run):
+            yield run
+            continue
+        if len(run) == 1:
+            yield run
+            continue
+        for i in range(len(run) - 1):
+            yield run[i:i + 2]
+        if unigrams:
+            yield from run
+
+
+def _iter_text(value) -> Iterator[str]:
+    """预设中所有字段值（递归）"""
+    if isinstance(value, dict):
+        for item in value.values():
+            yield from _iter_text(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _iter_text(item)
+    elif isinstance(value, str):
+        yield value
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        yield str(value)
+
+
+def make_term_counts(name: str, data) -> Dict[str, int]:
+    """计算一个预设的词频（名称中的词加权）"""
+    counts = Counter()
+    for text in _iter_text(data):
+        counts.update(tokenize(text))
+    for token in tokenize(name):
+        counts[token] += NAME_WEIGHT
+    return dict(counts)
+
+
+class PresetSearchIndex:
+    """
+    预设倒排索引
+
+    以预设存储的元数据（name、sha256）为准增量同步：只重新读取内容哈希有变化的预设，
+    各预设的词频保存在本地索引文件中，倒排表在内存中重建。
+    """
+
+    def __init__(self, source, index_path: Path, loader: Optional[Callable[[dict], dict]] = None):
+        """
+        :param source: 提供 list() 的元数据来源（PresetIndex 或预设存储）
+        :param index_path: 词频索引文件路径
+        :param loader: 按元数据记录读取预设内容，默认读取记录中的 path 文件
+        """
+        self.source = source
+        self.index_path = Path(index_path)
+        self._loader = loader
+        self._lock = threading.Lock()
+        # 预设名称 -> {sha256, terms: {词: 词频}}，首次使用时从索引文件加载
+        self._docs: Optional[Dict[str, dict]] = None
+        # 词 -> {预设名称: 词频}
+        self._postings: Dict[str, Dict[str, int]] = {}
+        # 预设名称 -> 总词数
+        self._lengths: Dict[str, int] = {}
+        # 排序后的词表，用于前缀匹配，索引变化时清空
+        self._vocabulary: Optional[List[str]] = None
+        # 读取失败的预设名称 -> 当时的 sha256，内容变化前不再重复读取
+        self._failed: Dict[str, str] = {}
+
+    def _load(self) -> Dict[str, dict]:
+        """读取索引文件并重建倒排表（需持有锁）"""
+        if self._docs is not None:
+            return self._docs
+        docs = {}
+        try:
+            if self.index_path.exists():
+                with open(self.index_path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("version") == SEARCH_INDEX_VERSION:
+                    docs = data.get("docs") or {}
+        except Exception as e:
+            print(f"读取预设搜索索引失败: {e}")
+        self._docs = {}
+        for name, doc in docs.items():
+            self._add(name, doc)
+        return self._docs
+
+    def _save(self):
+        """
+        写入索引文件（需持有锁）
+
+        每次重写整个文件；只在 sync 发现预设有增删改时调用，预设没有变化的搜索不会写入。
+        """
+        try:
+            self.index_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.index_path.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(
+                    {"version": SEARCH_INDEX_VERSION, "docs": self._docs},
+                    f,
+                    ensure_ascii=False,
+                )
+            os.replace(tmp_path, self.index_path)
+        except Exception as e:
+            print(f"写入预设搜索索引失败: {e}")
+
+    def _add(self, name: str, doc: dict):
+        """加入一个预设（需持有锁）"""
+        self._docs[name] = doc
+        terms = doc["terms"]
+        for term, count in terms.items():
+            self._postings.setdefault(term, {})[name] = count
+        self._lengths[name] = sum(terms.values())
+        self._vocabulary = None
+
+    def _remove(self, name: str):
+        """移除一个预设（需持有锁）"""
+        doc = self._docs.pop(name, None)
+        if doc is None:
+            return
+        for term in doc["terms"]:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(name, None)
+                if not postings:
+                    del self._postings[term]
+        self._lengths.pop(name, None)
+        self._vocabulary = None
+
+    def _read_terms(self, entry: dict) -> Optional[Dict[str, int]]:
+        """读取预设内容并分词"""
+        try:
+            if self._loader is not None:
+                data = self._loader(entry)
+            else:
+                with open(entry["path"], "r", encoding="utf-8") as f:
+                    data = json.load(f)
+        except Exception as e:
+            print(f"读取预设失败: {e}")
+            return None
+        return make_term_counts(entry["name"], data)
+
+    def sync(self):
+        """与预设元数据同步，只处理新增、删除和内容有变化的预设"""
+        entries = {entry["name"]: entry for entry in self.source.list()}
+        with self._lock:
+            docs = self._load()
+            changed = False
+            for name in [name for name in docs if name not in entries]:
+                self._remove(name)
+                changed = True
+            for name in [name for name in self._failed if name not in entries]:
+                del self._failed[name]
+            for name, entry in entries.items():
+                doc = docs.get(name)
+                if doc is not None and doc["sha256"] == entry["sha256"]:
+                    continue
+                if self._failed.get(name) == entry["sha256"]:
+                    continue
+                terms = self._read_terms(entry)
+                if terms is None:
+                    self._failed[name] = entry["sha256"]
+                    continue
+                self._failed.pop(name, None)
+                self._remove(name)
+                self._add(name, {"sha256": entry["sha256"], "terms": terms})
+                changed = True
+            if changed:
+                self._save()
+
+    def _expand_prefix(self, prefix: str) -> List[str]:
+        """词表中以 prefix 开头的词（按出现的预设数降序，需持有锁）"""
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self._postings)
+        start = bisect.bisect_left(self._vocabulary, prefix)
+        terms = []
+        for term in itertools.islice(self._vocabulary, start, None):
+            if not term.startswith(prefix):
+                break
+            terms.append(term)
+        terms.sort(key=lambda t: len(self._postings[t]), reverse=True)
+        return terms[:PREFIX_EXPANSIONS]
+
+    def search(self, query: str, limit: int = 20) -> List[dict]:
+        """
+        搜索预设
+
+        查询中的每个词都必须出现（输入中最后一个英文词按前缀匹配，便于边输入边搜索），
+        按 BM25 评分排序，名称包含完整查询的预设优先。
+
+        :return: [{name, score}, ...]
+        """
+        # 以空白结尾说明最后一个词已输入完整，不再按前缀匹配
+        complete = not query or query[-1].isspace()
+        query = query.strip()
+        tokens = list(dict.fromkeys(tokenize(query, unigrams=False)))
+        if not tokens:
+            return []
+
+        self.sync()
+        with self._lock:
+            # 每组为可互相替代的词：普通词只有自身，前缀词为所有展开结果
+            groups = [[token] for token in tokens]
+            last = tokens[-1]
+            if not complete and not _CJK_RE.match(last) and query.lower().endswith(last):
+                groups[-1] = self._expand_prefix(last) or [last]
+
+            total = len(self._docs)
+            if not total:
+                return []
+            avg_length = sum(self._lengths.values()) / total
+
+            scores: Optional[Dict[str, float]] = None
+            for group in groups:
+                group_scores: Dict[str, float] = {}
+                for term in group:
+                    postings = self._postings.get(term)
+                    if not postings:
+                        continue
+                    idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+                    for name, count in postings.items():
+                        norm = BM25_K1 * (1 - BM25_B + BM25_B * self._lengths[name] / avg_length)
+                        score = idf * count * (BM25_K1 + 1) / (count + norm)
+                        group_scores[name] = max(group_scores.get(name, 0.0), score)
+                if scores is None:
+                    scores = group_scores
+                else:
+                    scores = {
+                        name: score + group_scores[name]
+                        for name, score in scores.items()
+                        if name in group_scores
+                    }
+                if not scores:
+                    return []
+
+        lowered = query.lower()
+        results = [
+            {"name": name, "score": score + (1000.0 if lowered in name.lower() else 0.0)}
+            for name, score in scores.items()
+        ]
+        results.sort(key=lambda r: (-r["score"], r["name"]))
+        return results[:limit]
+
+
+_search_indexes: Dict[Path, PresetSearchIndex] = {}
+_search_indexes_lock = threading.Lock()
+
+
+def get_preset_search(
+    source,
+    key: Path,
+    loader: Optional[Callable[[dict], dict]] = None,
+) -> PresetSearchIndex:
+    """
+    获取指定预设存储的全局搜索索引
+
+    :param source: 提供 list() 的元数据来源
+    :param key: 存储位置（预设目录或数据库文件），用于区分索引文件
+    :param loader: 见 PresetSearchIndex
+    """
+    key = Path(key)
+    with _search_indexes_lock:
+        search = _search_indexes.get(key)
+        if search is None:
+            name = hashlib.sha256(str(key).encode("utf-8")).hexdigest()[:16]
+            search = PresetSearchIndex(
+                source, get_cache_dir() / f"preset_search_{name}.json", loader
+            )
+            _search_indexes[key] = search
+        return search
@@ -0,0 +1,400 @@
+"""预设存储后端 - 每个预设一个 JSON 文件，或单个 SQLite 数据库"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from utils.preset_index import get_preset_index, make_summary
+from utils.preset_search import get_preset_search
+
+
+# 可选的存储后端
+PRESET_BACKENDS = ["json", "sqlite"]
+
+# SQLite 数据库文件名（位于预设目录中）
+SQLITE_FILENAME = "presets.db"
+
+# 表示“只要求字段存在”的查询值
+_ANY = object()
+
+
+def dump_preset(data: dict) -> str:
+    """预设的存储格式，与 JSON 文件内容一致，便于导入导出和比较哈希"""
+    return json.dumps(data, ensure_ascii=False, indent=2)
+
+
+def field_value(value) -> Optional[str]:
+    """顶层字段值的索引形式：标量转为文本，对象和列表转为规范化 JSON"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False, sort_keys=True)
+    return json.dumps(value)
+
+
+class PresetStore:
+    """
+    预设存储后端接口
+
+    各方法出错时直接抛出异常，由 PresetManager 统一处理。
+    list() 返回的记录包含 {name, path, mtime, size, sha256, summary}，按修改时间倒序。
+    """
+
+    def list(self, refresh: bool = False) -> List[dict]:
+        raise NotImplementedError
+
+    def save(self, name: str, data: dict):
+        raise NotImplementedError
+
+    def load(self, name: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    def delete(self, name: str) -> bool:
+        raise NotImplementedError
+
+    def rename(self, old_name: str, new_name: str) -> bool:
+        raise NotImplementedError
+
+    def search(self, query: str, limit: int = 20) -> List[dict]:
+        raise NotImplementedError
+
+    def find(self, field: str, value=_ANY) -> List[str]:
+        raise NotImplementedError
+
+
+class JsonPresetStore(PresetStore):
+    """每个预设保存为预设目录下的一个 JSON 文件，元数据由 PresetIndex 维护"""
+
+    def __init__(self, presets_dir: Path):
+        self.presets_dir = Path(presets_dir)
+        self.presets_dir.mkdir(parents=True, exist_ok=True)
+        self.index = get_preset_index(self.presets_dir)
+        self.search_index = get_preset_search(self.index, self.presets_dir)
+
+    def _path(self, name: str) -> Path:
+        return self.presets_dir / f"{name}.json"
+
+    def list(self, refresh: bool = False) -> List[dict]:
+        if refresh:
+            self.index.invalidate()
+        return self.index.list()
+
+    def save(self, name: str, data: dict):
+        with self.index.changing():
+            with open(self._path(name), "w", encoding="utf-8") as f:
+                f.write(dump_preset(data))
+            self.index.update(name)
+
+    def load(self, name: str) -> Optional[dict]:
+        file_path = self._path(name)
+        if not file_path.exists():
+            return None
+        with open(file_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def delete(self, name: str) -> bool:
+        file_path = self._path(name)
+        if not file_path.exists():
+            return False
+        with self.index.changing():
+            file_path.unlink()
+            self.index.remove(name)
+        return True
+
+    def rename(self, old_name: str, new_name: str) -> bool:
+        old_path = self._path(old_name)
+        new_path = self._path(new_name)
+        if not old_path.exists() or new_path.exists():
+            return False
+        with self.index.changing():
+            old_path.rename(new_path)
+            self.index.rename(old_name, new_name)
+        return True
+
+    def search(self, query: str, limit: int = 20) -> List[dict]:
+        return self.search_index.search(query, limit)
+
+    def find(self, field: str, value=_ANY) -> List[str]:
+        """按顶层字段查询（需要逐个读取文件，大量预设时建议使用 SQLite 后端）"""
+        wanted = None if value is _ANY else field_value(value)
+        names = []
+        for entry in self.index.list():
+            try:
+                data = self.load(entry["name"])
+            except Exception:
+                continue
+            if not isinstance(data, dict) or field not in data:
+                continue
+            if value is _ANY or field_value(data[field]) == wanted:
+                names.append(entry["name"])
+        return names
+
+
+class SqlitePresetStore(PresetStore):
+    """
+    SQLite 预设存储（WAL 模式）
+
+    presets 表保存预设内容和元数据，preset_fields 表按 (字段, 值) 索引每个预设的顶层字段。
+    每个线程使用独立的连接。元数据保存在内存中，本进程的写入直接同步修改，
+    其他进程提交后（PRAGMA data_version 变化）重新读取。
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS presets (
+            name TEXT PRIMARY KEY,
+            data TEXT NOT NULL,
+            mtime REAL NOT NULL,
+            size INTEGER NOT NULL,
+            sha256 TEXT NOT NULL,
+            summary TEXT NOT NULL DEFAULT ''
+        );
+        CREATE INDEX IF NOT EXISTS idx_presets_meta ON presets (name, mtime, size, sha256, summary);
+        CREATE TABLE IF NOT EXISTS preset_fields (
+            name TEXT NOT NULL REFERENCES presets (name) ON DELETE CASCADE ON UPDATE CASCADE,
+            field TEXT NOT NULL,
+            value TEXT,
+            PRIMARY KEY (name, field)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_preset_fields_value ON preset_fields (field, value);
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # 预设名称 -> 元数据记录，首次使用时读取；_version 为读取时的 PRAGMA data_version
+        self._entries: Optional[Dict[str, dict]] = None
+        self._version: Optional[int] = None
+        # 按修改时间倒序的列表缓存，元数据变化时清空
+        self._sorted: Optional[List[dict]] = None
+
+        is_new = not self.db_path.exists()
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(self.SCHEMA)
+        # 专用于检测其他连接提交的连接（data_version 不反映本连接自己的提交）
+        self._watch = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.search_index = get_preset_search(self, self.db_path, lambda entry: self.load(entry["name"]))
+
+        if is_new:
+            # 首次启用时自动导入现有的 JSON 预设，个别文件损坏不影响其余预设和启动
+            count = self.import_json_dir(self.db_path.parent, skip_invalid=True)
+            if count:
+                print(f"已从 JSON 文件导入 {count} 个预设")
+
+    def _conn(self) -> sqlite3.Connection:
+        """当前线程的数据库连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA foreign_keys=ON")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _write_row(self, conn: sqlite3.Connection, name: str, data: dict, text: str, mtime: float):
+        """写入一个预设及其顶层字段（需在事务中调用），返回元数据记录"""
+        raw = text.encode("utf-8")
+        sha256 = hashlib.sha256(raw).hexdigest()
+        summary = make_summary(data)
+        conn.execute(
+            """
+            INSERT INTO presets (name, data, mtime, size, sha256, summary)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (name) DO UPDATE SET
+                data = excluded.data, mtime = excluded.mtime, size = excluded.size,
+                sha256 = excluded.sha256, summary = excluded.summary
+            """,
+            (name, text, mtime, len(raw), sha256, summary),
+        )
+        conn.execute("DELETE FROM preset_fields WHERE name = ?", (name,))
+        if isinstance(data, dict):
+            conn.executemany(
+                "INSERT INTO preset_fields (name, field, value) VALUES (?, ?, ?)",
+                [(name, str(key), field_value(value)) for key, value in data.items()],
+            )
+        return {
+            "name": name,
+            "path": str(self.db_path),
+            "mtime": mtime,
+            "size": len(raw),
+            "sha256": sha256,
+            "summary": summary,
+        }
+
+    def _data_version(self) -> int:
+        """数据库的提交计数（需持有锁）"""
+        return self._watch.execute("PRAGMA data_version").fetchone()[0]
+
+    def _load_entries(self) -> Dict[str, dict]:
+        """内存中的元数据，数据库被其他连接修改过时重新读取（需持有锁）"""
+        version = self._data_version()
+        if self._entries is None or version != self._version:
+            path = str(self.db_path)
+            rows = self._conn().execute(
+                "SELECT name, mtime, size, sha256, summary FROM presets"
+            ).fetchall()
+            self._entries = {
+                name: {"name": name, "path": path, "mtime": mtime, "size": size, "sha256": sha256, "summary": summary}
+                for name, mtime, size, sha256, summary in rows
+            }
+            self._version = version
+            self._sorted = None
+        return self._entries
+
+    @contextmanager
+    def _writing(self):
+        """
+        本进程的写操作：在内存中同步修改元数据，不必重新读取整张表
+
+        写入前若数据库已被其他进程修改，则丢弃内存中的元数据，下次使用时重新读取。
+        """
+        with self._lock:
+            if self._entries is not None and self._data_version() != self._version:
+                self._entries = None
+            yield self._entries
+            self._version = self._data_version()
+            self._sorted = None
+
+    def list(self, refresh: bool = False) -> List[dict]:
+        with self._lock:
+            if refresh:
+                self._entries = None
+            entries = self._load_entries()
+            if self._sorted is None:
+                self._sorted = sorted(entries.values(), key=lambda e: e["mtime"], reverse=True)
+            return list(self._sorted)
+
+    def save(self, name: str, data: dict):
+        conn = self._conn()
+        with self._writing() as entries:
+            with conn:
+                entry = self._write_row(conn, name, data, dump_preset(data), time.time())
+            if entries is not None:
+                entries[name] = entry
+
+    def load(self, name: str) -> Optional[dict]:
+        row = self._conn().execute("SELECT data FROM presets WHERE name = ?", (name,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def delete(self, name: str) -> bool:
+        conn = self._conn()
+        with self._writing() as entries:
+            with conn:
+                deleted = conn.execute("DELETE FROM presets WHERE name = ?", (name,)).rowcount
+            if entries is not None:
+                entries.pop(name, None)
+        return bool(deleted)
+
+    def rename(self, old_name: str, new_name: str) -> bool:
+        conn = self._conn()
+        with self._writing() as entries:
+            try:
+                with conn:
+                    renamed = conn.execute(
+                        "UPDATE presets SET name = ? WHERE name = ?", (new_name, old_name)
+                    ).rowcount
+            except sqlite3.IntegrityError:
+                # 新名称已存在
+                return False
+            if entries is not None and old_name in entries:
+                entries[new_name] = dict(entries.pop(old_name), name=new_name)
+        return bool(renamed)
+
+    def search(self, query: str, limit: int = 20) -> List[dict]:
+        return self.search_index.search(query, limit)
+
+    def find(self, field: str, value=_ANY) -> List[str]:
+        """按顶层字段查询（走 (字段, 值) 索引），按修改时间倒序返回预设名称"""
+        if value is _ANY:
+            sql = "SELECT f.name FROM preset_fields f JOIN presets p ON p.name = f.name WHERE f.field = ?"
+            params = (field,)
+        else:
+            sql = (
+                "SELECT f.name FROM preset_fields f JOIN presets p ON p.name = f.name "
+                "WHERE f.field = ? AND f.value IS ?"
+            )
+            params = (field, field_value(value))
+        rows = self._conn().execute(sql + " ORDER BY p.mtime DESC", params).fetchall()
+        return [row[0] for row in rows]
+
+    def import_json_dir(self, json_dir: Path, skip_invalid: bool = False) -> int:
+        """
+        在一个事务中导入目录下的所有 JSON 预设（同名预设被覆盖，保留文件修改时间）
+
+        :param skip_invalid: 为 True 时跳过无法读取或解析的文件（打印提示），只导入其余文件
+        :return: 导入的数量；skip_invalid 为 False 时任一文件无法解析则整体回滚并抛出异常
+        """
+        rows = []
+        for file in sorted(Path(json_dir).glob("*.json")):
+            try:
+                with open(file, "r", encoding="utf-8") as f:
+                    data = json.loads(f.read())
+                mtime = file.stat().st_mtime
+            except (OSError, ValueError) as e:
+                if not skip_invalid:
+                    raise ValueError(f"{file.name}: {e}") from e
+                print(f"跳过无法导入的预设 {file.name}: {e}")
+                continue
+            rows.append((file.stem, data, mtime))
+
+        conn = self._conn()
+        with self._writing() as entries:
+            with conn:
+                imported = [
+                    self._write_row(conn, name, data, dump_preset(data), mtime)
+                    for name, data, mtime in rows
+                ]
+            if entries is not None:
+                entries.update((entry["name"], entry) for entry in imported)
+        return len(rows)
+
+    def export_json_dir(self, json_dir: Path) -> int:
+        """
+        把所有预设导出为目录下的 JSON 文件（一次查询读取，内容一致；保留修改时间）
+
+        :return: 导出的数量
+        """
+        json_dir = Path(json_dir)
+        json_dir.mkdir(parents=True, exist_ok=True)
+        rows = self._conn().execute("SELECT name, data, mtime FROM presets").fetchall()
+        for name, text, mtime in rows:
+            file_path = json_dir / f"{name}.json"
+            tmp_path = file_path.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp_path, file_path)
+            os.utime(file_path, (mtime, mtime))
+        return len(rows)
+
+
+_preset_stores: Dict[Tuple[str, Path], PresetStore] = {}
+_preset_stores_lock = threading.Lock()
+
+
+def get_preset_store(backend: str, presets_dir: Path) -> PresetStore:
+    """
+    获取全局预设存储
+
+    :param backend: "json" 或 "sqlite"（未知值按 "json" 处理）
+    :param presets_dir: 预设目录；SQLite 数据库保存在其中的 presets.db
+    """
+    backend = backend if backend in PRESET_BACKENDS else "json"
+    key = (backend, Path(presets_dir))
+    with _preset_stores_lock:
+        store = _preset_stores.get(key)
+        if store is None:
+            if backend == "sqlite":
+                store = SqlitePresetStore(Path(presets_dir) / SQLITE_FILENAME)
+            else:
+                store = JsonPresetStore(presets_dir)
+            _preset_stores[key] = store
+        return store
@@ -0,0 +1,247 @@
+"""
+客户端速率限制 - 按 (服务商, API 地址, 模型) 在进程内共享的令牌桶
+
+每个限制器有两个桶：请求数（requests_per_minute）和估算的 token 数（tokens_per_minute），
+为 0 表示不限制。超出额度的请求按到达顺序排队等待，而不是直接失败。
+预留额度和等待分开进行，同步（线程）和异步（事件循环）调用方共用同一个限制器。
+"""
+import asyncio
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from utils.retry import sleep_unless_cancelled
+
+
+# token 估算：ASCII 文本约 4 个字符一个 token，中文等其他字符按一个字符一个 token
+CHARS_PER_TOKEN = 4
+
+# 每张参考图按此估算 token 数
+IMAGE_TOKENS = {
+    "openai": 765,
+    "gemini": 258,
+}
+
+
+def estimate_text_tokens(text: str) -> int:
+    """粗略估算文本的 token 数（只用于限流，不要求精确）"""
+    if not text:
+        return 0
+    ascii_count = sum(1 for ch in text if ord(ch) < 128)
+    return -(-ascii_count // CHARS_PER_TOKEN) + (len(text) - ascii_count)
+
+
+def estimate_message_tokens(messages: List[dict], image_tokens: int = IMAGE_TOKENS["openai"]) -> int:
+    """估算 OpenAI 格式消息列表的输入 token 数（图片按 image_tokens 计）"""
+    total = 0
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, str):
+            total += estimate_text_tokens(content)
+        elif isinstance(content, list):
+            for part in content:
+                if part.get("type") == "text":
+                    total += estimate_text_tokens(part.get("text") or "")
+                else:
+                    total += image_tokens
+    return total
+
+
+def format_wait_message(delay: float, queued: int) -> str:
+    """限流等待提示"""
+    return f"已达到速率限制，排队等待 {delay:.1f} 秒（队列中 {queued} 个请求）..."
+
+
+class TokenBucket:
+    """
+    令牌桶：容量为每分钟额度，按额度/60 每秒补充
+
+    预留时直接扣减，余额可以为负，负数部分即为需要等待的时间，
+    因此先预留的请求先获得额度（按到达顺序排队）。
+    """
+
+    __slots__ = ("per_minute", "rate", "level", "updated")
+
+    def __init__(self, per_minute: float):
+        self.per_minute = float(per_minute)
+        self.rate = self.per_minute / 60.0
+        self.level = self.per_minute
+        self.updated = time.monotonic()
+
+    def reserve(self, amount: float, now: float) -> float:
+        """扣减 amount，返回需要等待的秒数"""
+        self.level = min(self.per_minute, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+        self.level -= amount
+        return 0.0 if self.level >= 0 else -self.level / self.rate
+
+
+class RateLimiter:
+    """
+    单个 (服务商, API 地址, 模型) 的限流器，线程安全
+
+    用法：
+        delay = limiter.reserve(tokens)   # 预留额度，返回需要等待的秒数
+        if delay > 0:
+            limiter.wait(delay)           # 或 await limiter.async_wait(delay)
+    """
+
+    def __init__(self, name: str, requests_per_minute: float = 0, tokens_per_minute: float = 0):
+        self.name = name
+        self._lock = threading.Lock()
+        self._requests: Optional[TokenBucket] = None
+        self._tokens: Optional[TokenBucket] = None
+        self.configure(requests_per_minute, tokens_per_minute)
+
+        # 统计
+        self._count = 0          # 通过的请求数
+        self._waited = 0         # 需要等待的请求数
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._queued = 0         # 正在等待的请求数
+        self._max_queued = 0
+
+    def configure(self, requests_per_minute: float = 0, tokens_per_minute: float = 0):
+        """更新额度（额度未变化时保留桶的当前余额）"""
+        with self._lock:
+            self._requests = self._bucket(self._requests, requests_per_minute)
+            self._tokens = self._bucket(self._tokens, tokens_per_minute)
+
+    @staticmethod
+    def _bucket(bucket: Optional[TokenBucket], per_minute: float) -> Optional[TokenBucket]:
+        if not per_minute or per_minute <= 0:
+            return None
+        if bucket is not None and bucket.per_minute == float(per_minute):
+            return bucket
+        return TokenBucket(per_minute)
+
+    @property
+    def enabled(self) -> bool:
+        return self._requests is not None or self._tokens is not None
+
+    @property
+    def queued(self) -> int:
+        """正在等待的请求数"""
+        return self._queued
+
+    def reserve(self, tokens: int = 0) -> float:
+        """为一次请求预留额度，返回需要等待的秒数（不限制时为 0）"""
+        now = time.monotonic()
+        with self._lock:
+            delay = 0.0
+            if self._requests is not None:
+                delay = self._requests.reserve(1, now)
+            if self._tokens is not None and tokens > 0:
+                delay = max(delay, self._tokens.reserve(tokens, now))
+            self._count += 1
+            if delay > 0:
+                self._waited += 1
+                self._total_wait += delay
+                self._max_wait = max(self._max_wait, delay)
+        return delay
+
+    def _enter_queue(self):
+        with self._lock:
+            self._queued += 1
+            self._max_queued = max(self._max_queued, self._queued)
+
+    def _leave_queue(self):
+        with self._lock:
+            self._queued -= 1
+
+    def wait(self, delay: float, cancelled: Optional[Callable[[], bool]] = None) -> bool:
+        """
+        阻塞等待 reserve 返回的时间
+
+        :return: 被取消时返回 False（已预留的额度不退回）
+        """
+        if delay <= 0:
+            return True
+        self._enter_queue()
+        try:
+            return sleep_unless_cancelled(delay, cancelled)
+        finally:
+            self._leave_queue()
+
+    async def async_wait(self, delay: float):
+        """wait 的异步版本（任务被取消时抛出 CancelledError）"""
+        if delay <= 0:
+            return
+        self._enter_queue()
+        try:
+            await asyncio.sleep(delay)
+        finally:
+            self._leave_queue()
+
+    def acquire(self, tokens: int = 0, cancelled: Optional[Callable[[], bool]] = None) -> bool:
+        """预留并等待，被取消时返回 False"""
+        return self.wait(self.reserve(tokens), cancelled)
+
+    async def aacquire(self, tokens: int = 0):
+        """acquire 的异步版本"""
+        await self.async_wait(self.reserve(tokens))
+
+    def stats(self) -> dict:
+        """排队和等待统计，用于评估额度是否合适"""
+        with self._lock:
+            return {
+                "name": self.name,
+                "requests_per_minute": self._requests.per_minute if self._requests else 0,
+                "tokens_per_minute": self._tokens.per_minute if self._tokens else 0,
+                "requests": self._count,
+                "waited": self._waited,
+                "queued": self._queued,
+                "max_queued": self._max_queued,
+                "total_wait": round(self._total_wait, 3),
+                "max_wait": round(self._max_wait, 3),
+                "avg_wait": round(self._total_wait / self._waited, 3) if self._waited else 0.0,
+            }
+
+
+# 进程级注册表
+_limiters: Dict[Tuple[str, str, str], RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def resolve_limits(config: Optional[dict], model: str) -> dict:
+    """
+    合并服务商额度和模型单独的额度
+
+    :param config: AIConfigManager.get_rate_limit_config() 的结果
+    :return: {requests_per_minute, tokens_per_minute, output_tokens}
+    """
+    config = config or {}
+    limits = {
+        "requests_per_minute": config.get("requests_per_minute", 0),
+        "tokens_per_minute": config.get("tokens_per_minute", 0),
+        "output_tokens": config.get("output_tokens", 0),
+    }
+    override = (config.get("models") or {}).get(model)
+    if isinstance(override, dict):
+        limits.update({key: override[key] for key in limits if key in override})
+    return limits
+
+
+def get_rate_limiter(provider: str, base_url: str, model: str, config: Optional[dict] = None) -> RateLimiter:
+    """
+    获取（或创建）指定服务商、API 地址和模型的共享限流器
+
+    :param config: 额度配置，每次调用都会按其更新限流器（配置修改后立即生效）
+    """
+    base_url = base_url.rstrip("/")
+    limits = resolve_limits(config, model)
+    key = (provider, base_url, model)
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = RateLimiter(f"{provider}:{base_url}:{model}")
+            _limiters[key] = limiter
+    limiter.configure(limits["requests_per_minute"], limits["tokens_per_minute"])
+    return limiter
+
+
+def rate_limit_stats() -> List[dict]:
+    """所有限流器的统计"""
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return [limiter.stats() for limiter in limiters]
@@ -37,6 +37,16 @@ def get_presets_dir() -> Path:
     return get_resource_path("presets")
 
 
+def get_cache_dir() -> Path:
+    """获取缓存目录路径"""
+    return get_resource_path("cache")
+
+
+def get_generated_dir() -> Path:
+    """获取生成图片归档目录路径"""
+    return get_resource_path("generated")
+
+
 def get_images_dir() -> Path:
     """获取图片目录路径"""
     if getattr(sys, 'frozen', False):
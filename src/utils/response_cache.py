@@ -0,0 +1,233 @@
+"""AI 响应缓存 - 相同请求直接复用之前的生成结果"""
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from utils.image_cache import EncodedImage
+from utils.resource_path import get_cache_dir
+
+
+# 缓存格式版本，请求结构变化时递增以使旧缓存失效
+CACHE_VERSION = 1
+
+
+def make_request_key(
+    base_url: str,
+    model: str,
+    messages: list,
+    encoded_images: Optional[List[EncodedImage]] = None,
+) -> str:
+    """
+    计算请求指纹
+
+    消息中的图片 data URL 按顺序替换为图片内容哈希，
+    避免对大段 base64 重复计算，同时保证参考图变化时指纹随之变化。
+    """
+    images = iter(encoded_images or [])
+    normalized = []
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, list):
+            parts = []
+            for part in content:
+                if part.get("type") == "image_url":
+                    image = next(images, None)
+                    if image is not None:
+                        part = {
+                            "type": "image",
+                            "sha256": image.sha256,
+                            "mime_type": image.mime_type,
+                            "size": image.payload_size,
+                        }
+                parts.append(part)
+            content = parts
+        normalized.append({"role": message.get("role"), "content": content})
+
+    payload = json.dumps(
+        {
+            "version": CACHE_VERSION,
+            "base_url": base_url.rstrip("/"),
+            "model": model,
+            "messages": normalized,
+        },
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    磁盘响应缓存
+
+    每条记录一个 JSON 文件，文件名为请求指纹。
+    超过 max_age_days 的记录视为过期；总条数或总大小超限时删除最久未使用的记录。
+    各记录的访问时间和大小在首次使用时扫描一次目录后保存在内存中，写入时只在超限时才淘汰。
+    """
+
+    def __init__(
+        self,
+        cache_dir: Path,
+        max_entries: int = 1000,
+        max_size_mb: int = 50,
+        max_age_days: int = 30,
+    ):
+        self.cache_dir = Path(cache_dir)
+        self._lock = threading.Lock()
+        # 指纹 -> (访问时间, 大小)，首次使用时扫描目录
+        self._entries: Optional[Dict[str, Tuple[float, int]]] = None
+        self._total = 0
+        self.configure(max_entries, max_size_mb, max_age_days)
+
+    def configure(self, max_entries: int = 1000, max_size_mb: int = 50, max_age_days: int = 30):
+        """更新上限（配置修改后调用），超出新上限的记录立即淘汰"""
+        with self._lock:
+            self.max_entries = max_entries
+            self.max_bytes = max_size_mb * 1024 * 1024
+            self.max_age = max_age_days * 24 * 3600
+            if self._entries is not None:
+                self._trim()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    def _load_entries(self) -> Dict[str, Tuple[float, int]]:
+        """扫描缓存目录（需持有锁，只在首次使用时执行）"""
+        if self._entries is None:
+            self._entries = {}
+            self._total = 0
+            for file in self.cache_dir.glob("*.json"):
+                try:
+                    stat = file.stat()
+                except OSError:
+                    continue
+                self._entries[file.stem] = (stat.st_mtime, stat.st_size)
+                self._total += stat.st_size
+        return self._entries
+
+    def _forget(self, key: str):
+        """从内存记录中移除（需持有锁）"""
+        entry = self._entries.pop(key, None) if self._entries is not None else None
+        if entry is not None:
+            self._total -= entry[1]
+
+    def get(self, key: str) -> Optional[str]:
+        """读取缓存内容，未命中或已过期返回 None"""
+        file_path = self._path(key)
+        try:
+            if not file_path.exists():
+                with self._lock:
+                    self._forget(key)
+                return None
+            with open(file_path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            if self.max_age and time.time() - entry.get("created", 0) > self.max_age:
+                file_path.unlink(missing_ok=True)
+                with self._lock:
+                    self._forget(key)
+                return None
+            # 更新访问时间，用于淘汰
+            os.utime(file_path)
+            with self._lock:
+                entries = self._load_entries()
+                if key in entries:
+                    entries[key] = (time.time(), entries[key][1])
+            return entry.get("content")
+        except Exception as e:
+            print(f"读取响应缓存失败: {e}")
+            return None
+
+    def put(self, key: str, content: str, model: str = ""):
+        """写入缓存"""
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            file_path = self._path(key)
+            tmp_path = file_path.with_suffix(f".{threading.get_ident()}.tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(
+                    {"model": model, "created": time.time(), "content": content},
+                    f,
+                    ensure_ascii=False,
+                )
+            size = tmp_path.stat().st_size
+            os.replace(tmp_path, file_path)
+            with self._lock:
+                entries = self._load_entries()
+                self._forget(key)
+                entries[key] = (time.time(), size)
+                self._total += size
+                if len(entries) > self.max_entries or self._total > self.max_bytes:
+                    self._trim()
+        except Exception as e:
+            print(f"写入响应缓存失败: {e}")
+
+    def _trim(self):
+        """删除过期记录，并在超出上限时删除最久未使用的记录（需持有锁）"""
+        entries = self._load_entries()
+        now = time.time()
+        # 访问时间超过有效期的记录必然已过期
+        for key, (atime, size) in sorted(entries.items(), key=lambda item: item[1][0]):
+            expired = self.max_age and now - atime > self.max_age
+            if not expired and len(entries) <= self.max_entries and self._total <= self.max_bytes:
+                break
+            try:
+                self._path(key).unlink(missing_ok=True)
+            except OSError:
+                continue
+            self._forget(key)
+
+    def clear(self):
+        """清空全部缓存"""
+        with self._lock:
+            for file in self.cache_dir.glob("*.json"):
+                file.unlink(missing_ok=True)
+            self._entries = {}
+            self._total = 0
+
+
+_response_cache: Optional[ResponseCache] = None
+_response_cache_lock = threading.Lock()
+
+
+def _cache_limits(options: Optional[dict]) -> dict:
+    options = options or {}
+    return {
+        "max_entries": options.get("max_entries", 1000),
+        "max_size_mb": options.get("max_size_mb", 50),
+        "max_age_days": options.get("max_age_days", 30),
+    }
+
+
+def get_response_cache(options: Optional[dict] = None) -> ResponseCache:
+    """
+    获取全局响应缓存
+
+    :param options: 缓存配置（见 AIConfigManager.get_response_cache_config），与当前上限不同时更新
+    """
+    global _response_cache
+    if _response_cache is None:
+        with _response_cache_lock:
+            if _response_cache is None:
+                _response_cache = ResponseCache(get_cache_dir() / "responses", **_cache_limits(options))
+                # 延迟导入，缓存模块本身不依赖配置模块
+                from utils.ai_config import AIConfigManager
+                AIConfigManager.subscribe(_on_config_changed)
+                return _response_cache
+    if options is not None:
+        limits = _cache_limits(options)
+        cache = _response_cache
+        if (limits["max_entries"], limits["max_size_mb"] * 1024 * 1024, limits["max_age_days"] * 24 * 3600) != (
+            cache.max_entries, cache.max_bytes, cache.max_age
+        ):
+            cache.configure(**limits)
+    return _response_cache
+
+
+def _on_config_changed(config: dict):
+    """ai_config.yaml 中的 response_cache 修改后更新上限"""
+    from utils.ai_config import AIConfigManager
+    get_response_cache(AIConfigManager().get_response_cache_config())
@@ -0,0 +1,244 @@
+"""
+重试策略 - OpenAI 兼容接口和 Gemini 共用
+
+只重试临时性错误（429、5xx、超时、连接失败），按指数退避加随机抖动等待，
+非幂等请求（如生成请求，服务端可能已经处理并计费）只在确定未被处理时重试（429、连接未建立），
+服务端返回 Retry-After 时按其等待。错误按属性和类名识别，不需要导入 openai / google-genai。
+"""
+import asyncio
+import email.utils
+import random
+import re
+import time
+from typing import Awaitable, Callable, Optional
+
+
+# 可重试的 HTTP 状态码
+RETRY_STATUS_CODES = frozenset({408, 429, 500, 502, 503, 504})
+
+# 说明请求未被服务端处理的状态码，非幂等请求也可以重试
+NOT_PROCESSED_STATUS_CODES = frozenset({429})
+
+# 超时、连接中断等临时性错误的类名（openai / httpx / aiohttp / 内置异常）
+TRANSIENT_ERROR_NAMES = frozenset({
+    "APIConnectionError",
+    "APITimeoutError",
+    "TransportError",
+    "TimeoutException",
+    "NetworkError",
+    "RemoteProtocolError",
+    "ClientConnectionError",
+    "ServerDisconnectedError",
+    "ConnectionError",
+    "TimeoutError",
+})
+
+# 请求尚未发出就失败的错误类名，非幂等请求也可以重试
+CONNECT_ERROR_NAMES = frozenset({
+    "ConnectError",
+    "ConnectTimeout",
+    "ClientConnectorError",
+    "ConnectionRefusedError",
+})
+
+# 等待期间检查取消的间隔（秒）
+CANCEL_POLL_INTERVAL = 0.2
+
+
+def _error_names(error: BaseException) -> set:
+    """异常及其原因链（如 openai.APIConnectionError 包装的 httpx.ConnectError）的类名"""
+    names = set()
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        names.update(cls.__name__ for cls in type(error).__mro__)
+        error = error.__cause__ or error.__context__
+    return names
+
+
+def get_status_code(error: BaseException) -> Optional[int]:
+    """异常对应的 HTTP 状态码（openai: status_code，google-genai: code），没有时返回 None"""
+    for attr in ("status_code", "code"):
+        value = getattr(error, attr, None)
+        if isinstance(value, int) and 100 <= value < 600:
+            return value
+    response = getattr(error, "response", None)
+    value = getattr(response, "status_code", None)
+    if isinstance(value, int):
+        return value
+    return None
+
+
+def _parse_retry_after(value: str) -> Optional[float]:
+    """解析 Retry-After：秒数或 HTTP 日期"""
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, date.timestamp() - time.time())
+
+
+def _find_retry_delay(details) -> Optional[float]:
+    """在 Google API 错误详情中查找 RetryInfo.retryDelay（如 "12s"）"""
+    if isinstance(details, dict):
+        delay = details.get("retryDelay")
+        if isinstance(delay, str):
+            match = re.fullmatch(r"\s*([\d.]+)s\s*", delay)
+            if match:
+                return float(match.group(1))
+        children = details.values()
+    elif isinstance(details, (list, tuple)):
+        children = details
+    else:
+        return None
+    for item in children:
+        delay = _find_retry_delay(item)
+        if delay is not None:
+            return delay
+    return None
+
+
+def get_retry_after(error: BaseException) -> Optional[float]:
+    """服务端要求的等待秒数（Retry-After / retry-after-ms 响应头，或 Google RetryInfo）"""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if headers is not None:
+        try:
+            value = headers.get("retry-after-ms")
+            if value:
+                return max(0.0, float(value) / 1000)
+        except (TypeError, ValueError):
+            pass
+        value = headers.get("retry-after")
+        if value:
+            delay = _parse_retry_after(str(value))
+            if delay is not None:
+                return delay
+    return _find_retry_delay(getattr(error, "details", None))
+
+
+def describe_error(error: BaseException) -> str:
+    """简短的错误说明，用于重试提示"""
+    status = get_status_code(error)
+    if status == 429:
+        return "请求过于频繁"
+    if status is not None:
+        return f"HTTP {status}"
+    names = _error_names(error)
+    if names & CONNECT_ERROR_NAMES or "APIConnectionError" in names:
+        return "连接失败"
+    if any("Timeout" in name for name in names):
+        return "请求超时"
+    return type(error).__name__
+
+
+def format_retry_message(attempt: int, max_retries: int, delay: float, error: BaseException) -> str:
+    """重试进度提示"""
+    return f"请求失败（{describe_error(error)}），{delay:.1f} 秒后重试（{attempt}/{max_retries}）..."
+
+
+class RetryPolicy:
+    """
+    重试策略
+
+    第 n 次重试前等待 min(max_delay, base_delay * 2^(n-1))，在其一半到全部之间随机取值；
+    服务端给出 Retry-After 时按其等待，超过 max_retry_after 则不再重试。
+    非幂等请求只在确定未被处理（429、连接未建立）时重试。
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        base_delay: float = 1.0,
+        max_delay: float = 30.0,
+        max_retry_after: float = 60.0,
+    ):
+        self.max_attempts = max(1, int(max_attempts))  # 含首次请求的总次数
+        self.base_delay = max(0.0, float(base_delay))
+        self.max_delay = max(0.0, float(max_delay))
+        self.max_retry_after = max(0.0, float(max_retry_after))
+
+    @classmethod
+    def from_config(cls, config: Optional[dict]) -> "RetryPolicy":
+        """由 AIConfigManager.get_retry_config() 的结果创建"""
+        return cls(**config) if config else cls()
+
+    @property
+    def max_retries(self) -> int:
+        return self.max_attempts - 1
+
+    def is_retryable(self, error: BaseException, idempotent: bool = True) -> bool:
+        """错误是否值得重试"""
+        status = get_status_code(error)
+        names = _error_names(error)
+        if not idempotent:
+            return status in NOT_PROCESSED_STATUS_CODES or bool(names & CONNECT_ERROR_NAMES)
+        if status is not None:
+            return status in RETRY_STATUS_CODES
+        return bool(names & (TRANSIENT_ERROR_NAMES | CONNECT_ERROR_NAMES))
+
+    def backoff(self, attempt: int) -> float:
+        """第 attempt 次失败后的退避时间（含抖动）"""
+        delay = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def next_delay(self, error: BaseException, attempt: int, idempotent: bool = True) -> Optional[float]:
+        """
+        第 attempt 次请求失败后，下次重试前的等待秒数
+
+        :return: 不应重试时返回 None
+        """
+        if attempt >= self.max_attempts or not self.is_retryable(error, idempotent):
+            return None
+        retry_after = get_retry_after(error)
+        if retry_after is not None:
+            if retry_after > self.max_retry_after:
+                return None
+            return retry_after
+        return self.backoff(attempt)
+
+
+def sleep_unless_cancelled(delay: float, cancelled: Optional[Callable[[], bool]] = None) -> bool:
+    """
+    等待 delay 秒，期间 cancelled() 返回 True 时提前结束
+
+    :return: 未被取消时返回 True
+    """
+    deadline = time.monotonic() + delay
+    while True:
+        if cancelled is not None and cancelled():
+            return False
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return True
+        time.sleep(min(remaining, CANCEL_POLL_INTERVAL))
+
+
+async def acall_with_retry(
+    factory: Callable[[], Awaitable],
+    policy: RetryPolicy,
+    idempotent: bool = True,
+    on_retry: Optional[Callable[[int, float, BaseException], None]] = None,
+):
+    """
+    按策略执行异步调用，失败时重试
+
+    :param factory: 每次调用返回新的协程
+    :param on_retry: 每次重试前回调 (第几次重试, 等待秒数, 异常)
+    """
+    attempt = 1
+    while True:
+        try:
+            return await factory()
+        except Exception as e:
+            delay = policy.next_delay(e, attempt, idempotent)
+            if delay is None:
+                raise
+            if on_retry is not None:
+                on_retry(attempt, delay, e)
+        await asyncio.sleep(delay)
+        attempt += 1
@@ -0,0 +1,219 @@
+"""
+启动耗时统计 - 记录从入口脚本开始执行到窗口首次绘制的各阶段耗时
+
+启动性能分析：python main.py --profile-startup（或设置环境变量 NANO_BANANA_PROFILE_STARTUP=1，
+适用于打包后的 exe），额外记录每个模块的导入耗时和界面构建各步骤的耗时，
+输出 JSON 报告和文本表格（默认写入 cache/startup_profile.json 与 .txt）。
+"""
+import builtins
+import importlib.util
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+
+# 入口脚本开始执行的时间（main.py 最先导入本模块）
+STARTUP_BEGIN = time.perf_counter()
+
+# 设置后把启动耗时以 JSON 行追加到该文件（源码运行和打包后的 exe 都适用）
+STARTUP_REPORT_ENV = "NANO_BANANA_STARTUP_REPORT"
+# 设置为 1 时窗口首次绘制后立即退出，用于自动测量启动时间
+EXIT_AFTER_STARTUP_ENV = "NANO_BANANA_EXIT_AFTER_STARTUP"
+
+# 启动性能分析开关：命令行参数 --profile-startup[=报告路径]，或环境变量（1 或报告路径）
+PROFILE_STARTUP_FLAG = "--profile-startup"
+PROFILE_STARTUP_ENV = "NANO_BANANA_PROFILE_STARTUP"
+# 文本表格中显示的导入耗时最多的模块数
+PROFILE_TOP_IMPORTS = 30
+
+# (阶段名称, 距离开始的秒数)
+_marks: List[Tuple[str, float]] = []
+
+# 性能分析状态
+_profile_path: Optional[Path] = None
+_phases: List[dict] = []
+_phase_depth = 0
+# 模块名 -> {cumulative: 含子模块的导入耗时, self: 扣除子模块后的耗时}
+_imports: Dict[str, dict] = {}
+_import_local = threading.local()
+_original_import = None
+
+
+def mark(name: str):
+    """记录一个启动阶段的完成时间"""
+    _marks.append((name, time.perf_counter() - STARTUP_BEGIN))
+
+
+def exit_after_startup() -> bool:
+    """是否在启动完成后立即退出"""
+    return os.environ.get(EXIT_AFTER_STARTUP_ENV) == "1"
+
+
+def _requested_profile_path() -> Optional[Path]:
+    """命令行或环境变量要求的性能分析报告路径，未要求时返回 None"""
+    value = None
+    for arg in sys.argv[1:]:
+        if arg == PROFILE_STARTUP_FLAG:
+            value = "1"
+        elif arg.startswith(PROFILE_STARTUP_FLAG + "="):
+            value = arg.split("=", 1)[1]
+    if value is None:
+        value = os.environ.get(PROFILE_STARTUP_ENV)
+    if not value or value == "0":
+        return None
+    if value == "1":
+        from utils.resource_path import get_cache_dir
+        return get_cache_dir() / "startup_profile.json"
+    return Path(value)
+
+
+def _profiled_import(name, globals=None, locals=None, fromlist=(), level=0):
+    """记录每个模块首次导入耗时的 __import__"""
+    absolute = name
+    if level:
+        package = (globals or {}).get("__package__") or ""
+        try:
+            absolute = importlib.util.resolve_name("." * level + name, package)
+        except (ImportError, ValueError):
+            pass
+    if absolute in sys.modules:
+        return _original_import(name, globals, locals, fromlist, level)
+
+    # 每个线程单独记录嵌套的导入，用于计算扣除子模块后的耗时
+    stack = getattr(_import_local, "stack", None)
+    if stack is None:
+        stack = _import_local.stack = []
+    stack.append(0.0)
+    start = time.perf_counter()
+    try:
+        return _original_import(name, globals, locals, fromlist, level)
+    finally:
+        elapsed = time.perf_counter() - start
+        children = stack.pop()
+        if stack:
+            stack[-1] += elapsed
+        _imports.setdefault(absolute, {"cumulative": elapsed, "self": elapsed - children})
+
+
+def start_profiling() -> bool:
+    """
+    按命令行参数/环境变量开启启动性能分析（在 main.py 中尽早调用）
+
+    :return: 是否已开启
+    """
+    global _profile_path, _original_import
+    if _profile_path is not None:
+        return True
+    _profile_path = _requested_profile_path()
+    if _profile_path is None:
+        return False
+    _original_import = builtins.__import__
+    builtins.__import__ = _profiled_import
+    return True
+
+
+@contextmanager
+def profile_phase(name: str):
+    """记录一个启动步骤的耗时（未开启性能分析时不做任何事）"""
+    global _phase_depth
+    if _profile_path is None:
+        yield
+        return
+    start = time.perf_counter()
+    _phase_depth += 1
+    try:
+        yield
+    finally:
+        _phase_depth -= 1
+        _phases.append({
+            "name": name,
+            "start": round(start - STARTUP_BEGIN, 4),
+            "duration": round(time.perf_counter() - start, 4),
+            "depth": _phase_depth,
+        })
+
+
+def format_profile(report: Dict) -> str:
+    """把性能分析报告整理成文本表格"""
+    lines = [
+        f"启动到首次绘制: {report['total']:.3f}s"
+        f"（{'打包程序' if report['frozen'] else '源码运行'}，Python {report['python']}）",
+        "",
+        f"{'阶段':<36}{'时间点(s)':>12}",
+    ]
+    for name, elapsed in report["marks"].items():
+        lines.append(f"{name:<38}{elapsed:>12.3f}")
+
+    lines += ["", f"{'步骤':<36}{'开始(s)':>12}{'耗时(s)':>12}"]
+    for phase in sorted(report["phases"], key=lambda p: (p["start"], p["depth"])):
+        name = "  " * phase["depth"] + phase["name"]
+        lines.append(f"{name:<38}{phase['start']:>12.3f}{phase['duration']:>12.3f}")
+
+    imports = report["imports"]
+    lines += [
+        "",
+        f"导入耗时最多的模块（共 {len(imports)} 个，显示前 {min(len(imports), PROFILE_TOP_IMPORTS)} 个）",
+        f"{'模块':<46}{'累计(s)':>12}{'自身(s)':>12}",
+    ]
+    for item in imports[:PROFILE_TOP_IMPORTS]:
+        lines.append(f"{item['module']:<48}{item['cumulative']:>12.3f}{item['self']:>12.3f}")
+    return "\n".join(lines)
+
+
+def _write_profile(report: Dict):
+    """停止记录导入耗时，写出 JSON 报告和文本表格"""
+    if _original_import is not None:
+        builtins.__import__ = _original_import
+
+    report = dict(report)
+    report["phases"] = list(_phases)
+    report["imports"] = sorted(
+        (
+            {"module": name, "cumulative": round(t["cumulative"], 4), "self": round(t["self"], 4)}
+            for name, t in _imports.items()
+        ),
+        key=lambda item: item["cumulative"],
+        reverse=True,
+    )
+    table = format_profile(report)
+    print(table)
+    try:
+        _profile_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(_profile_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        with open(_profile_path.with_suffix(".txt"), "w", encoding="utf-8") as f:
+            f.write(table + "\n")
+        print(f"\n启动性能报告已保存: {_profile_path}")
+    except Exception as e:
+        print(f"写入启动性能报告失败: {e}")
+
+
+def finish_startup() -> Dict:
+    """
+    启动完成（窗口首次绘制）时调用，返回并按需写出启动耗时
+
+    :return: {total, marks: {阶段: 秒}, frozen, python, time}
+    """
+    mark("first_paint")
+    report = {
+        "total": round(_marks[-1][1], 4),
+        "marks": {name: round(elapsed, 4) for name, elapsed in _marks},
+        "frozen": bool(getattr(sys, "frozen", False)),
+        "python": sys.version.split()[0],
+        "time": time.time(),
+    }
+    path = os.environ.get(STARTUP_REPORT_ENV)
+    if path:
+        try:
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(report, ensure_ascii=False) + "\n")
+        except Exception as e:
+            print(f"写入启动耗时失败: {e}")
+    if _profile_path is not None:
+        _write_profile(report)
+    return report
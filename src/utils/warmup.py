@@ -0,0 +1,41 @@
+"""后台预加载 - 窗口显示后在后台线程导入较慢的依赖，首次使用 AI 功能时无需等待"""
+import importlib
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+# 按首次使用的可能顺序排列
+WARMUP_MODULES = [
+    "PIL.Image",
+    "httpx",
+    "openai",
+    "google.genai",
+]
+
+# 模块名 -> 导入耗时（秒），预加载完成后可用于查看
+warmup_times: Dict[str, float] = {}
+
+_warmup_thread: Optional[threading.Thread] = None
+
+
+def _run(modules: Iterable[str]):
+    for name in modules:
+        start = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            # 未安装或导入失败时跳过，首次使用时会给出正常的错误提示
+            print(f"预加载 {name} 失败: {e}")
+            continue
+        warmup_times[name] = time.perf_counter() - start
+
+
+def start_warmup(modules: Iterable[str] = WARMUP_MODULES) -> threading.Thread:
+    """在后台守护线程中依次导入 modules（重复调用只启动一次）"""
+    global _warmup_thread
+    if _warmup_thread is None:
+        _warmup_thread = threading.Thread(
+            target=_run, args=(list(modules),), name="warmup", daemon=True
+        )
+        _warmup_thread.start()
+    return _warmup_thread
@@ -1,9 +1,124 @@
 """YAML配置文件处理工具"""
+import atexit
+import copy
 import os
+import threading
 import yaml
 from pathlib import Path
+from typing import Dict, Optional, Set, Tuple
 from utils.resource_path import get_config_path
 
+# 优先使用 libyaml 加速的解析器
+try:
+    from yaml import CSafeLoader as _SafeLoader
+except ImportError:
+    from yaml import SafeLoader as _SafeLoader
+
+
+# 已解析的配置：路径 -> ((修改时间, 文件大小), 数据)，所有 YamlHandler 实例共享
+_options_cache: Dict[Path, Tuple[Optional[Tuple[int, int]], dict]] = {}
+_options_cache_lock = threading.RLock()
+
+# 延迟写入：有未落盘修改的文件，以及合并写入的定时器
+_dirty_paths: Set[Path] = set()
+_flush_timer: Optional[threading.Timer] = None
+# 保证同一时间只有一个线程在写文件
+_write_lock = threading.Lock()
+
+# 延迟写入配置（见 AIConfigManager.get_options_storage_config）
+_flush_delay = 0.5
+_fsync_policy = "always"
+
+
+def _stat_key(path: Path) -> Optional[Tuple[int, int]]:
+    """文件的 (修改时间, 大小)，用于判断缓存是否仍然有效"""
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def configure_write_behind(flush_delay: float = None, fsync: str = None):
+    """
+    设置延迟写入参数
+
+    :param flush_delay: 修改后等待多少秒再写入（期间的修改合并为一次写入）
+    :param fsync: "always" 每次写入后 fsync，"never" 交给操作系统
+    """
+    global _flush_delay, _fsync_policy
+    if flush_delay is not None:
+        _flush_delay = max(0.0, float(flush_delay))
+    if fsync is not None:
+        _fsync_policy = fsync
+
+
+def _write_atomic(path: Path, text: str):
+    """写入临时文件后原子替换，写到一半崩溃也不会损坏原文件"""
+    sync = _fsync_policy == "always"
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        if sync:
+            os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    if sync and hasattr(os, "O_DIRECTORY"):
+        # 同步目录项，确保重命名本身已落盘
+        dir_fd = os.open(path.parent, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+def _schedule_flush():
+    """安排一次合并写入（已有定时器时不重复安排）"""
+    global _flush_timer
+    with _options_cache_lock:
+        if _flush_timer is not None:
+            return
+        _flush_timer = threading.Timer(_flush_delay, flush_options)
+        _flush_timer.daemon = True
+        _flush_timer.start()
+
+
+def flush_options():
+    """立即写入所有未落盘的修改（应用退出时调用）"""
+    global _flush_timer
+    with _write_lock:
+        with _options_cache_lock:
+            if _flush_timer is not None:
+                _flush_timer.cancel()
+                _flush_timer = None
+            pending = []
+            for path in _dirty_paths:
+                if path not in _options_cache:
+                    continue
+                # 持锁序列化，得到一致的快照
+                text = yaml.dump(
+                    _options_cache[path][1],
+                    allow_unicode=True,
+                    default_flow_style=False,
+                    sort_keys=False,
+                )
+                pending.append((path, text))
+            _dirty_paths.clear()
+
+        for path, text in pending:
+            try:
+                _write_atomic(path, text)
+            except Exception as e:
+                print(f"保存配置文件失败: {e}")
+                continue
+            with _options_cache_lock:
+                # 写入期间没有新的修改时，记录新的文件状态，避免重新解析
+                if path not in _dirty_paths and path in _options_cache:
+                    _options_cache[path] = (_stat_key(path), _options_cache[path][1])
+
+
+atexit.register(flush_options)
+
 
 class YamlHandler:
     """处理YAML配置文件的读写操作"""
@@ -17,57 +132,82 @@ class YamlHandler:
         if not self.config_path.exists():
             self.config_path.parent.mkdir(parents=True, exist_ok=True)
             self.save_options({})
+            self.flush()
+
+    def _get_model(self) -> dict:
+        """
+        获取已解析的配置（内部共享对象，调用方不可直接修改）
+
+        文件的修改时间或大小变化时重新解析，否则直接复用内存中的结果；
+        有尚未写入的修改时以内存为准。
+        """
+        with _options_cache_lock:
+            cached = _options_cache.get(self.config_path)
+            if cached is not None and self.config_path in _dirty_paths:
+                return cached[1]
+            stat_key = _stat_key(self.config_path)
+            if cached is not None and cached[0] == stat_key:
+                return cached[1]
+
+            try:
+                with open(self.config_path, "r", encoding="utf-8") as f:
+                    data = yaml.load(f, Loader=_SafeLoader)
+                data = data if isinstance(data, dict) else {}
+            except Exception as e:
+                # 解析失败时按空配置处理，文件变化后会重新尝试
+                print(f"加载配置文件失败: {e}")
+                data = {}
+
+            _options_cache[self.config_path] = (stat_key, data)
+            return data
+
+    def _mark_dirty(self):
+        """标记有未写入的修改，并安排合并写入（需持有缓存锁）"""
+        _dirty_paths.add(self.config_path)
+        _schedule_flush()
 
     def load_options(self) -> dict:
-        """加载所有选项配置"""
-        try:
-            with open(self.config_path, "r", encoding="utf-8") as f:
-                data = yaml.safe_load(f)
-                return data if data else {}
-        except Exception as e:
-            print(f"加载配置文件失败: {e}")
-            return {}
+        """加载所有选项配置（返回副本，可自由修改）"""
+        return copy.deepcopy(self._get_model())
 
     def save_options(self, options: dict):
-        """保存所有选项配置"""
-        try:
-            with open(self.config_path, "w", encoding="utf-8") as f:
-                yaml.dump(
-                    options,
-                    f,
-                    allow_unicode=True,
-                    default_flow_style=False,
-                    sort_keys=False,
-                )
-        except Exception as e:
-            print(f"保存配置文件失败: {e}")
+        """保存所有选项配置（立即更新内存，稍后合并写入文件）"""
+        with _options_cache_lock:
+            stat_key = _options_cache.get(self.config_path, (None, None))[0]
+            _options_cache[self.config_path] = (stat_key, copy.deepcopy(options))
+            self._mark_dirty()
+
+    def flush(self):
+        """立即写入未落盘的修改"""
+        flush_options()
 
     def get_field_options(self, field_name: str) -> list:
         """获取指定字段的选项列表"""
-        options = self.load_options()
-        return options.get(field_name, [])
+        return list(self._get_model().get(field_name) or [])
 
     def add_option(self, field_name: str, value: str):
         """为指定字段添加一个选项"""
-        options = self.load_options()
-        if field_name not in options:
-            options[field_name] = []
-        if value and value not in options[field_name]:
-            options[field_name].append(value)
-            self.save_options(options)
+        with _options_cache_lock:
+            options = self._get_model()
+            if field_name not in options:
+                options[field_name] = []
+            if value and value not in options[field_name]:
+                options[field_name].append(value)
+                self._mark_dirty()
 
     def remove_option(self, field_name: str, value: str):
         """从指定字段删除一个选项"""
-        options = self.load_options()
-        if field_name in options and value in options[field_name]:
-            options[field_name].remove(value)
-            self.save_options(options)
+        with _options_cache_lock:
+            options = self._get_model()
+            if field_name in options and value in options[field_name]:
+                options[field_name].remove(value)
+                self._mark_dirty()
 
     def update_option(self, field_name: str, old_value: str, new_value: str):
         """更新指定字段的某个选项"""
-        options = self.load_options()
-        if field_name in options and old_value in options[field_name]:
-            idx = options[field_name].index(old_value)
-            options[field_name][idx] = new_value
-            self.save_options(options)
-
+        with _options_cache_lock:
+            options = self._get_model()
+            if field_name in options and old_value in options[field_name]:
+                idx = options[field_name].index(old_value)
+                options[field_name][idx] = new_value
+                self._mark_dirty()